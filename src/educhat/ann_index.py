@@ -0,0 +1,297 @@
+# src/educhat/ann_index.py
+
+"""
+Índices aproximados (ANN) para corpus grandes.
+
+El índice que guarda rag_store es siempre plano (IndexFlatL2 de float32 de
+384 dimensiones): búsqueda exacta, 1,5 KB por vector y coste lineal por
+consulta. Con siete ficheros da igual; con el archivo completo del curso
+(exámenes antiguos, transcripciones, foros) no. Por eso build_rag publica,
+junto al índice plano, un índice ANN (ann.faiss) construido a partir de sus
+vectores:
+
+  - flat      sin ANN: se busca en el índice plano (corpus pequeños);
+  - ivf_flat  IVF con vectores completos: exacto dentro de las listas visitadas;
+  - hnsw      grafo HNSW: el mejor recall/latencia, pero más memoria;
+  - ivf_sq8   IVF con vectores cuantizados a int8 (4x menos memoria);
+  - ivf_pq    IVF con Product Quantization (pq_m bytes por vector).
+
+kind="auto" elige por número de vectores (VectorIndexConfig). nprobe y
+ef_search se aplican al cargar, así que se pueden cambiar sin reconstruir.
+Con rerank_candidates > 0 se piden más candidatos al ANN y se reordenan con
+las distancias exactas de los vectores del índice plano (abierto por mmap:
+solo se leen las filas de los candidatos), lo que recupera casi todo el
+recall perdido por la cuantización.
+
+El índice plano se sigue guardando porque es la fuente de los builds
+incrementales (ver rag_store.update_vector_store): el ANN se vuelve a
+entrenar en cada publicación, lo que cuesta mucho menos que los embeddings.
+
+evaluate() mide recall@k frente al índice plano, latencia por consulta y
+bytes por vector; build_rag lo imprime tras cada build (o con --report).
+"""
+
+from dataclasses import asdict, replace
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+from .config import DEFAULT_VECTOR_INDEX_CONFIG, VectorIndexConfig
+from .index_format import VECTORS_FILE
+
+logger = logging.getLogger(__name__)
+
+ANN_FILE = "ann.faiss"
+KINDS = ("flat", "ivf_flat", "hnsw", "ivf_sq8", "ivf_pq")
+
+# Campos de VectorIndexConfig que cambian el índice construido (el resto solo afecta a la búsqueda)
+BUILD_FIELDS = (
+    "kind", "flat_max_vectors", "hnsw_max_vectors", "sq8_max_vectors",
+    "nlist", "train_sample", "hnsw_m", "ef_construction", "pq_m", "pq_bits",
+)
+
+
+def build_config(config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG) -> Dict[str, object]:
+    """Parte de la configuración que se guarda en el manifest (si cambia, hay que reconstruir el ANN)."""
+    values = asdict(config)
+    return {name: values[name] for name in BUILD_FIELDS}
+
+
+def choose_kind(n: int, config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG) -> str:
+    if config.kind != "auto":
+        if config.kind not in KINDS:
+            raise ValueError(f"Unknown vector index kind {config.kind!r}; expected auto or one of {KINDS}")
+        return config.kind
+    if n <= config.flat_max_vectors:
+        return "flat"
+    if n <= config.hnsw_max_vectors:
+        return "hnsw"
+    if n <= config.sq8_max_vectors:
+        return "ivf_sq8"
+    return "ivf_pq"
+
+
+def _nlist(n_train: int, config: VectorIndexConfig) -> int:
+    nlist = config.nlist or int(4 * math.sqrt(n_train))
+    # k-means de FAISS pide al menos 39 puntos por centroide
+    return max(1, min(nlist, n_train // 39))
+
+
+def _pq_m(d: int, pq_m: int) -> int:
+    """Mayor divisor de d que no pasa de pq_m (PQ necesita subvectores del mismo tamaño)."""
+    return next(m for m in range(min(pq_m, d), 0, -1) if d % m == 0)
+
+
+def _all_vectors(flat: faiss.Index) -> np.ndarray:
+    return flat.reconstruct_n(0, flat.ntotal)
+
+
+def build_ann_index(
+    flat: faiss.Index,
+    config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+) -> Tuple[Optional[faiss.Index], Dict[str, object]]:
+    """
+    Construye el índice ANN a partir de los vectores del índice plano (mismas
+    posiciones, así que index_to_docstore_id sirve para los dos). Devuelve
+    (índice o None si kind es flat, descripción para el manifest).
+    """
+    n, d = flat.ntotal, flat.d
+    kind = choose_kind(n, config)
+    info: Dict[str, object] = {"kind": kind, "vectors": n, "dim": d}
+    if kind == "flat" or n == 0:
+        info["kind"] = "flat"
+        return None, info
+
+    vectors = _all_vectors(flat)
+    rng = np.random.default_rng(0)
+    train = vectors
+    if n > config.train_sample:
+        train = vectors[np.sort(rng.choice(n, config.train_sample, replace=False))]
+
+    if kind == "ivf_pq" and len(train) < 2 ** config.pq_bits * 39:
+        logger.warning("Too few vectors (%d) to train PQ%dx%d; using ivf_sq8", len(train), config.pq_m, config.pq_bits)
+        kind = info["kind"] = "ivf_sq8"
+
+    if kind == "hnsw":
+        description = f"HNSW{config.hnsw_m}"
+    else:
+        nlist = _nlist(len(train), config)
+        codes = {
+            "ivf_flat": "Flat",
+            "ivf_sq8": "SQ8",
+            "ivf_pq": f"PQ{_pq_m(d, config.pq_m)}x{config.pq_bits}",
+        }[kind]
+        description = f"IVF{nlist},{codes}"
+        info["nlist"] = nlist
+    info["factory"] = description
+
+    t0 = time.perf_counter()
+    index = faiss.index_factory(d, description, flat.metric_type)
+    if kind == "hnsw":
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        index.train(train)
+    info["train_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    t0 = time.perf_counter()
+    index.add(vectors)
+    info["add_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    info["trained_on"] = len(train) if kind != "hnsw" else 0
+    return index, info
+
+
+def write_ann_index(index: faiss.Index, index_dir: str) -> None:
+    faiss.write_index(index, os.path.join(index_dir, ANN_FILE))
+
+
+class AnnSearcher:
+    """
+    Búsqueda sobre el índice ANN con la misma interfaz que faiss.Index.search
+    (distancias, posiciones), con rerank exacto opcional sobre el índice plano.
+    """
+
+    def __init__(self, ann: faiss.Index, flat: faiss.Index, config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG):
+        self.ann = ann
+        self.flat = flat
+        self.config = config
+        self.kind = _kind_of(ann)
+        if self.kind == "hnsw":
+            faiss.downcast_index(ann).hnsw.efSearch = config.ef_search
+        else:
+            faiss.extract_index_ivf(ann).nprobe = config.nprobe
+
+    def search(self, matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = max(k, self.config.rerank_candidates)
+        distances, positions = self.ann.search(matrix, candidates)
+        if not self.config.rerank_candidates:
+            return distances[:, :k], positions[:, :k]
+
+        out_d = np.full((len(matrix), k), np.inf, dtype=np.float32)
+        out_p = np.full((len(matrix), k), -1, dtype=np.int64)
+        for row, (query, ids) in enumerate(zip(matrix, positions)):
+            ids = ids[ids >= 0]
+            if not len(ids):
+                continue
+            exact = self._exact_distances(query, self.flat.reconstruct_batch(ids))
+            order = np.argsort(exact)[:k]
+            out_d[row, : len(order)] = exact[order]
+            out_p[row, : len(order)] = ids[order]
+        return out_d, out_p
+
+    def _exact_distances(self, query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Distancias exactas (menor = mejor) con la métrica del índice plano."""
+        if self.flat.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return -(vectors @ query)
+        diff = vectors - query
+        return np.einsum("ij,ij->i", diff, diff)
+
+    def describe(self) -> Dict[str, object]:
+        params: Dict[str, object] = {"kind": self.kind, "rerank_candidates": self.config.rerank_candidates}
+        if self.kind == "hnsw":
+            params["ef_search"] = self.config.ef_search
+        else:
+            params["nprobe"] = self.config.nprobe
+        return params
+
+
+def _kind_of(index: faiss.Index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivf_sq8"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return type(index).__name__
+
+
+def load_ann_searcher(
+    index_dir: str,
+    flat: faiss.Index,
+    config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+) -> Optional[AnnSearcher]:
+    """
+    AnnSearcher del índice publicado en index_dir, o None si no tiene ANN
+    (índice pequeño, anterior a este módulo o config.kind == "flat").
+    """
+    path = os.path.join(index_dir, ANN_FILE)
+    if config.kind == "flat" or not os.path.exists(path):
+        return None
+    ann = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    if ann.ntotal != flat.ntotal or ann.d != flat.d:
+        logger.warning("%s does not match index.faiss in %s; searching the flat index", ANN_FILE, index_dir)
+        return None
+    return AnnSearcher(ann, flat, config)
+
+
+def _knn_without_self(search, queries: np.ndarray, positions: np.ndarray, k: int) -> Tuple[List[List[int]], float]:
+    """Top-k de cada consulta (un vector del índice) sin contarse a sí misma; y ms medios por consulta."""
+    results = []
+    t0 = time.perf_counter()
+    for query, own in zip(queries, positions):
+        _, found = search(query[None, :], k + 1)
+        results.append([int(p) for p in found[0] if p >= 0 and p != own][:k])
+    ms = (time.perf_counter() - t0) * 1000 / max(1, len(queries))
+    return results, ms
+
+
+def evaluate(
+    flat: faiss.Index,
+    searcher: Optional[AnnSearcher],
+    index_dir: str,
+    config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+) -> Dict[str, object]:
+    """
+    Informe de build_rag: recall@k del ANN frente al índice plano, ms por
+    consulta de ambos y bytes por vector. Las consultas son vectores del
+    propio índice elegidos al azar (se excluye a sí mismo del top-k).
+    """
+    n = flat.ntotal
+    flat_bytes = os.path.getsize(os.path.join(index_dir, VECTORS_FILE))
+    report: Dict[str, object] = {
+        "kind": searcher.kind if searcher else "flat",
+        "vectors": n,
+        "flat_bytes_per_vector": round(flat_bytes / max(1, n), 1),
+    }
+    if searcher is None or n < 2:
+        return report
+
+    report.update(searcher.describe())
+    report["ann_bytes_per_vector"] = round(os.path.getsize(os.path.join(index_dir, ANN_FILE)) / n, 1)
+
+    rng = np.random.default_rng(0)
+    positions = np.sort(rng.choice(n, min(config.recall_queries, n), replace=False))
+    queries = flat.reconstruct_batch(positions)
+    k = min(config.recall_k, n - 1)
+
+    def recall(found: List[List[int]]) -> float:
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+        return round(hits / max(1, sum(len(t) for t in truth)), 4)
+
+    truth, flat_ms = _knn_without_self(flat.search, queries, positions, k)
+    found, ann_ms = _knn_without_self(searcher.search, queries, positions, k)
+    report.update({
+        f"recall@{k}": recall(found),
+        "flat_ms_per_query": round(flat_ms, 3),
+        "ann_ms_per_query": round(ann_ms, 3),
+    })
+    if config.rerank_candidates:
+        # Mismo ANN sin rerank exacto, para ver cuánto recall aporta
+        raw = AnnSearcher(searcher.ann, flat, replace(config, rerank_candidates=0))
+        found, ms = _knn_without_self(raw.search, queries, positions, k)
+        report[f"recall@{k}_without_rerank"] = recall(found)
+        report["ann_ms_per_query_without_rerank"] = round(ms, 3)
+    return report
+
+
+def evaluate_index(index_dir: str, config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG) -> Dict[str, object]:
+    """evaluate() sobre un índice publicado (no carga el modelo de embeddings ni los chunks)."""
+    flat = faiss.read_index(os.path.join(index_dir, VECTORS_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return evaluate(flat, load_ann_searcher(index_dir, flat, config), index_dir, config)
@@ -1,39 +1,318 @@
 # src/educhat/api.py
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from .graph import compile_graph
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-app = FastAPI(title="EduChatAgent API")
+# Solo imports ligeros aquí: LangChain/LangGraph/transformers se cargan en
+# startup.warm_up, fuera del camino de /health.
+from .courses import UnknownCourse, get_course, list_courses
+from .llm_scheduler import QueueFull, get_scheduler
+from .log_writer import get_log_writer
+from .startup import StartupReport, warm_up
 
-graph = compile_graph()  # compila LangGraph una vez al iniciar
+logger = logging.getLogger(__name__)
+
+# Si el arranque falla, segundos hasta reintentarlo (lo dispara /ready o la siguiente petición)
+WARMUP_RETRY_SECONDS = 30.0
+
+startup_report = StartupReport()
+
+
+class WarmupFailed(Exception):
+    """El arranque falló (p. ej. falta el índice FAISS); se reintenta pasados WARMUP_RETRY_SECONDS."""
+
+
+def _start_warmup() -> None:
+    global startup_report
+    previous = startup_report
+    if previous.error:
+        startup_report = StartupReport(attempt=previous.attempt + 1, previous_error=previous.error)
+    elif previous.ready:
+        startup_report = StartupReport()
+    app.state.warmup_failed_at = None
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(warm_up, startup_report))
+    app.state.warmup.add_done_callback(_warmup_done)
+
+
+def _warmup_done(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        app.state.warmup_failed_at = time.monotonic()
+
+
+def _retry_failed_warmup() -> None:
+    failed_at = app.state.warmup_failed_at
+    if failed_at is not None and time.monotonic() - failed_at >= WARMUP_RETRY_SECONDS:
+        logger.warning("Retrying EduChatAgent startup after: %s", startup_report.error)
+        _start_warmup()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El calentamiento (embeddings, FAISS, grafo, Ollama) corre en segundo plano:
+    # /health responde desde el primer momento y /ready cuando todo está cargado.
+    _start_warmup()
+    yield
+
+
+app = FastAPI(title="EduChatAgent API", lifespan=lifespan)
+
+
+async def get_graph():
+    """
+    Grafo compilado; si el arranque aún no terminó, espera a que termine.
+    Si falló, lanza WarmupFailed (503) y el arranque se reintenta más tarde.
+    """
+    _retry_failed_warmup()
+    report = startup_report
+    try:
+        graph, _ = await asyncio.shield(app.state.warmup)
+    except Exception as exc:
+        raise WarmupFailed(report.error or f"{type(exc).__name__}: {exc}") from exc
+    return graph
 
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    course_id: Optional[str] = None  # None = curso por defecto (ver courses.py)
 
 class ChatResponse(BaseModel):
     answer: str
 
+class BatchRequest(BaseModel):
+    messages: List[str] = Field(..., min_length=1, max_length=500)
+    stream: bool = False  # True: NDJSON, una línea por pregunta única según termina
+    course_id: Optional[str] = None
+
+class BatchItem(BaseModel):
+    message: str
+    answer: str = ""
+    mode: Optional[str] = None
+    cache_hit: bool = False
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchItem]
+    unique: int
+
 
 @app.get("/health")
 def health():
+    # Liveness: el proceso responde (no depende de modelos ni índices)
     return {"status": "ok", "message": "EduChatAgent API running"}
 
 
+@app.get("/ready")
+async def ready():
+    # Readiness: modelos e índice cargados y grafo compilado (503 mientras arranca o si falló)
+    _retry_failed_warmup()
+    status_code = 200 if startup_report.ready else 503
+    return JSONResponse(status_code=status_code, content=startup_report.as_dict())
+
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    # Back-pressure: el cliente debe reintentar más tarde
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+
+@app.exception_handler(WarmupFailed)
+async def warmup_failed_handler(request: Request, exc: WarmupFailed):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"EduChatAgent failed to start: {exc}", "startup": startup_report.as_dict()},
+        headers={"Retry-After": str(int(WARMUP_RETRY_SECONDS))},
+    )
+
+
+@app.exception_handler(UnknownCourse)
+async def unknown_course_handler(request: Request, exc: UnknownCourse):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+def _check_capacity():
+    if get_scheduler().saturated():
+        raise QueueFull("EduChatAgent is busy, please retry shortly")
+
+
+@app.get("/llm/stats")
+def llm_stats():
+    return get_scheduler().stats()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    from .response_cache import get_response_cache
+
+    return get_response_cache().stats()
+
+
+@app.get("/faq/stats")
+def faq_stats(course_id: Optional[str] = None):
+    # Respuestas servidas por plantilla y preguntas faq que acabaron en el LLM
+    from .faq_engine import get_faq_engine
+
+    return get_faq_engine(course_id).stats()
+
+
+@app.get("/logs/stats")
+def logs_stats():
+    # Registros en cola, escritos, descartados (cola llena) y rotaciones
+    return get_log_writer().stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Formato de texto de Prometheus: histogramas por nodo, por modo de ruta, LLM, RAG y caché
+    from .telemetry import get_registry
+
+    return PlainTextResponse(get_registry().render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/retrieval/stats")
+def retrieval_stats(course_id: Optional[str] = None):
+    from .context_builder import get_context_builder
+    from .tools import _get_retriever
+
+    return {**_get_retriever(course_id).stats(), "context": get_context_builder().stats()}
+
+
+@app.get("/courses")
+def courses():
+    # Cursos disponibles y estado del pool de índices (cargados, bytes, expulsiones, más pedidos)
+    from .index_pool import get_index_pool
+
+    return {"courses": list_courses(), "pool": get_index_pool().stats()}
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    state = {"user_input": req.message}
-    result = graph.invoke(
+async def chat(req: ChatRequest):
+    _check_capacity()
+    course = get_course(req.course_id)  # 404 si el curso no existe
+    graph = await get_graph()
+    state = {"user_input": req.message, "course_id": course.id}
+    t0 = time.perf_counter()
+    result = await graph.ainvoke(
         state,
         config={"configurable": {"thread_id": req.session_id}},
     )
+    get_log_writer().log_interaction("api", req.session_id, result, (time.perf_counter() - t0) * 1000)
     answer = result.get("final_answer", "")
     return ChatResponse(answer=answer)
 
 
+# Nodos cuyos tokens se reenvían al cliente (el router solo emite una palabra)
+STREAM_NODES = {"faq_node", "concept_node", "practice_node"}
+
+
+@app.post("/chat/batch", response_model=BatchResponse)
+async def chat_batch(req: BatchRequest):
+    """
+    Muchas preguntas de una vez (sin historial): se deduplican, se agrupan
+    embeddings y búsquedas, y el grafo corre con paralelismo acotado (ver batch.py).
+    """
+    from .batch import arun_batch, question_id
+
+    _check_capacity()
+    course = get_course(req.course_id)
+    graph = await get_graph()
+
+    if req.stream:
+        async def ndjson():
+            async for record in arun_batch(graph, req.messages, course_id=course.id):
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    records = {}
+    async for record in arun_batch(graph, req.messages, course_id=course.id):
+        records[record["id"]] = record
+
+    results = []
+    for message in req.messages:
+        record = records[question_id(message)]
+        results.append(
+            BatchItem(
+                message=message,
+                answer=record.get("answer", ""),
+                mode=record.get("mode"),
+                cache_hit=record.get("cache_hit", False),
+                error=record.get("error"),
+            )
+        )
+    return BatchResponse(results=results, unique=len(records))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Igual que /chat, pero devuelve Server-Sent Events:
+      - "node":  un nodo del grafo empieza a ejecutarse
+      - "route" / "retrieval_done" / "draft_started": progreso del pipeline
+      - "token": fragmento de texto generado por el LLM (de las salidas JSON,
+                 solo el texto del campo "answer")
+      - "done":  respuesta final (misma que devolvería /chat)
+    """
+    _check_capacity()
+    state = {"user_input": req.message, "course_id": get_course(req.course_id).id}
+    config = {"configurable": {"thread_id": req.session_id}}
+
+    graph = await get_graph()
+
+    async def event_stream():
+        from .json_output import AnswerStream
+
+        final_answer = ""
+        answers = {}  # run del LLM -> AnswerStream: del JSON solo se reenvía el texto de "answer"
+        t0 = time.perf_counter()
+        try:
+            async for ev in graph.astream_events(state, config=config, version="v2"):
+                kind = ev["event"]
+                node = ev.get("metadata", {}).get("langgraph_node")
+
+                if kind == "on_chain_start" and ev["name"] == node:
+                    yield _sse("node", {"node": node})
+                elif kind == "on_custom_event":
+                    yield _sse(ev["name"], ev["data"])
+                elif kind == "on_chat_model_stream" and node in STREAM_NODES:
+                    stream = answers.setdefault(ev["run_id"], AnswerStream())
+                    text = stream.feed(ev["data"]["chunk"].content or "")
+                    if text:
+                        yield _sse("token", {"node": node, "run": ev["run_id"], "text": text})
+                elif kind == "on_chain_end" and ev["name"] == "LangGraph":
+                    output = ev["data"].get("output") or {}
+                    final_answer = output.get("final_answer", "")
+                    get_log_writer().log_interaction(
+                        "api", req.session_id, output, (time.perf_counter() - t0) * 1000
+                    )
+        except Exception as exc:  # el cliente debe enterarse aunque el stream ya empezó
+            yield _sse("error", {"message": str(exc)})
+            return
+
+        yield _sse("done", {"answer": final_answer})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Interfaz web muy sencilla en la raíz "/"
 @app.get("/", response_class=HTMLResponse)
 def index():
@@ -47,7 +326,8 @@ def index():
     body { font-family: Arial, sans-serif; max-width: 800px; margin: 2rem auto; }
     #chat { border: 1px solid #ccc; padding: 1rem; height: 400px; overflow-y: auto; }
     .msg-user { font-weight: bold; margin-top: 0.5rem; }
-    .msg-bot { margin-left: 1rem; margin-bottom: 0.5rem; }
+    .msg-bot { margin-left: 1rem; margin-bottom: 0.5rem; white-space: pre-wrap; }
+    .msg-status { margin-left: 1rem; color: #888; font-size: 0.85rem; }
     #input-row { margin-top: 1rem; display: flex; gap: 0.5rem; }
     #message { flex: 1; padding: 0.5rem; }
     button { padding: 0.5rem 1rem; cursor: pointer; }
@@ -63,28 +343,91 @@ def index():
 
   <script>
     const sessionId = "andres-demo"; // podrías hacerlo aleatorio si quieres
+    // Curso: /?course=<id> (sin parámetro, el curso por defecto)
+    const courseId = new URLSearchParams(window.location.search).get("course");
 
+    // Lee la respuesta SSE de /chat/stream y va pintando los tokens
     async function sendMessage() {
       const input = document.getElementById("message");
       const text = input.value.trim();
       if (!text) return;
 
       const chat = document.getElementById("chat");
-      chat.innerHTML += `<div class="msg-user">You: ${text}</div>`;
+      const userDiv = document.createElement("div");
+      userDiv.className = "msg-user";
+      userDiv.textContent = `You: ${text}`;
+      chat.appendChild(userDiv);
+
+      const status = document.createElement("div");
+      status.className = "msg-status";
+      status.textContent = "Thinking...";
+      chat.appendChild(status);
+
+      const botDiv = document.createElement("div");
+      botDiv.className = "msg-bot";
+      botDiv.textContent = "EduChatAgent: ";
+      chat.appendChild(botDiv);
 
       input.value = "";
       input.focus();
 
-      const resp = await fetch("/chat", {
+      const resp = await fetch("/chat/stream", {
         method: "POST",
         headers: {"Content-Type": "application/json"},
-        body: JSON.stringify({ session_id: sessionId, message: text })
+        body: JSON.stringify({ session_id: sessionId, message: text, course_id: courseId })
       });
 
-      const data = await resp.json();
-      const answer = data.answer || "[no answer]";
-      chat.innerHTML += `<div class="msg-bot">EduChatAgent: ${answer}</div>`;
-      chat.scrollTop = chat.scrollHeight;
+      if (!resp.ok) {
+        const err = await resp.json().catch(() => ({}));
+        botDiv.textContent = `EduChatAgent: [error] ${err.detail || resp.status}`;
+        status.remove();
+        return;
+      }
+
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamed = "";
+      let currentRun = null;
+
+      function handle(event, data) {
+        if (event === "route") {
+          status.textContent = `Mode: ${data.mode}`;
+        } else if (event === "retrieval_done") {
+          status.textContent += " · course documents retrieved";
+        } else if (event === "token") {
+          // En concept hay dos llamadas al LLM (borrador + JSON): cada una reemplaza a la anterior
+          if (data.run !== currentRun) { currentRun = data.run; streamed = ""; }
+          streamed += data.text;
+          botDiv.textContent = `EduChatAgent: ${streamed}`;
+        } else if (event === "done") {
+          botDiv.textContent = `EduChatAgent: ${data.answer || streamed || "[no answer]"}`;
+          status.remove();
+        } else if (event === "error") {
+          botDiv.textContent = `EduChatAgent: [error] ${data.message}`;
+          status.remove();
+        }
+        chat.scrollTop = chat.scrollHeight;
+      }
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          const raw = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let event = "message";
+          let data = "";
+          for (const line of raw.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          if (data) handle(event, JSON.parse(data));
+        }
+      }
     }
 
     // Enter = enviar
@@ -0,0 +1,216 @@
+# src/educhat/batch.py
+
+"""
+Respuestas en lote: pre-responder un banco de preguntas antes de un examen o
+repetir las preguntas guardadas en logs/interactions.
+
+  - Las preguntas idénticas (ignorando mayúsculas y espacios) se responden una vez.
+  - Por cada lote de `batch_size` preguntas se hace un único embed_documents
+    y una única búsqueda FAISS (ver HybridRetriever.retrieve_many); la caché
+    semántica y el router reutilizan esos mismos embeddings.
+  - El grafo se ejecuta con `abatch_as_completed` y `max_concurrency`
+    ejecuciones en paralelo (el planificador sigue limitando Ollama).
+  - Cada respuesta se escribe en el JSONL de salida en cuanto termina; al
+    relanzar con el mismo fichero se saltan las preguntas ya respondidas.
+
+Uso:
+
+    python -m educhat.batch questions.txt --out logs/batch/answers.jsonl
+    python -m educhat.batch logs/interactions/*.jsonl* --out logs/batch/replay.jsonl
+"""
+
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Set
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from .config import BatchConfig, DEFAULT_BATCH_CONFIG
+
+INPUT_FIELDS = ("message", "user_input", "question")
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def question_id(text: str) -> str:
+    return hashlib.sha1(normalize_question(text).encode("utf-8")).hexdigest()[:16]
+
+
+def _question_of(item) -> Optional[str]:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        for key in INPUT_FIELDS:
+            if isinstance(item.get(key), str):
+                return item[key]
+    return None
+
+
+def load_questions(path: str) -> List[str]:
+    """
+    Lee preguntas de un .txt (una por línea), .json (lista) o .jsonl
+    (campo message / user_input / question; sirve para logs/interactions,
+    también los ficheros rotados .jsonl.gz).
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".jsonl.gz")):
+            items = [json.loads(line) for line in f if line.strip()]
+        elif path.endswith(".json"):
+            items = json.load(f)
+        else:
+            items = f.read().splitlines()
+    questions = [_question_of(item) for item in items]
+    return [q for q in questions if q and q.strip()]
+
+
+def dedupe(questions: List[str]) -> "OrderedDict[str, str]":
+    """id -> primera aparición de cada pregunta, en orden."""
+    unique: "OrderedDict[str, str]" = OrderedDict()
+    for q in questions:
+        unique.setdefault(question_id(q), q.strip())
+    return unique
+
+
+def _done_ids(out_path: str) -> Set[str]:
+    """Ids ya respondidos (sin error) en un JSONL de salida anterior."""
+    done: Set[str] = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # última línea a medio escribir si el proceso murió
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def _prefetch(questions: List[str], course_id: Optional[str] = None) -> None:
+    """Un embed_documents para todo el lote, compartido por caché, router y RAG."""
+    from .query_cache import get_query_cache
+    from .rag_store import get_embeddings
+    from .tools import prefetch_retrievals
+
+    vectors = get_embeddings().embed_documents(questions)
+    get_query_cache().prime(questions, vectors)
+    prefetch_retrievals(questions, vectors, course_id)
+
+
+async def arun_batch(
+    graph,
+    questions: List[str],
+    out_path: Optional[str] = None,
+    config: BatchConfig = DEFAULT_BATCH_CONFIG,
+    resume: bool = True,
+    course_id: Optional[str] = None,
+) -> AsyncIterator[Dict[str, object]]:
+    """
+    Responde las preguntas (todas del curso `course_id`) y va devolviendo un registro por pregunta única
+    (en orden de finalización): id, question, answer, mode, cache_hit,
+    duplicates, elapsed_ms y error.
+    """
+    unique = dedupe(questions)
+    counts: Dict[str, int] = {}
+    for q in questions:
+        qid = question_id(q)
+        counts[qid] = counts.get(qid, 0) + 1
+
+    done = _done_ids(out_path) if out_path and resume else set()
+    pending = [(qid, q) for qid, q in unique.items() if qid not in done]
+
+    # Cada pregunta en su propio thread: sin historial compartido entre ellas
+    run_id = uuid.uuid4().hex[:8]
+    out = None
+    if out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        out = open(out_path, "a", encoding="utf-8")
+    try:
+        for start in range(0, len(pending), config.batch_size):
+            chunk = pending[start:start + config.batch_size]
+            texts = [q for _, q in chunk]
+            await asyncio.to_thread(_prefetch, texts, course_id)
+
+            thread_ids = [f"batch-{run_id}-{qid}" for qid, _ in chunk]
+            configs = [
+                {"configurable": {"thread_id": tid}, "max_concurrency": config.max_concurrency}
+                for tid in thread_ids
+            ]
+            t0 = time.perf_counter()
+            async for i, result in graph.abatch_as_completed(
+                [{"user_input": q, "course_id": course_id} for q in texts], configs, return_exceptions=True
+            ):
+                qid, question = chunk[i]
+                record = {"id": qid, "question": question, "duplicates": counts[qid]}
+                if isinstance(result, Exception):
+                    record["error"] = f"{type(result).__name__}: {result}"
+                else:
+                    record.update(
+                        answer=result.get("final_answer", ""),
+                        mode=result.get("mode"),
+                        cache_hit=bool(result.get("cache_hit")),
+                    )
+                record["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+                if out:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                # No dejamos las sesiones de un solo turno en el checkpointer
+                await asyncio.to_thread(graph.checkpointer.delete_thread, thread_ids[i])
+                yield record
+    finally:
+        if out:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer many questions with EduChatAgent")
+    parser.add_argument("inputs", nargs="+", help=".txt / .json / .jsonl files (e.g. logs/interactions/*.jsonl)")
+    parser.add_argument("--out", default="logs/batch/answers.jsonl", help="output JSONL (appended, resumable)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_BATCH_CONFIG.max_concurrency)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_CONFIG.batch_size)
+    parser.add_argument("--no-resume", action="store_true", help="answer everything again")
+    parser.add_argument("--course", help="course id (default: the default course, see courses.py)")
+    args = parser.parse_args()
+
+    questions = [q for path in args.inputs for q in load_questions(path)]
+    unique = dedupe(questions)
+    print(f"Loaded {len(questions)} questions ({len(unique)} unique) from {len(args.inputs)} file(s)")
+
+    from .startup import warm_up
+
+    graph, report = warm_up()
+    print(f"EduChatAgent ready in {sum(report.phases_ms.values()):.0f} ms")
+
+    config = BatchConfig(batch_size=args.batch_size, max_concurrency=args.concurrency)
+
+    async def run():
+        answered = errors = 0
+        t0 = time.perf_counter()
+        async for record in arun_batch(
+            graph, questions, args.out, config, resume=not args.no_resume, course_id=args.course
+        ):
+            answered += 1
+            errors += bool(record.get("error"))
+            print(f"[{answered}] {record.get('mode') or 'error'}: {record['question'][:70]}")
+        return answered, errors, time.perf_counter() - t0
+
+    answered, errors, elapsed = asyncio.run(run())
+    skipped = len(unique) - answered
+    print(
+        f"✅ {answered} answered ({errors} errors, {skipped} already in {args.out}) "
+        f"in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,793 @@
+# src/educhat/benchmark.py
+
+"""
+Benchmark de latencia de extremo a extremo.
+
+Modo grafo (por defecto): ejecuta el grafo de graph.compile_graph con el
+índice FAISS real y un sustituto determinista de Ollama (MockChatModel, con
+TTFT y tokens/s configurables, pasando por el mismo planificador). Mide:
+
+  - latencia por nodo: router, retrieval (y retrieval_wait, la parte que
+    no queda oculta tras el router), context, draft, json_rewrite, memory
+  - tokens de prompt de cada llamada al LLM y del contexto recuperado antes
+    y después del ensamblado (context_builder.py)
+  - latencia total (p50/p95/p99) y throughput con N sesiones concurrentes
+
+Modo API (--url): generador de carga contra la API FastAPI ya arrancada
+(/chat o, con --stream, /chat/stream midiendo también el TTFT).
+
+Modo prefill (--prefill): necesita Ollama. Envía los prompts de FAQ y de
+concepto con el orden actual (prefijo fijo + sufijo variable) y con el orden
+anterior (sufijo variable delante), generando un solo token, y compara el
+tiempo de evaluación del prompt (prompt_eval_duration) que devuelve Ollama.
+
+Modo embeddings (--embeddings): compara los motores de embeddings.py
+(torch, onnx, onnx_int8) sobre los chunks del curso: paridad con torch
+(similitud coseno mínima y media), documentos/s para varios tamaños de lote
+(el mejor es el que conviene poner en EmbeddingConfig.batch_size) y
+consultas/s con N hilos concurrentes, con y sin micro-batching.
+
+Los resultados se guardan en JSON (logs/bench/) con el commit de git, para
+poder comparar entre commits con --compare.
+
+Uso (desde src/):
+    python -m educhat.benchmark --concurrency 1 4 8
+    python -m educhat.benchmark --tps 25 --ttft-ms 400 --turns 3
+    python -m educhat.benchmark --url http://127.0.0.1:8000 --stream --concurrency 4
+    python -m educhat.benchmark --compare logs/bench/<anterior>.json
+    python -m educhat.benchmark --no-speculative   # recuperación después del router
+    python -m educhat.benchmark --prefill --rounds 20  # caché KV del prefijo (Ollama real)
+    python -m educhat.benchmark --embeddings --batch-sizes 16 32 64 128
+"""
+
+from collections import defaultdict
+from dataclasses import asdict, replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .config import (
+    BenchmarkConfig,
+    CheckpointConfig,
+    EmbeddingConfig,
+    DEFAULT_BENCHMARK_CONFIG,
+    DEFAULT_CONFIG_LOW_TEMP,
+    DEFAULT_EMBEDDING_CONFIG,
+    DEFAULT_PIPELINE_CONFIG,
+    DEFAULT_SCHEDULER_CONFIG,
+    LLMConfig,
+    PipelineConfig,
+)
+from .llm_factory import SchedulerSlotMixin
+from .llm_scheduler import PRIORITY_GENERATION, PRIORITY_ROUTER, get_scheduler
+from .router_eval import EVAL_SET
+from .session_memory import count_tokens
+
+OUT_DIR = "logs/bench"
+ANSWER_NODES = ("faq_node", "concept_node", "practice_node")
+
+_FILLER = (
+    "a relational database stores data in tables whose rows are identified by a primary key "
+    "and related to other tables through foreign keys so that queries can join them"
+).split()
+
+
+# ---------------------------------------------------------------------------
+# LLM simulado
+# ---------------------------------------------------------------------------
+
+class _MockOllama(BaseChatModel):
+    """
+    Sustituto determinista de Ollama: misma respuesta para el mismo prompt,
+    con `ttft_ms` de espera inicial y `tokens_per_second` de generación.
+    """
+
+    tokens_per_second: float = DEFAULT_BENCHMARK_CONFIG.tokens_per_second
+    ttft_ms: float = DEFAULT_BENCHMARK_CONFIG.ttft_ms
+    answer_tokens: int = DEFAULT_BENCHMARK_CONFIG.answer_tokens
+    structured: bool = False  # equivalente a format=schema
+
+    @property
+    def _llm_type(self) -> str:
+        return "educhat-mock"
+
+    def _filler(self, prompt: str, n: int) -> str:
+        start = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16) % len(_FILLER)
+        return " ".join(_FILLER[(start + i) % len(_FILLER)] for i in range(n))
+
+    def _reply(self, messages) -> str:
+        prompt = str(messages[-1].content)
+        if getattr(self, "priority", None) == PRIORITY_ROUTER:
+            for question, mode in EVAL_SET:
+                if question in prompt:
+                    return mode
+            return "concept"
+        if self.structured or "JSON" in prompt:
+            return json.dumps(
+                {
+                    "answer": self._filler(prompt, self.answer_tokens),
+                    "key_points": [self._filler(prompt[::-1], 8), self._filler(prompt[1:], 8)],
+                    "references": ["UC1 - Fundamentals and Database Design"],
+                }
+            )
+        return self._filler(prompt, self.answer_tokens)
+
+    def _tokens(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self.ttft_ms / 1000 + len(self._tokens(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        await asyncio.sleep(self.ttft_ms / 1000 + len(self._tokens(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.ttft_ms / 1000)
+        for token in self._tokens(self._reply(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(1 / self.tokens_per_second)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.ttft_ms / 1000)
+        for token in self._tokens(self._reply(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+class MockChatModel(SchedulerSlotMixin, _MockOllama):
+    """LLM simulado que, como ScheduledChatOllama, pasa por la cola del planificador."""
+
+    priority: int = PRIORITY_GENERATION
+
+
+def mock_llm_factories(config: BenchmarkConfig = DEFAULT_BENCHMARK_CONFIG):
+    """Funciones con la firma de make_hf_llm / make_json_llm para compile_graph."""
+    profile = dict(
+        tokens_per_second=config.tokens_per_second,
+        ttft_ms=config.ttft_ms,
+        answer_tokens=config.answer_tokens,
+    )
+
+    def make_llm(llm_config, priority: int = PRIORITY_GENERATION):
+        return MockChatModel(priority=priority, **profile)
+
+    def make_structured_llm(llm_config, schema: dict, priority: int = PRIORITY_GENERATION):
+        return MockChatModel(priority=priority, structured=True, **profile)
+
+    return make_llm, make_structured_llm
+
+
+# ---------------------------------------------------------------------------
+# Medida por nodo (callbacks de LangChain)
+# ---------------------------------------------------------------------------
+
+class RequestTrace(BaseCallbackHandler):
+    """Recoge, para una petición, la duración de cada nodo y de cada llamada al LLM."""
+
+    run_inline = True  # en ainvoke, sin saltar a un executor (los tiempos serían otros)
+
+    def __init__(self):
+        self.nodes_ms: Dict[str, float] = defaultdict(float)
+        self.llm_calls: List[Dict[str, Any]] = []  # node, ms, prompt_tokens (en orden)
+        self.retrieval_ms: Optional[float] = None
+        self.retrieval_wait_ms: Optional[float] = None
+        self.context: Optional[Dict[str, Any]] = None  # informe de context_built
+        self.total_ms = 0.0
+        self._runs: Dict[Any, tuple] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._runs[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self._runs:
+            node, t0 = self._runs.pop(run_id)
+            self.nodes_ms[node] += (time.perf_counter() - t0) * 1000
+
+    on_chain_error = on_chain_end
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        tokens = sum(count_tokens(str(m.content)) for m in messages[0])
+        self._runs[run_id] = ((metadata or {}).get("langgraph_node"), time.perf_counter(), tokens)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id in self._runs:
+            node, t0, tokens = self._runs.pop(run_id)
+            self.llm_calls.append(
+                {"node": node, "ms": (time.perf_counter() - t0) * 1000, "prompt_tokens": tokens}
+            )
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name == "retrieval_done":
+            self.retrieval_ms = data.get("timings_ms", {}).get("total")
+            self.retrieval_wait_ms = data.get("wait_ms")
+        elif name == "context_built":
+            self.context = data
+
+    def stages(self) -> Dict[str, float]:
+        """Agrupa en las etapas del informe."""
+        out = {"total": self.total_ms}
+        for node in ("router", "memory_node", "cache"):
+            if node in self.nodes_ms:
+                out[node.replace("_node", "")] = self.nodes_ms[node]
+        if self.retrieval_ms is not None:
+            out["retrieval"] = self.retrieval_ms
+        if self.retrieval_wait_ms is not None:  # parte de la recuperación en el camino crítico
+            out["retrieval_wait"] = self.retrieval_wait_ms
+        if self.context is not None:
+            out["context"] = self.context["ms"]
+        answer_calls = [c for c in self.llm_calls if c["node"] in ANSWER_NODES]
+        if answer_calls:
+            out["draft"] = answer_calls[0]["ms"]
+        if len(answer_calls) > 1:  # concept en modo two_pass: borrador + reescritura a JSON
+            out["json_rewrite"] = answer_calls[1]["ms"]
+        return out
+
+    def prompt_tokens(self) -> Dict[str, int]:
+        out = {}
+        answer_calls = [c for c in self.llm_calls if c["node"] in ANSWER_NODES]
+        for label, call in zip(("draft", "json_rewrite"), answer_calls):
+            out[label] = call["prompt_tokens"]
+        for call in self.llm_calls:
+            if call["node"] == "router":
+                out["router"] = call["prompt_tokens"]
+        if self.context is not None:  # contexto recuperado antes y después del ensamblado
+            out["context_retrieved"] = self.context["tokens_before"]
+            out["context"] = self.context["tokens"]
+        return out
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    arr = np.asarray(values, dtype=float)
+    if not arr.size:
+        return {"n": 0}
+    return {
+        "n": int(arr.size),
+        "mean": round(float(arr.mean()), 2),
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "p99": round(float(np.percentile(arr, 99)), 2),
+        "max": round(float(arr.max()), 2),
+    }
+
+
+def _questions() -> List[str]:
+    return [q for q, _ in EVAL_SET]
+
+
+# ---------------------------------------------------------------------------
+# Modo grafo
+# ---------------------------------------------------------------------------
+
+async def run_graph_load(graph, concurrency: int, turns: int) -> Dict[str, Any]:
+    """`concurrency` sesiones en paralelo, cada una con `turns` preguntas seguidas."""
+    questions = _questions()
+    run_id = uuid.uuid4().hex[:8]
+    traces: List[RequestTrace] = []
+    errors: List[str] = []
+
+    async def session(i: int):
+        for t in range(turns):
+            question = questions[(i * turns + t) % len(questions)]
+            trace = RequestTrace()
+            t0 = time.perf_counter()
+            try:
+                await graph.ainvoke(
+                    {"user_input": question},
+                    config={"configurable": {"thread_id": f"bench-{run_id}-{i}"}, "callbacks": [trace]},
+                )
+            except Exception as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+                continue
+            trace.total_ms = (time.perf_counter() - t0) * 1000
+            traces.append(trace)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    tokens: Dict[str, List[float]] = defaultdict(list)
+    for trace in traces:
+        for stage, ms in trace.stages().items():
+            stages[stage].append(ms)
+        for label, n in trace.prompt_tokens().items():
+            tokens[label].append(n)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(traces),
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(traces) / wall, 3) if wall else 0.0,
+        "latency_ms": {stage: percentiles(v) for stage, v in sorted(stages.items())},
+        "prompt_tokens": {label: percentiles(v) for label, v in sorted(tokens.items())},
+        "scheduler": get_scheduler().stats()["queue_wait_ms"],
+    }
+
+
+def run_graph_benchmark(
+    levels: List[int],
+    config: BenchmarkConfig = DEFAULT_BENCHMARK_CONFIG,
+    use_cache: bool = False,
+    pipeline_config: PipelineConfig = DEFAULT_PIPELINE_CONFIG,
+) -> Dict[str, Any]:
+    from .graph import compile_graph
+    from .local_router import get_local_router
+    from .query_cache import get_query_cache
+    from .response_cache import get_response_cache
+    from .tools import _get_retriever
+
+    # Carga de modelos e índice fuera de la medida
+    _get_retriever().retrieve("warm up")
+    get_local_router().classify("warm up")
+    if not use_cache:
+        # Las preguntas se repiten entre sesiones: con la caché solo mediríamos aciertos
+        cache = get_response_cache()
+        cache.config = replace(cache.config, enabled=False)
+        # ...y con la caché de consultas la recuperación de una pregunta repetida no costaría nada
+        get_query_cache().max_entries = 0
+
+    make_llm, make_structured_llm = mock_llm_factories(config)
+    checkpoints = CheckpointConfig(
+        path=os.path.join(tempfile.mkdtemp(prefix="educhat-bench-"), "bench.sqlite3"),
+        maintenance_interval_seconds=0,
+    )
+    graph = compile_graph(
+        checkpoint_config=checkpoints,
+        make_llm=make_llm,
+        make_structured_llm=make_structured_llm,
+        pipeline_config=pipeline_config,
+    )
+
+    results = []
+    for level in levels:
+        result = asyncio.run(run_graph_load(graph, level, config.turns_per_session))
+        _print_level(result)
+        results.append(result)
+    return {"mode": "graph", "mock_llm": asdict(config), "use_cache": use_cache, "levels": results}
+
+
+# ---------------------------------------------------------------------------
+# Modo API (generador de carga)
+# ---------------------------------------------------------------------------
+
+async def _post_stream(client, url: str, payload: dict) -> Dict[str, float]:
+    """Consume /chat/stream y devuelve ttft (primer token) y total en ms."""
+    t0 = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", url + "/chat/stream", json=payload) as resp:
+        if resp.status_code != 200:
+            return {"status": resp.status_code}
+        async for line in resp.aiter_lines():
+            if line.startswith("event: token") and ttft is None:
+                ttft = (time.perf_counter() - t0) * 1000
+            elif line.startswith("event: done"):
+                break
+    total = (time.perf_counter() - t0) * 1000
+    return {"status": 200, "ttft": ttft if ttft is not None else total, "total": total}
+
+
+async def run_http_load(url: str, concurrency: int, turns: int, stream: bool) -> Dict[str, Any]:
+    import httpx
+
+    questions = _questions()
+    run_id = uuid.uuid4().hex[:8]
+    totals: List[float] = []
+    ttfts: List[float] = []
+    statuses: Dict[str, int] = defaultdict(int)
+
+    async with httpx.AsyncClient(timeout=600) as client:
+
+        async def session(i: int):
+            for t in range(turns):
+                payload = {
+                    "session_id": f"bench-{run_id}-{i}",
+                    "message": questions[(i * turns + t) % len(questions)],
+                }
+                try:
+                    if stream:
+                        out = await _post_stream(client, url, payload)
+                    else:
+                        t0 = time.perf_counter()
+                        resp = await client.post(url + "/chat", json=payload)
+                        out = {"status": resp.status_code, "total": (time.perf_counter() - t0) * 1000}
+                except httpx.HTTPError as exc:
+                    statuses[type(exc).__name__] += 1
+                    continue
+                statuses[str(out["status"])] += 1
+                if out["status"] == 200:
+                    totals.append(out["total"])
+                    if "ttft" in out:
+                        ttfts.append(out["ttft"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session(i) for i in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    latency = {"total": percentiles(totals)}
+    if ttfts:
+        latency["ttft"] = percentiles(ttfts)
+    return {
+        "concurrency": concurrency,
+        "requests": len(totals),
+        "statuses": dict(statuses),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(totals) / wall, 3) if wall else 0.0,
+        "latency_ms": latency,
+    }
+
+
+def run_http_benchmark(url: str, levels: List[int], turns: int, stream: bool) -> Dict[str, Any]:
+    results = []
+    for level in levels:
+        result = asyncio.run(run_http_load(url.rstrip("/"), level, turns, stream))
+        _print_level(result)
+        results.append(result)
+    return {"mode": "http", "url": url, "stream": stream, "levels": results}
+
+
+# ---------------------------------------------------------------------------
+# Modo prefill (Ollama real)
+# ---------------------------------------------------------------------------
+
+LAYOUTS = ("prefix_first", "variable_first")
+
+
+def _render(name: str, layout: str, variables: Dict[str, str]) -> str:
+    """Prompt `name` con el orden actual o con el sufijo variable delante (orden anterior)."""
+    from .prompts import PROMPT_LAYOUTS
+
+    prefix, suffix = PROMPT_LAYOUTS[name]
+    prefix, suffix = prefix.format(**variables), suffix.format(**variables)
+    return (prefix + suffix if layout == "prefix_first" else suffix + prefix).strip()
+
+
+def run_prefill_benchmark(llm_config: LLMConfig, rounds: int) -> Dict[str, Any]:
+    """
+    Para cada prompt y orden envía `rounds` preguntas distintas seguidas (la
+    primera de cada serie solo calienta) y mide prompt_eval_duration: con el
+    prefijo fijo delante Ollama reutiliza su caché KV y solo evalúa el sufijo.
+    """
+    from .courses import course_info, get_course
+    from .llm_factory import make_hf_llm, ollama_options, warm_up_model
+    from .tools import course_rag_retrieve, format_context
+
+    warm_up_model(llm_config)
+    client = make_hf_llm(llm_config)._client
+    options = {**ollama_options(llm_config), "num_predict": 1}
+
+    questions = _questions()
+    contexts = {q: format_context(course_rag_retrieve(q).docs) for q in questions[: rounds + 1]}
+    results: Dict[str, Any] = {}
+    for name in ("faq", "concept"):
+        for layout in LAYOUTS:
+            eval_ms: List[float] = []
+            eval_tokens: List[float] = []
+            for i, question in enumerate(list(contexts)[: rounds + 1]):
+                text = _render(
+                    name,
+                    layout,
+                    {
+                        "course_name": get_course().name,
+                        "course_info": course_info(),
+                        "user_input": question,
+                        "history": "",
+                        "retrieved_context": contexts[question],
+                    },
+                )
+                resp = client.chat(
+                    model=llm_config.model_id,
+                    messages=[{"role": "user", "content": text}],
+                    options=options,
+                    keep_alive=llm_config.keep_alive,
+                )
+                if i == 0:
+                    continue
+                eval_ms.append((resp.get("prompt_eval_duration") or 0) / 1e6)
+                eval_tokens.append(resp.get("prompt_eval_count") or 0)
+            results[f"{name}/{layout}"] = {
+                "prompt_eval_ms": percentiles(eval_ms),
+                "prompt_eval_tokens": percentiles(eval_tokens),
+            }
+
+    summary = {}
+    for name in ("faq", "concept"):
+        new = results[f"{name}/prefix_first"]["prompt_eval_ms"].get("p50", 0.0)
+        old = results[f"{name}/variable_first"]["prompt_eval_ms"].get("p50", 0.0)
+        summary[name] = {
+            "prefill_p50_ms": {"prefix_first": new, "variable_first": old},
+            "saved_ms": round(old - new, 2),
+            "saved_pct": round((old - new) / old * 100, 1) if old else 0.0,
+        }
+        print(
+            f"  {name:<8} prefill p50 {old:>8.1f} ms (variable first) -> {new:>8.1f} ms (prefix first)"
+            f"  saved {summary[name]['saved_pct']:.1f}%"
+        )
+    return {
+        "mode": "prefill",
+        "llm": asdict(llm_config),
+        "rounds": rounds,
+        "results": results,
+        "summary": summary,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Modo embeddings
+# ---------------------------------------------------------------------------
+
+def _chunk_texts(n: int) -> List[str]:
+    """n textos a partir de los chunks del curso por defecto (repetidos si hacen falta)."""
+    from .chunking import chunk_text
+    from .courses import get_course
+    from .data_loader import load_txt_sources
+
+    texts = [
+        doc.page_content
+        for source, text in load_txt_sources(get_course().raw_dir)
+        for doc in chunk_text(text, source)
+    ]
+    return (texts * (n // max(1, len(texts)) + 1))[:n]
+
+
+def _query_throughput(embed_query, queries: List[str], concurrency: int) -> Dict[str, float]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    latencies: List[float] = []
+
+    def one(query: str) -> None:
+        t0 = time.perf_counter()
+        embed_query(query)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    elapsed = time.perf_counter() - start
+    return {"qps": round(len(queries) / elapsed, 1), **{f"{k}_ms": v for k, v in percentiles(latencies).items()}}
+
+
+def run_embedding_benchmark(
+    embedding_config: EmbeddingConfig,
+    docs: int,
+    batch_sizes: List[int],
+    concurrency: int,
+) -> Dict[str, Any]:
+    """
+    Para cada motor: documentos/s por tamaño de lote, consultas/s con
+    `concurrency` hilos (sin y con micro-batching) y paridad con torch.
+    """
+    from .embeddings import BACKENDS, BatchingEmbeddings, make_embeddings, parity, resolve_backend
+
+    texts = _chunk_texts(docs)
+    queries = [q for q in _questions() for _ in range(4)]
+    results: Dict[str, Any] = {}
+    reference: Optional[List[List[float]]] = None
+    for backend in BACKENDS:
+        config = replace(embedding_config, backend=backend)
+        if resolve_backend(config) != backend:
+            print(f"  {backend:<10} not available (onnxruntime missing)")
+            continue
+        engine = make_embeddings(config)
+        engine.embed_documents(texts[:8])  # calentamiento
+
+        docs_per_s: Dict[str, float] = {}
+        vectors: List[List[float]] = []
+        for batch_size in batch_sizes:
+            engine = make_embeddings(replace(config, batch_size=batch_size))
+            t0 = time.perf_counter()
+            vectors = engine.embed_documents(texts)
+            docs_per_s[str(batch_size)] = round(len(texts) / (time.perf_counter() - t0), 1)
+        best = max(docs_per_s, key=docs_per_s.get)
+
+        batched = BatchingEmbeddings(engine, config.micro_batch or 32, config.micro_batch_wait_ms)
+        result: Dict[str, Any] = {
+            "docs_per_s": docs_per_s,
+            "best_batch_size": int(best),
+            "query_single": _query_throughput(engine.embed_query, queries, 1),
+            "query_concurrent": _query_throughput(engine.embed_query, queries, concurrency),
+            "query_microbatched": _query_throughput(batched.embed_query, queries, concurrency),
+            "micro_batches": batched.stats(),
+        }
+        if reference is None:
+            reference = vectors
+        else:
+            result["parity"] = parity(reference, vectors)
+            result["parity"]["ok"] = result["parity"]["min_cosine"] >= embedding_config.parity_min_cosine
+        results[backend] = result
+
+        line = (
+            f"  {backend:<10} docs/s={docs_per_s[best]:>8.1f} (batch {best})  "
+            f"queries/s c={concurrency}: {result['query_concurrent']['qps']:>7.1f} -> "
+            f"{result['query_microbatched']['qps']:>7.1f} micro-batched "
+            f"(mean batch {result['micro_batches']['mean_batch']:.1f})"
+        )
+        if "parity" in result:
+            line += f"  min cosine vs torch {result['parity']['min_cosine']:.4f}"
+            line += "" if result["parity"]["ok"] else "  PARITY FAILED"
+        print(line)
+
+    from .embeddings import embedding_threads
+
+    return {
+        "mode": "embeddings",
+        "embedding": asdict(embedding_config),
+        "threads": embedding_threads(embedding_config),
+        "docs": len(texts),
+        "concurrency": concurrency,
+        "results": results,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Informe y comparación
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_level(result: Dict[str, Any]) -> None:
+    total = result["latency_ms"].get("total", {})
+    print(
+        f"  concurrency={result['concurrency']:<3} requests={result['requests']:<4} "
+        f"throughput={result['throughput_rps']:.2f} req/s  "
+        f"p50={total.get('p50', 0):.0f} p95={total.get('p95', 0):.0f} p99={total.get('p99', 0):.0f} ms"
+    )
+    for stage, stats in result["latency_ms"].items():
+        if stage != "total" and stats.get("n"):
+            print(f"      {stage:<13} p50={stats['p50']:>8.1f}  p95={stats['p95']:>8.1f} ms")
+
+
+def _flatten(report: Dict[str, Any]) -> Dict[str, float]:
+    """concurrency/stage/percentil -> valor, para comparar dos informes."""
+    flat = {}
+    for key, stats in report.get("results", {}).items():
+        if report.get("mode") == "embeddings":
+            flat[f"{key}/docs_per_s"] = max(stats["docs_per_s"].values())
+            for kind in ("query_single", "query_concurrent", "query_microbatched"):
+                flat[f"{key}/{kind}/qps"] = stats[kind]["qps"]
+            continue
+        for pct in ("p50", "p95"):  # modo prefill
+            if pct in stats["prompt_eval_ms"]:
+                flat[f"{key}/prompt_eval/{pct}"] = stats["prompt_eval_ms"][pct]
+    for level in report.get("levels", []):
+        for stage, stats in level.get("latency_ms", {}).items():
+            for key in ("p50", "p95", "p99"):
+                if key in stats:
+                    flat[f"c{level['concurrency']}/{stage}/{key}"] = stats[key]
+        flat[f"c{level['concurrency']}/throughput_rps"] = level.get("throughput_rps", 0.0)
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    old, new = _flatten(baseline), _flatten(current)
+    lines = []
+    for key in sorted(set(old) & set(new)):
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        lines.append(f"{key:<32} {old[key]:>10.2f} -> {new[key]:>10.2f}  ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark for EduChatAgent")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8],
+                        help="concurrent sessions per run (one run per value)")
+    parser.add_argument("--turns", type=int, default=DEFAULT_BENCHMARK_CONFIG.turns_per_session,
+                        help="questions per session")
+    parser.add_argument("--tps", type=float, default=DEFAULT_BENCHMARK_CONFIG.tokens_per_second,
+                        help="mock LLM tokens per second")
+    parser.add_argument("--ttft-ms", type=float, default=DEFAULT_BENCHMARK_CONFIG.ttft_ms,
+                        help="mock LLM time to first token")
+    parser.add_argument("--answer-tokens", type=int, default=DEFAULT_BENCHMARK_CONFIG.answer_tokens)
+    parser.add_argument("--with-cache", action="store_true",
+                        help="keep the semantic response cache and the query cache on")
+    parser.add_argument("--no-speculative", action="store_true",
+                        help="start retrieval after routing instead of during the router LLM call")
+    parser.add_argument("--url", help="load-test a running API instead of the in-process graph")
+    parser.add_argument("--prefill", action="store_true",
+                        help="measure Ollama prompt prefill with the prefix-first vs variable-first layout")
+    parser.add_argument("--rounds", type=int, default=10, help="with --prefill: prompts per layout")
+    parser.add_argument("--embeddings", action="store_true",
+                        help="compare the torch / onnx / onnx_int8 embedding backends (parity and throughput)")
+    parser.add_argument("--docs", type=int, default=512, help="with --embeddings: documents to encode")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64, 128],
+                        help="with --embeddings: document batch sizes to try")
+    parser.add_argument("--stream", action="store_true", help="with --url: use /chat/stream and measure TTFT")
+    parser.add_argument("--out", help=f"output JSON (default: {OUT_DIR}/bench-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="previous benchmark JSON to compare against")
+    args = parser.parse_args()
+
+    config = BenchmarkConfig(
+        tokens_per_second=args.tps,
+        ttft_ms=args.ttft_ms,
+        answer_tokens=args.answer_tokens,
+        turns_per_session=args.turns,
+    )
+    commit = _git_commit()
+    if args.embeddings:
+        target = "embedding backends"
+    elif args.prefill:
+        target = "Ollama prefill"
+    else:
+        target = "API " + args.url if args.url else "graph + mock LLM"
+    print(f"Benchmark ({target}), commit {commit}")
+
+    if args.embeddings:
+        report = run_embedding_benchmark(
+            DEFAULT_EMBEDDING_CONFIG, args.docs, args.batch_sizes, max(args.concurrency)
+        )
+    elif args.prefill:
+        report = run_prefill_benchmark(DEFAULT_CONFIG_LOW_TEMP, args.rounds)
+    elif args.url:
+        report = run_http_benchmark(args.url, args.concurrency, args.turns, args.stream)
+    else:
+        pipeline = replace(DEFAULT_PIPELINE_CONFIG, speculative_retrieval=not args.no_speculative)
+        report = run_graph_benchmark(
+            args.concurrency, config, use_cache=args.with_cache, pipeline_config=pipeline
+        )
+
+    from .rag_store import current_index_version
+
+    report["meta"] = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "concept_mode": DEFAULT_PIPELINE_CONFIG.concept_mode,
+        "speculative_retrieval": not args.no_speculative,
+        "index_version": current_index_version(),
+        "scheduler": asdict(DEFAULT_SCHEDULER_CONFIG),
+    }
+
+    out = args.out or os.path.join(
+        OUT_DIR, f"bench-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Saved report in {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nChanges vs {args.compare} (commit {baseline.get('meta', {}).get('commit')}):")
+        for line in compare(baseline, report):
+            print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,97 @@
 # src/educhat/build_rag.py
 
-from .data_loader import load_txt_files
-from .rag_store import build_vector_store
+import argparse
+import time
+from dataclasses import replace
+
+from .ann_index import KINDS, evaluate_index
+from .config import DEFAULT_CHUNK_CONFIG, DEFAULT_INGEST_CONFIG, DEFAULT_VECTOR_INDEX_CONFIG
+from .courses import get_course
+from .data_loader import TxtSources
+from .ingest import DEDUP_MODES, IngestStats, describe_stats
+from .rag_store import current_index_dir, update_vector_store
+
+
+def _progress_printer(every_s: float):
+    """Callback de update_vector_store que imprime el progreso como mucho cada `every_s` segundos."""
+    last = 0.0
+
+    def show(stats: IngestStats) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        if now - last >= every_s:
+            last = now
+            print("  " + stats.line(), flush=True)
+
+    return show
 
 def main():
-    texts = load_txt_files("data/raw")
-    print(f"Loaded {len(texts)} documents from data/raw")
-    build_vector_store(texts)
-    print("✅ Vector store built in data/processed/chroma")
+    parser = argparse.ArgumentParser(description="Index the course documents in data/raw")
+    parser.add_argument("--full", action="store_true", help="re-embed everything, ignoring the manifest")
+    parser.add_argument("--course", help="course id: index data/courses/<id>/raw (default: data/raw)")
+    parser.add_argument(
+        "--index-kind", choices=("auto",) + KINDS, default=DEFAULT_VECTOR_INDEX_CONFIG.kind,
+        help="ANN index published next to the flat index (auto = by number of vectors)",
+    )
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_VECTOR_INDEX_CONFIG.nprobe, help="IVF lists visited per query")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_VECTOR_INDEX_CONFIG.ef_search, help="HNSW queue size per query")
+    parser.add_argument(
+        "--rerank-candidates", type=int, default=DEFAULT_VECTOR_INDEX_CONFIG.rerank_candidates,
+        help="ANN candidates re-scored with exact distances (0 = no exact rerank)",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=DEFAULT_INGEST_CONFIG.embed_processes,
+        help="embedding worker processes (0 = in this process)",
+    )
+    parser.add_argument(
+        "--dedup", choices=DEDUP_MODES, default=DEFAULT_INGEST_CONFIG.dedup,
+        help="drop exact or near-duplicate chunks (changing it re-embeds everything)",
+    )
+    parser.add_argument("--report", action="store_true", help="only print the recall/memory report of the published index")
+    args = parser.parse_args()
+
+    index_config = replace(
+        DEFAULT_VECTOR_INDEX_CONFIG,
+        kind=args.index_kind,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        rerank_candidates=args.rerank_candidates,
+    )
+    ingest_config = replace(DEFAULT_INGEST_CONFIG, embed_processes=args.processes, dedup=args.dedup)
+    course = get_course(args.course)
+
+    if not args.report:
+        sources = TxtSources(course.raw_dir)
+        print(f"Streaming {len(sources)} documents from {course.raw_dir} (course {course.id})")
+        print(
+            f"Chunking with chunk_size={DEFAULT_CHUNK_CONFIG.chunk_size}, "
+            f"overlap={DEFAULT_CHUNK_CONFIG.chunk_overlap}"
+        )
+        summary = update_vector_store(
+            sources,
+            persist_dir=course.index_dir,
+            chunk_config=DEFAULT_CHUNK_CONFIG,
+            force=args.full,
+            index_config=index_config,
+            ingest_config=ingest_config,
+            progress=_progress_printer(ingest_config.progress_every_s),
+        )
+        print(
+            f"Chunks: +{summary['added']} added, -{summary['removed']} removed, "
+            f"{summary['unchanged']} unchanged, {summary['duplicates']} duplicates skipped "
+            f"({summary['files_changed']} files changed)"
+        )
+        if summary["published"]:
+            print("Ingest: " + describe_stats(summary["ingest"]))
+            print(f"✅ Vector store {summary['version']} published in {course.index_dir}")
+        else:
+            print(f"✅ Vector store {summary['version']} is up to date")
+        if summary["vector_index"]:
+            print("Vector index: " + ", ".join(f"{key}={value}" for key, value in summary["vector_index"].items()))
+
+    # Recall frente al índice plano y memoria por vector, con los parámetros de búsqueda dados
+    report = evaluate_index(current_index_dir(course.index_dir), index_config)
+    print("Search report: " + ", ".join(f"{key}={value}" for key, value in report.items()))
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,7 @@
 # src/educhat/chains.py
 
+from typing import Optional
+
 from langchain_classic.chains import LLMChain, SequentialChain
 from langchain_classic.memory import ConversationBufferMemory
 
@@ -7,6 +9,7 @@ from .prompts import (
     router_prompt,
     faq_prompt,
     concept_prompt,
+    concept_json_prompt,
     structured_json_prompt,
 )
 
@@ -33,9 +36,10 @@ def build_router_chain(llm) -> LLMChain:
     )
 
 
-def build_faq_chain(llm, memory: ConversationBufferMemory) -> LLMChain:
+def build_faq_chain(llm, memory: Optional[ConversationBufferMemory] = None) -> LLMChain:
     """
     Chain used for FAQ-style questions (logistics, grading, schedule).
+    Without `memory`, the caller passes "history" explicitly (per-session memory).
     """
     return LLMChain(
         llm=llm,
@@ -45,7 +49,7 @@ def build_faq_chain(llm, memory: ConversationBufferMemory) -> LLMChain:
     )
 
 
-def build_concept_sequential_chain(llm, memory: ConversationBufferMemory) -> SequentialChain:
+def build_concept_sequential_chain(llm, memory: Optional[ConversationBufferMemory] = None) -> SequentialChain:
     """
     SequentialChain for CONCEPT questions.
     Step 1: generate a pedagogical draft answer using RAG context.
@@ -66,18 +70,34 @@ def build_concept_sequential_chain(llm, memory: ConversationBufferMemory) -> Seq
 
     chain = SequentialChain(
         chains=[draft_chain, json_chain],
-        input_variables=["user_input", "history", "retrieved_context"],
+        input_variables=["course_name", "user_input", "history", "retrieved_context"],
         output_variables=["draft_answer", "json_answer"],
         verbose=False,
     )
     return chain
 
 
+def build_concept_json_chain(llm, memory: Optional[ConversationBufferMemory] = None) -> LLMChain:
+    """
+    Single-pass chain for CONCEPT questions.
+    Generates the structured JSON object (answer + key_points + references)
+    directly from the RAG context. Meant to be used with an LLM whose output
+    is constrained to ANSWER_SCHEMA (see llm_factory.make_json_llm).
+    """
+    return LLMChain(
+        llm=llm,
+        prompt=concept_json_prompt,
+        memory=memory,
+        output_key="json_answer",
+    )
+
+
 def build_practice_chain(llm) -> LLMChain:
     """
     Chain used for PRACTICE questions.
 
     It expects:
+      - "course_name": name of the course (see courses.py)
       - "user_input": what the student wants to practice
       - "retrieved_context": course documents with examples / quizzes
     """
@@ -0,0 +1,263 @@
+# src/educhat/checkpoint_store.py
+
+"""
+Checkpointers de LangGraph para las sesiones (thread_id).
+
+- "memory": InMemorySaver, como antes (todo en RAM, se pierde al reiniciar).
+- "sqlite": SqliteSaver sobre un fichero en modo WAL con un pool de
+  conexiones, de modo que varios workers de uvicorn comparten las sesiones,
+  los lectores no se bloquean entre sí y reiniciar no pierde nada.
+
+Ambos registran la última actividad de cada sesión para poder expulsar las
+sesiones inactivas (TTL), y recortan el historial de checkpoints de cada
+thread a los `keep_per_thread` más recientes. Un hilo de mantenimiento
+(`start_maintenance`) ejecuta las dos tareas periódicamente.
+"""
+
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .config import CheckpointConfig, DEFAULT_CHECKPOINT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # seguro con WAL y mucho más rápido que FULL
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver con un pool de conexiones en lugar de una conexión + lock global.
+
+    Con WAL varias conexiones pueden leer a la vez mientras otra escribe; las
+    escrituras concurrentes esperan con busy_timeout. Los métodos async se
+    ejecutan en hilos (asyncio.to_thread), así la API puede usar
+    ainvoke/astream_events sin bloquear el event loop.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        super().__init__(_connect(path))
+        self.path = path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(_connect(path))
+        self._setup_activity()
+
+    def _setup_activity(self) -> None:
+        with self.lock:
+            self.setup()
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity ("
+                "thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        self.setup()
+        conn = self._pool.get()
+        try:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                if transaction:
+                    conn.commit()
+                cur.close()
+        finally:
+            self._pool.put(conn)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+        return next_config
+
+    # -------- mantenimiento -------- #
+
+    def prune(self, keep_per_thread: int) -> int:
+        """Borra los checkpoints antiguos de cada thread; devuelve cuántos."""
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns
+                            ORDER BY checkpoint_id DESC
+                        ) AS rn
+                        FROM checkpoints
+                    ) WHERE rn > ?
+                )
+                """,
+                (keep_per_thread,),
+            )
+            removed = cur.rowcount
+            cur.execute(
+                """
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                      AND c.checkpoint_ns = writes.checkpoint_ns
+                      AND c.checkpoint_id = writes.checkpoint_id
+                )
+                """
+            )
+        return removed
+
+    def evict_idle(self, ttl_seconds: float) -> List[str]:
+        """Elimina las sesiones sin actividad en los últimos ttl_seconds."""
+        cutoff = time.time() - ttl_seconds
+        with self.cursor(transaction=False) as cur:
+            idle = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_seen < ?", (cutoff,)
+            )]
+        for thread_id in idle:
+            self.delete_thread(thread_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+        return idle
+
+    # -------- API async (en hilos) -------- #
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class EvictingInMemorySaver(InMemorySaver):
+    """
+    InMemorySaver que también sabe recortar historial y expulsar sesiones inactivas.
+
+    put/put_writes llegan de las peticiones y prune/evict_idle del hilo de
+    mantenimiento: todos pasan por el mismo lock. Al recortar se borran
+    también los blobs (valores de los canales) que ya no usa ningún
+    checkpoint del thread; si no, la memoria por sesión seguiría creciendo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config):
+        with self._lock:
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            self._last_seen[str(config["configurable"]["thread_id"])] = time.time()
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_seen.pop(str(thread_id), None)
+
+    def prune(self, keep_per_thread: int) -> int:
+        removed = 0
+        with self._lock:
+            pruned = set()
+            for thread_id, namespaces in list(self.storage.items()):
+                for ns, checkpoints in list(namespaces.items()):
+                    for checkpoint_id in sorted(checkpoints, reverse=True)[keep_per_thread:]:
+                        checkpoints.pop(checkpoint_id, None)
+                        self.writes.pop((thread_id, ns, checkpoint_id), None)
+                        pruned.add(thread_id)
+                        removed += 1
+            if pruned:
+                self._drop_unused_blobs(pruned)
+        return removed
+
+    def _drop_unused_blobs(self, thread_ids: set) -> None:
+        """Borra los blobs de esos threads que no aparecen en channel_versions de ningún checkpoint."""
+        used = set()
+        for thread_id in thread_ids:
+            for ns, checkpoints in self.storage[thread_id].items():
+                for checkpoint, _, _ in checkpoints.values():
+                    versions = self.serde.loads_typed(checkpoint)["channel_versions"]
+                    used.update((thread_id, ns, channel, version) for channel, version in versions.items())
+        for key in [k for k in self.blobs if k[0] in thread_ids and k not in used]:
+            del self.blobs[key]
+
+    def evict_idle(self, ttl_seconds: float) -> List[str]:
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            idle = [t for t, seen in self._last_seen.items() if seen < cutoff]
+            for thread_id in idle:
+                self.delete_thread(thread_id)
+        return idle
+
+
+def make_checkpointer(config: CheckpointConfig = DEFAULT_CHECKPOINT_CONFIG):
+    if config.backend == "memory":
+        return EvictingInMemorySaver()
+    if config.backend == "sqlite":
+        return PooledSqliteSaver(config.path, pool_size=config.pool_size)
+    raise ValueError(f"Unknown checkpoint backend: {config.backend!r}")
+
+
+def run_maintenance(saver, config: CheckpointConfig = DEFAULT_CHECKPOINT_CONFIG) -> Dict[str, int]:
+    evicted = saver.evict_idle(config.session_ttl_seconds)
+    pruned = saver.prune(config.keep_per_thread)
+    if evicted or pruned:
+        logger.info("Checkpoint maintenance: %d idle sessions evicted, %d checkpoints pruned",
+                    len(evicted), pruned)
+    return {"evicted_sessions": len(evicted), "pruned_checkpoints": pruned}
+
+
+def start_maintenance(saver, config: CheckpointConfig = DEFAULT_CHECKPOINT_CONFIG) -> Optional[threading.Thread]:
+    """Lanza un hilo daemon que ejecuta run_maintenance cada maintenance_interval_seconds."""
+    if config.maintenance_interval_seconds <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(config.maintenance_interval_seconds)
+            try:
+                run_maintenance(saver, config)
+            except Exception:
+                logger.exception("Checkpoint maintenance failed")
+
+    thread = threading.Thread(target=loop, name="educhat-checkpoint-maintenance", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,219 @@
+# src/educhat/chunking.py
+
+"""
+Troceado (chunking) de los documentos del curso antes de indexarlos.
+
+Antes cada fichero .txt era un único Document, así que el retriever devolvía
+ficheros enteros (el sílabo completo, el banco de quizzes completo...) y el
+prompt de concept se llenaba de miles de tokens. Aquí partimos cada fichero
+respetando su estructura:
+
+  - Encabezados "=== TITULO ===" y bloques subrayados con "=====" / "-----".
+  - Líneas de unidad "UC1: ...", "UC2: ...".
+  - Ítems de quiz "[Q1]", "[Q2]"... (un ítem por chunk).
+  - Dentro de cada sección se empaquetan párrafos (y, si hace falta, filas
+    sueltas de tablas/listas) hasta `chunk_size` caracteres, con solape.
+
+Cada chunk lleva metadatos: source, unit, section y chunk (índice).
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .config import ChunkConfig, DEFAULT_CHUNK_CONFIG
+
+_BANNER_RE = re.compile(r"^=+\s*(.+?)\s*=+$")      # === CONTENTS ===
+_RULE_RE = re.compile(r"^(=|-){5,}\s*$")           # ===== o -----
+_QUIZ_RE = re.compile(r"^\[Q\d+\]$")               # [Q1]
+_UNIT_LINE_RE = re.compile(r"^UC\d+\s*:")          # UC1: Fundamentals ...
+_UNIT_RE = re.compile(r"\bUC\s?(\d+)\b", re.IGNORECASE)
+_FILE_UNIT_RE = re.compile(r"uc(\d+)", re.IGNORECASE)
+
+
+def _unit_of(text: str) -> Optional[str]:
+    m = _UNIT_RE.search(text)
+    return f"UC{m.group(1)}" if m else None
+
+
+def split_sections(text: str, source: str = "") -> List[Tuple[str, str, List[str]]]:
+    """
+    Divide un texto en secciones según sus encabezados.
+    Devuelve una lista de (section, unit, lineas).
+    """
+    m = _FILE_UNIT_RE.search(source)
+    file_unit = f"UC{m.group(1)}" if m else ""
+
+    lines = text.splitlines()
+    sections: List[Tuple[str, str, List[str]]] = []
+
+    top = ""          # encabezado de primer nivel actual
+    section = ""      # sección actual (puede ser top / UCx / top / Qn)
+    unit = file_unit
+    current: List[str] = []
+
+    def flush():
+        if any(line.strip() for line in current):
+            sections.append((section, unit, list(current)))
+        current.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        stripped = line.strip()
+
+        # Bloque subrayado:  =====\nTITULO\n=====
+        if (
+            _RULE_RE.match(stripped)
+            and i + 2 < len(lines)
+            and lines[i + 1].strip()
+            and _RULE_RE.match(lines[i + 2].strip())
+        ):
+            flush()
+            title = lines[i + 1].strip()
+            if stripped.startswith("="):
+                top = section = title
+                unit = _unit_of(title) or file_unit
+            else:
+                # subsección "-----": cuelga del encabezado de primer nivel
+                section = f"{top} / {title}" if top else title
+            i += 3
+            continue
+
+        banner = _BANNER_RE.match(stripped)
+        if banner and not _RULE_RE.match(stripped):
+            flush()
+            top = section = banner.group(1)
+            unit = _unit_of(top) or file_unit
+            i += 1
+            continue
+
+        if _UNIT_LINE_RE.match(stripped):
+            flush()
+            section = stripped
+            unit = _unit_of(stripped) or unit
+            current.append(line)
+            i += 1
+            continue
+
+        if _QUIZ_RE.match(stripped):
+            flush()
+            section = f"{top} / {stripped}" if top else stripped
+            i += 1
+            continue
+
+        current.append(line)
+        i += 1
+
+    flush()
+    return sections
+
+
+def _paragraphs(lines: List[str]) -> List[str]:
+    paras, buf = [], []
+    for line in lines:
+        if line.strip():
+            buf.append(line)
+        elif buf:
+            paras.append("\n".join(buf))
+            buf = []
+    if buf:
+        paras.append("\n".join(buf))
+    return paras
+
+
+def _pieces(paragraph: str, chunk_size: int) -> List[str]:
+    """Parte un párrafo demasiado largo en filas y, si hace falta, en trozos fijos."""
+    if len(paragraph) <= chunk_size:
+        return [paragraph]
+    out = []
+    for row in paragraph.splitlines():
+        while len(row) > chunk_size:
+            out.append(row[:chunk_size])
+            row = row[chunk_size:]
+        if row.strip():
+            out.append(row)
+    return out
+
+
+def _pack(pieces: List[str], chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Empaqueta piezas en chunks de hasta chunk_size caracteres con solape."""
+    chunks: List[str] = []
+    window: List[str] = []
+    size = 0
+    fresh = 0  # piezas nuevas (no solapadas) en la ventana actual
+
+    for piece in pieces:
+        if window and size + len(piece) + 2 > chunk_size:
+            if fresh:
+                chunks.append("\n\n".join(window))
+            # Solape: arrastramos las últimas piezas que quepan en chunk_overlap
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(window):
+                if carried + len(prev) > chunk_overlap:
+                    break
+                carry.insert(0, prev)
+                carried += len(prev) + 2
+            # ...siempre que quepan junto a la pieza nueva
+            while carry and carried + len(piece) + 2 > chunk_size:
+                carried -= len(carry.pop(0)) + 2
+            window, size, fresh = carry, carried, 0
+        window.append(piece)
+        size += len(piece) + 2
+        fresh += 1
+
+    if window and fresh:
+        chunks.append("\n\n".join(window))
+    return chunks
+
+
+def chunk_text(
+    text: str,
+    source: str = "",
+    config: ChunkConfig = DEFAULT_CHUNK_CONFIG,
+) -> List[Document]:
+    """
+    Trocea un documento del curso en Documents pequeños con metadatos
+    (source, unit, section, chunk).
+    """
+    docs: List[Document] = []
+    for section, unit, lines in split_sections(text, source):
+        # El título se antepone a cada chunk: le dejamos sitio para no pasar de
+        # chunk_size (salvo títulos de más de media ventana, que son anómalos)
+        budget = config.chunk_size
+        if section:
+            budget = max(config.chunk_size - len(section) - 1, config.chunk_size // 2)
+
+        pieces: List[str] = []
+        for para in _paragraphs(lines):
+            pieces.extend(_pieces(para, budget))
+
+        for body in _pack(pieces, budget, config.chunk_overlap):
+            # Repetimos el título de la sección para que el chunk se entienda solo
+            content = body if not section or body.startswith(section) else f"{section}\n{body}"
+            docs.append(
+                Document(
+                    page_content=content,
+                    metadata={
+                        "source": source,
+                        "unit": unit,
+                        "section": section,
+                        "chunk": len(docs),
+                    },
+                )
+            )
+    return docs
+
+
+def chunk_sources(
+    sources: List[Tuple[str, str]],
+    config: ChunkConfig = DEFAULT_CHUNK_CONFIG,
+) -> List[Document]:
+    """Trocea una lista de (source, texto) tal como la devuelve data_loader."""
+    docs: List[Document] = []
+    for source, text in sources:
+        if text.strip():
+            docs.extend(chunk_text(text, source, config))
+    return docs
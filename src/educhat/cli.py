@@ -1,26 +1,28 @@
 # src/educhat/cli.py
 
-from datetime import datetime
-import json
-import os
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
 
-from .graph import compile_graph
-
-LOG_DIR = "logs/interactions"
-
-
-def ensure_dir(path: str):
-    os.makedirs(path, exist_ok=True)
+from .courses import get_course
+from .log_writer import get_log_writer
+from .startup import warm_up
 
 
 def run_cli():
-    print("🔄 Compiling EduChatAgent graph, please wait...\n")
-    graph = compile_graph()
-    ensure_dir(LOG_DIR)
-    print("✅ EduChatAgent ready.\n")
-
-    session = input("Session id (e.g. andres): ").strip() or "default"
-    print("\nType your questions about the DATABASES course.")
+    print("🔄 Loading EduChatAgent in the background...\n")
+    # Mientras el usuario escribe el id de sesión se cargan modelos, índice y grafo
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        warmup = pool.submit(warm_up)
+        session = input("Session id (e.g. andres): ").strip() or "default"
+        course = get_course(input("Course id (Enter = default course): ").strip() or None)
+        graph, report = warmup.result()
+
+    phases = ", ".join(f"{k} {v:.0f} ms" for k, v in report.phases_ms.items())
+    print(f"\n✅ EduChatAgent ready ({phases}).")
+    for warning in report.warnings:
+        print(f"⚠️  {warning}")
+    print(f"\nType your questions about the {course.name.upper()} course.")
     print("Type 'exit' to quit.\n")
 
     while True:
@@ -35,13 +37,16 @@ def run_cli():
             break
 
         # Estado inicial para el grafo
-        state = {"user_input": user}
+        state = {"user_input": user, "course_id": course.id}
         print("\n[EduChatAgent] Generating answer, please wait...\n")
 
-        # Invocamos LangGraph (usa RAG + chains + memoria)
-        result = graph.invoke(
-            state,
-            config={"configurable": {"thread_id": session}},
+        # Invocamos LangGraph (usa RAG + chains + memoria); los nodos del LLM son async
+        t0 = time.perf_counter()
+        result = asyncio.run(
+            graph.ainvoke(
+                state,
+                config={"configurable": {"thread_id": session}},
+            )
         )
 
         answer = result.get("final_answer", "").strip()
@@ -50,20 +55,8 @@ def run_cli():
 
         print(f"\nEduChatAgent:\n{answer}\n")
 
-        # Log a JSONL
-        ensure_dir(LOG_DIR)
-        entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "session_id": session,
-            "user_input": user,
-            "state": result,
-        }
-        with open(
-            os.path.join(LOG_DIR, f"{session}.jsonl"),
-            "a",
-            encoding="utf-8",
-        ) as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # Log en segundo plano (campos de LoggingConfig, con la traza de telemetry.py)
+        get_log_writer().log_interaction("cli", session, result, (time.perf_counter() - t0) * 1000)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 # src/educhat/config.py
 from dataclasses import dataclass
+from typing import Optional, Tuple
 
 @dataclass
 class LLMConfig:
@@ -8,7 +9,12 @@ class LLMConfig:
     temperature: float = 0.2
     top_p: float = 0.9
     top_k: int = 40
-    max_new_tokens: int = 128 # podemos usarlo más adelante si queremos limitar
+    max_new_tokens: int = 512  # límite de tokens generados (num_predict de Ollama)
+    num_predict: Optional[int] = None  # si se da, sustituye a max_new_tokens (-1 = sin límite)
+    # Ventana de contexto: la misma en todas las instancias, porque si cambia
+    # Ollama recarga el modelo y pierde la caché KV del prefijo de los prompts
+    num_ctx: int = 4096
+    keep_alive: str = "30m"  # cuánto tiempo sigue cargado el modelo (y su caché KV) sin peticiones
 
 # Configuración por defecto: Ollama con gemma3:4b
 DEFAULT_CONFIG_LOW_TEMP = LLMConfig(
@@ -16,5 +22,281 @@ DEFAULT_CONFIG_LOW_TEMP = LLMConfig(
     temperature=0.2,
     top_p=0.9,
     top_k=40,
-    max_new_tokens=128,
+    max_new_tokens=512,
+    num_ctx=4096,
+    keep_alive="30m",
 )
+
+
+@dataclass
+class ChunkConfig:
+    chunk_size: int = 800     # máximo de caracteres por chunk
+    chunk_overlap: int = 120  # caracteres que se repiten entre chunks consecutivos
+
+
+DEFAULT_CHUNK_CONFIG = ChunkConfig()
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = True
+    similarity_threshold: float = 0.92  # coseno mínimo para considerar dos preguntas iguales
+    ttl_seconds: float = 24 * 3600
+    max_entries: int = 1000             # LRU: se expulsa la entrada menos usada
+    path: Optional[str] = None          # p.ej. "data/cache/responses.sqlite3" para persistir
+
+
+DEFAULT_CACHE_CONFIG = CacheConfig()
+
+
+@dataclass
+class RouterConfig:
+    confidence_threshold: float = 0.55  # por debajo de esto se consulta al router LLM
+    llm_fallback: bool = True
+    temperature: float = 0.05           # softmax sobre similitudes coseno (más bajo = más seguro)
+
+
+DEFAULT_ROUTER_CONFIG = RouterConfig()
+
+
+@dataclass
+class PipelineConfig:
+    # "single_pass": una sola llamada que genera directamente el JSON (format=schema en Ollama)
+    # "two_pass":    borrador + reescritura a JSON (SequentialChain original)
+    concept_mode: str = "single_pass"
+    # Mientras el router LLM decide la ruta, la recuperación de contexto ya
+    # corre en segundo plano (se aprovecha en concept/practice, se descarta en faq)
+    speculative_retrieval: bool = True
+
+
+DEFAULT_PIPELINE_CONFIG = PipelineConfig()
+
+
+@dataclass
+class MemoryConfig:
+    window_turns: int = 6           # turnos recientes que se guardan literalmente
+    max_history_tokens: int = 512   # presupuesto total del historial (resumen + ventana)
+    max_turn_tokens: int = 160      # cada respuesta del agente se recorta a esto
+    summary_max_tokens: int = 160   # tamaño máximo del resumen acumulado
+
+
+DEFAULT_MEMORY_CONFIG = MemoryConfig()
+
+
+@dataclass
+class CheckpointConfig:
+    backend: str = "sqlite"                     # "sqlite" (persistente, multi-worker) o "memory"
+    path: str = "data/checkpoints/educhat.sqlite3"
+    pool_size: int = 4                          # conexiones SQLite por proceso
+    keep_per_thread: int = 5                    # checkpoints que se conservan por sesión
+    session_ttl_seconds: float = 7 * 24 * 3600  # sesiones inactivas más tiempo se borran
+    maintenance_interval_seconds: float = 600   # 0 desactiva el hilo de mantenimiento
+
+
+DEFAULT_CHECKPOINT_CONFIG = CheckpointConfig()
+
+
+@dataclass
+class SchedulerConfig:
+    max_in_flight: int = 2              # llamadas simultáneas a Ollama (ver OLLAMA_NUM_PARALLEL)
+    max_queue: int = 32                 # más allá de esto la API responde 429
+    queue_timeout_seconds: float = 120  # espera máxima en cola antes de rendirse
+
+
+DEFAULT_SCHEDULER_CONFIG = SchedulerConfig()
+
+
+@dataclass
+class RetrievalConfig:
+    top_k: int = 4                 # chunks que llegan al prompt
+    vector_k: int = 12             # candidatos de FAISS
+    bm25_k: int = 12               # candidatos de BM25
+    rrf_k: int = 60                # constante de Reciprocal Rank Fusion
+    # Cross-encoder opcional (p. ej. "cross-encoder/ms-marco-MiniLM-L-6-v2"); None = sin reranking
+    reranker_model: Optional[str] = None
+    rerank_candidates: int = 8     # cuántos candidatos fusionados se reordenan
+    rerank_budget_ms: float = 150.0  # presupuesto de latencia del reranker por consulta
+    # Caché LRU de consultas (embedding + ids recuperados, ver query_cache.py); 0 = desactivada
+    query_cache_entries: int = 2048
+
+
+DEFAULT_RETRIEVAL_CONFIG = RetrievalConfig()
+
+
+@dataclass
+class BatchConfig:
+    batch_size: int = 32         # preguntas por lote de embeddings/recuperación
+    max_concurrency: int = 2     # ejecuciones del grafo en paralelo (el planificador limita Ollama)
+
+
+DEFAULT_BATCH_CONFIG = BatchConfig()
+
+
+@dataclass
+class BenchmarkConfig:
+    # LLM simulado (sustituye a Ollama en benchmark.py)
+    tokens_per_second: float = 40.0   # velocidad de generación
+    ttft_ms: float = 250.0            # tiempo hasta el primer token
+    answer_tokens: int = 120          # longitud de las respuestas generadas
+    # Carga
+    turns_per_session: int = 5        # preguntas seguidas por sesión (ejercita la memoria)
+
+
+DEFAULT_BENCHMARK_CONFIG = BenchmarkConfig()
+
+
+@dataclass
+class TelemetryConfig:
+    enabled: bool = True
+    # Fichero JSONL donde se escriben los spans (formato compatible con OTLP/JSON); None = no se escriben
+    spans_path: Optional[str] = None
+    recent_requests: int = 200  # resúmenes por petición que se guardan (cli.py los añade a su log)
+
+
+DEFAULT_TELEMETRY_CONFIG = TelemetryConfig()
+
+
+@dataclass
+class FaqConfig:
+    enabled: bool = True
+    raw_dir: str = "data/raw"   # evaluation.txt y syllabus.txt de donde sale la base de FAQ
+    max_words: int = 25         # preguntas más largas van siempre al LLM
+    # Preguntas faq que no encajan en ninguna plantilla (JSONL); None = solo se cuentan
+    misses_path: Optional[str] = "logs/faq/misses.jsonl"
+    # Preguntas distintas que se cuentan para stats()["top_misses"]; al pasar
+    # el límite se conservan solo las más frecuentes (la mitad)
+    max_tracked_misses: int = 1000
+
+
+DEFAULT_FAQ_CONFIG = FaqConfig()
+
+
+@dataclass
+class LoggingConfig:
+    enabled: bool = True
+    dir: str = "logs/interactions"   # interactions.jsonl (+ ficheros rotados .jsonl.gz)
+    max_queue: int = 10_000          # registros pendientes; si la cola está llena se descartan
+    batch_size: int = 256            # registros por escritura
+    flush_interval_seconds: float = 1.0
+    # Rotación: por tamaño o por antigüedad del fichero actual
+    max_bytes: int = 20 * 1024 * 1024
+    max_age_seconds: float = 24 * 3600
+    compress: bool = True            # gzip de los ficheros rotados
+    keep_rotated: int = 20           # ficheros rotados que se conservan por log
+    # Campos de cada interacción. "context_hash" y "chunk_ids" sustituyen al
+    # contexto completo; también se admiten "retrieved_context", "history",
+    # "draft_answer" y "json_answer" (texto completo, crecen con la sesión).
+    fields: Tuple[str, ...] = (
+        "course_id", "user_input", "mode", "cache_hit", "final_answer", "context_hash", "chunk_ids", "trace",
+    )
+
+
+DEFAULT_LOGGING_CONFIG = LoggingConfig()
+
+
+@dataclass
+class CourseConfig:
+    # Curso de siempre: sus documentos están en data/raw y su índice en rag_store.FAISS_DIR
+    default_course: str = "databases"
+    default_course_name: str = "Databases"
+    # Resto de cursos: <courses_dir>/<id>/raw (+ course.json opcional) y <index_root>/<id>/faiss
+    courses_dir: str = "data/courses"
+    index_root: str = "data/processed/courses"
+    # Pool de índices cargados (ver index_pool.py): se expulsa el menos usado sin peticiones en curso
+    max_loaded: int = 8
+    max_bytes: int = 1024 * 1024 * 1024  # tamaño en disco de los índices cargados
+    # Precarga de los cursos más pedidos (contador con decaimiento exponencial)
+    prefetch_hot: int = 2
+    hot_half_life_seconds: float = 600.0
+    prefetch_interval_seconds: float = 30.0  # 0 = sin hilo de precarga
+    faq_engines: int = 32  # bases de FAQ por curso que se mantienen en memoria
+
+
+DEFAULT_COURSE_CONFIG = CourseConfig()
+
+
+@dataclass
+class VectorIndexConfig:
+    # Tipo de índice ANN que build_rag publica junto al índice plano (ver ann_index.py):
+    # "auto" (según el número de vectores), "flat", "ivf_flat", "hnsw", "ivf_sq8" o "ivf_pq"
+    kind: str = "auto"
+    # Umbrales de "auto": hasta flat_max_vectors plano, luego HNSW, luego IVF-SQ8 (int8), luego IVF-PQ
+    flat_max_vectors: int = 20_000
+    hnsw_max_vectors: int = 200_000
+    sq8_max_vectors: int = 2_000_000
+    # Construcción
+    nlist: int = 0                # listas de IVF; 0 = 4 * sqrt(n)
+    train_sample: int = 100_000   # vectores con los que se entrena IVF/PQ
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    pq_m: int = 48                # subcuantizadores de PQ (384 / 48 = 8 dimensiones cada uno)
+    pq_bits: int = 8
+    # Búsqueda (no hace falta reconstruir para cambiarlos)
+    nprobe: int = 16              # listas de IVF que se recorren por consulta
+    ef_search: int = 64           # tamaño de la cola de HNSW por consulta
+    # Rerank exacto: se piden rerank_candidates al ANN y se reordenan con los
+    # vectores float32 del índice plano (mmap); 0 = sin rerank
+    rerank_candidates: int = 48
+    # Informe de build_rag: recall@k frente al índice plano sobre recall_queries consultas
+    recall_queries: int = 200
+    recall_k: int = 10
+
+
+DEFAULT_VECTOR_INDEX_CONFIG = VectorIndexConfig()
+
+
+@dataclass
+class EmbeddingConfig:
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Motor (ver embeddings.py): "torch" (sentence-transformers), "onnx" (ONNX Runtime, fp32)
+    # u "onnx_int8" (ONNX Runtime con cuantización dinámica int8); cambiarlo reconstruye el índice
+    backend: str = "torch"
+    onnx_dir: str = "data/processed/onnx"  # modelo exportado a ONNX (se exporta la primera vez)
+    max_length: int = 256                  # tokens por texto (el max_seq_length de MiniLM)
+    batch_size: int = 64                   # textos por forward al indexar (benchmark --embeddings)
+    # Hilos de cómputo; 0 = núcleos / workers de uvicorn (WEB_CONCURRENCY), para no sobresuscribir la CPU
+    num_threads: int = 0
+    # Micro-batching de consultas concurrentes en un solo forward; 0 = sin micro-batching
+    micro_batch: int = 32
+    micro_batch_wait_ms: float = 0.0  # espera extra para juntar más; 0 = solo las que ya esperan
+    parity_min_cosine: float = 0.99   # benchmark --embeddings: similitud mínima con torch
+
+
+DEFAULT_EMBEDDING_CONFIG = EmbeddingConfig()
+
+
+@dataclass
+class IngestConfig:
+    # Chunks casi idénticos (ver ingest.py): "off", "exact" (mismo texto normalizado) o "near" (MinHash)
+    dedup: str = "near"
+    near_threshold: float = 0.9   # similitud de Jaccard estimada a partir de la que es duplicado
+    shingle_words: int = 5        # palabras por shingle
+    minhash_perms: int = 64       # tamaño de la firma MinHash
+    lsh_bands: int = 16           # bandas LSH para encontrar candidatos (minhash_perms / lsh_bands filas)
+    # Embeddings por lotes acotados
+    embed_batch: int = 128        # chunks por lote
+    embed_processes: int = 0      # procesos que calculan embeddings; 0 = en este proceso
+    max_pending_batches: int = 0  # lotes en vuelo como máximo; 0 = 2 por proceso
+    progress_every_s: float = 2.0  # build_rag: cada cuánto se imprime el progreso
+
+
+DEFAULT_INGEST_CONFIG = IngestConfig()
+
+
+@dataclass
+class ContextConfig:
+    # Ensamblado del contexto recuperado antes del prompt (ver context_builder.py)
+    enabled: bool = True
+    # Tokenizer de Hugging Face del modelo (p. ej. "google/gemma-3-4b-it" o una ruta local);
+    # None = aproximación de session_memory.count_tokens (4 caracteres por token)
+    tokenizer: Optional[str] = None
+    concept_tokens: int = 700       # presupuesto del contexto en concept
+    practice_tokens: int = 1000     # presupuesto del contexto en practice
+    granularity: str = "sentence"   # "sentence" (compresión extractiva) o "chunk" (chunks enteros)
+    duplicate_similarity: float = 0.95  # coseno a partir del cual dos frases se consideran la misma
+    sentence_cache_entries: int = 8192  # embeddings de frases en la LRU (~1.5 KB cada uno)
+    # Estimación inicial del prefill (tokens/s); se ajusta con lo que mide Ollama en cada llamada
+    prefill_tokens_per_s: float = 150.0
+
+
+DEFAULT_CONTEXT_CONFIG = ContextConfig()
@@ -0,0 +1,429 @@
+# src/educhat/context_builder.py
+
+"""
+Ensamblado del contexto recuperado con presupuesto de tokens.
+
+Antes course_rag_search unía los chunks con "---" y el texto iba entero a
+concept_prompt / structured_json_prompt, fuera cual fuera su longitud.
+Ahora ContextBuilder.build:
+
+  1. parte cada chunk en frases (y líneas de listas) y quita las repetidas:
+     los chunks consecutivos de un fichero se solapan (chunk_overlap) y
+     varios ficheros repiten párrafos;
+  2. si el resultado cabe en el presupuesto del modo (concept_tokens,
+     practice_tokens) se usa tal cual;
+  3. si no, compresión extractiva: cada frase se puntúa por similitud coseno
+     con la consulta (el mismo MiniLM del índice) y se eligen las mejores
+     hasta llenar el presupuesto, saltando las casi idénticas a otra ya
+     elegida. Las frases vuelven a su orden dentro de cada chunk y los
+     chunks mantienen el orden de la recuperación. Con granularity="chunk"
+     se eligen chunks enteros, sin embeddings.
+
+Cada pasaje lleva delante su etiqueta de origen ([fichero · sección]), que
+el modelo copia en el campo "references". Los tokens se cuentan con el
+tokenizer del modelo si ContextConfig.tokenizer lo indica.
+
+Cada petición publica un informe (evento context_built, ver graph.py):
+tokens antes y después y el prefill ahorrado estimado, con la velocidad de
+prefill que Ollama reporta en cada llamada (observe_prefill, telemetry.py).
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .config import ContextConfig, DEFAULT_CONTEXT_CONFIG
+from .query_cache import get_query_cache
+from .rag_store import get_embeddings
+from .session_memory import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n---\n\n"
+GRANULARITIES = ("sentence", "chunk")
+
+# Fin de frase seguido de algo que empieza frase (mayúscula, número, comillas, ¿ ¡)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(¿¡]?[A-ZÁÉÍÓÚÑ0-9])")
+
+
+# ---------------------------------------------------------------------------
+# Conteo de tokens y velocidad de prefill
+# ---------------------------------------------------------------------------
+
+class TokenCounter:
+    """Tokens según el tokenizer del modelo o, sin él, la aproximación de session_memory."""
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self.name = "approx"
+        self._tokenizer = None
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+                self.name = tokenizer_name
+            except Exception as exc:  # sin transformers, sin red o modelo restringido
+                logger.warning("Could not load tokenizer %s, approximating token counts: %s", tokenizer_name, exc)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is None:
+            return count_tokens(text)
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(tokenizer_name: Optional[str] = None) -> TokenCounter:
+    return TokenCounter(tokenizer_name)
+
+
+class PrefillRate:
+    """Tokens/s de prefill: media móvil exponencial de lo que mide Ollama."""
+
+    MIN_TOKENS = 32  # prompts más cortos (casi todo en la caché KV) dan medidas con mucho ruido
+
+    def __init__(self, initial: float, alpha: float = 0.2):
+        self.tokens_per_s = initial
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def observe(self, tokens: int, seconds: float) -> None:
+        if tokens < self.MIN_TOKENS or seconds <= 0:
+            return
+        with self._lock:
+            rate = tokens / seconds
+            self.tokens_per_s = rate if self.samples == 0 else (
+                self.alpha * rate + (1 - self.alpha) * self.tokens_per_s
+            )
+            self.samples += 1
+
+
+_prefill = PrefillRate(DEFAULT_CONTEXT_CONFIG.prefill_tokens_per_s)
+
+
+def observe_prefill(tokens: int, seconds: float) -> None:
+    """Una medida de Ollama (prompt_eval_count, prompt_eval_duration); la llama telemetry.py."""
+    _prefill.observe(tokens, seconds)
+
+
+def prefill_tokens_per_s() -> float:
+    return _prefill.tokens_per_s
+
+
+# ---------------------------------------------------------------------------
+# Frases y etiquetas
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Unit:
+    text: str
+    line: int     # línea del chunk: las frases de una misma línea se vuelven a unir con un espacio
+    tokens: int
+
+
+def split_sentences(doc: Document) -> List[Tuple[str, int]]:
+    """
+    (frase, nº de línea) de un chunk, sin la línea del título de sección (va
+    en la etiqueta). Una línea que termina en ":" ("- Primary Key (PK):") no
+    se entiende sola: va unida a la frase siguiente.
+    """
+    section = ((doc.metadata or {}).get("section") or "").strip()
+    out: List[Tuple[str, int]] = []
+    lead = ""
+    for line_no, line in enumerate(doc.page_content.split("\n")):
+        line = line.strip()
+        if not line or line == section:
+            continue
+        if line.endswith(":"):
+            lead = f"{lead}\n{line}" if lead else line
+            continue
+        for sentence in _SENTENCE_RE.split(line):
+            sentence = sentence.strip()
+            if sentence:
+                out.append((f"{lead}\n{sentence}" if lead else sentence, line_no))
+                lead = ""
+    if lead:
+        out.append((lead, -1))
+    return out
+
+
+def source_label(doc: Document) -> str:
+    """Origen de un chunk para el prompt y para "references": fichero · sección (o unidad)."""
+    meta = doc.metadata or {}
+    parts = [str(p) for p in (meta.get("source"), meta.get("section") or meta.get("unit")) if p]
+    return " · ".join(parts)
+
+
+def _key(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12, None)
+
+
+class _SentenceVectors:
+    """LRU de frase -> embedding normalizado (los chunks vecinos comparten frases por el solape)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, texts: List[str], embed_documents: Callable[[List[str]], List[List[float]]]) -> np.ndarray:
+        """Matriz (frases x dim); las que faltan se calculan en un único lote."""
+        vectors: List[Optional[np.ndarray]] = []
+        missing: List[int] = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                vector = self._entries.get(text)
+                if vector is not None:
+                    self._entries.move_to_end(text)
+                else:
+                    missing.append(i)
+                vectors.append(vector)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = _normalize(np.asarray(embed_documents([texts[i] for i in missing]), dtype=np.float32))
+            with self._lock:
+                for i, vector in zip(missing, computed):
+                    vectors[i] = vector
+                    if self.max_entries > 0:
+                        self._entries[texts[i]] = vector
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return np.vstack(vectors)
+
+
+# ---------------------------------------------------------------------------
+# Ensamblado
+# ---------------------------------------------------------------------------
+
+@dataclass
+class AssembledContext:
+    text: str
+    sources: List[str]      # etiquetas de los pasajes del contexto, sin repetir y en orden
+    tokens_before: int      # los chunks unidos tal cual (format_context)
+    tokens: int
+    budget: int
+    chunks: int             # chunks recuperados
+    passages: int           # chunks con alguna frase en el contexto
+    sentences: int          # frases distintas en los chunks
+    sentences_kept: int
+    duplicates: int         # frases repetidas (o casi) descartadas
+    compressed: bool        # no cabía: se eligieron frases/chunks por relevancia
+    ms: float
+
+    def report(self) -> Dict[str, object]:
+        """Informe de la petición (evento context_built, telemetría)."""
+        saved = max(0, self.tokens_before - self.tokens)
+        rate = prefill_tokens_per_s()
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "saved_tokens": saved,
+            "saved_ratio": round(saved / self.tokens_before, 3) if self.tokens_before else 0.0,
+            "prefill_saved_ms": round(saved / rate * 1000, 1) if rate > 0 else None,
+            "chunks": self.chunks,
+            "passages": self.passages,
+            "sentences": self.sentences,
+            "sentences_kept": self.sentences_kept,
+            "duplicates": self.duplicates,
+            "compressed": self.compressed,
+            "sources": self.sources,
+            "ms": round(self.ms, 3),
+        }
+
+
+_Passage = Tuple[str, List[_Unit]]  # (etiqueta, frases)
+
+
+class ContextBuilder:
+    def __init__(self, config: ContextConfig = DEFAULT_CONTEXT_CONFIG, embeddings: Optional[Embeddings] = None):
+        if config.granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown context granularity {config.granularity!r}; expected one of {GRANULARITIES}")
+        self.config = config
+        self._embeddings = embeddings
+        self.counter = get_token_counter(config.tokenizer)
+        self._vectors = _SentenceVectors(config.sentence_cache_entries)
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.compressed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def budget(self, mode: str) -> int:
+        return self.config.practice_tokens if mode == "practice" else self.config.concept_tokens
+
+    def build(self, query: str, docs: List[Document], mode: str = "concept") -> AssembledContext:
+        t0 = time.perf_counter()
+        docs = [doc for doc in docs if getattr(doc, "page_content", None)]
+        budget = self.budget(mode)
+        tokens_before = self.counter.count(SEPARATOR.join(doc.page_content for doc in docs))
+
+        # 1) Frases sin repetir (el solape entre chunks consecutivos desaparece aquí)
+        passages: List[_Passage] = []
+        seen = set()
+        duplicates = 0
+        for doc in docs:
+            units = []
+            for text, line in split_sentences(doc):
+                key = _key(text)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                units.append(_Unit(text, line, self.counter.count(text)))
+            if units:
+                passages.append((source_label(doc), units))
+
+        # 2) Si cabe, todo; si no, 3) las frases (o chunks) más relevantes
+        chosen = [(i, j) for i, (_, units) in enumerate(passages) for j in range(len(units))]
+        text, sources = self._render(passages, chosen)
+        tokens = self.counter.count(text)
+        compressed = tokens > budget
+        if compressed:
+            if self.config.granularity == "chunk":
+                chosen = self._select_chunks(passages, budget)
+            else:
+                chosen, near = self._select_sentences(query, passages, budget)
+                duplicates += near
+            text, sources = self._render(passages, chosen)
+            tokens = self.counter.count(text)
+            # Las frases se cuentan por separado; el texto final puede pasarse por poco
+            while tokens > budget and chosen:
+                chosen = chosen[:-1] if self.config.granularity == "sentence" else self._drop_last_chunk(chosen)
+                text, sources = self._render(passages, chosen)
+                tokens = self.counter.count(text)
+
+        result = AssembledContext(
+            text=text,
+            sources=sources,
+            tokens_before=tokens_before,
+            tokens=tokens,
+            budget=budget,
+            chunks=len(docs),
+            passages=len({i for i, _ in chosen}),
+            sentences=sum(len(units) for _, units in passages),
+            sentences_kept=len(chosen),
+            duplicates=duplicates,
+            compressed=compressed,
+            ms=(time.perf_counter() - t0) * 1000,
+        )
+        with self._lock:
+            self.builds += 1
+            self.compressed += int(compressed)
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens
+        return result
+
+    def _overhead(self, label: str) -> int:
+        """Tokens de la etiqueta y el separador que añade un pasaje nuevo."""
+        return self.counter.count(f"[{label}]\n" if label else "") + self.counter.count(SEPARATOR)
+
+    def _select_chunks(self, passages: List[_Passage], budget: int) -> List[Tuple[int, int]]:
+        """Chunks enteros en el orden de la recuperación mientras quepan."""
+        chosen: List[Tuple[int, int]] = []
+        used = 0
+        for i, (label, units) in enumerate(passages):
+            cost = self._overhead(label) + sum(unit.tokens for unit in units)
+            if used + cost <= budget:
+                chosen.extend((i, j) for j in range(len(units)))
+                used += cost
+        return chosen
+
+    @staticmethod
+    def _drop_last_chunk(chosen: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        last = chosen[-1][0]
+        return [(i, j) for i, j in chosen if i != last]
+
+    def _select_sentences(
+        self, query: str, passages: List[_Passage], budget: int
+    ) -> Tuple[List[Tuple[int, int]], int]:
+        """Frases por similitud con la consulta hasta llenar el presupuesto; devuelve también las casi repetidas."""
+        embeddings = self._embeddings or get_embeddings()
+        matrix = self._vectors.get([unit.text for _, units in passages for unit in units], embeddings.embed_documents)
+        positions = [(i, j) for i, (_, units) in enumerate(passages) for j in range(len(units))]
+        # El embedding de la consulta ya está en la caché de consultas (lo calculó la recuperación)
+        query_vector = _normalize(np.asarray(get_query_cache().embedding(query, embeddings.embed_query), dtype=np.float32))
+        scores = matrix @ query_vector
+
+        chosen: List[Tuple[int, int]] = []
+        chosen_rows: List[int] = []
+        opened = set()
+        used = near = 0
+        for row in np.argsort(-scores, kind="stable"):
+            i, j = positions[row]
+            if chosen_rows and float((matrix[chosen_rows] @ matrix[row]).max()) >= self.config.duplicate_similarity:
+                near += 1
+                continue
+            label, units = passages[i]
+            cost = units[j].tokens + (0 if i in opened else self._overhead(label))
+            if used + cost > budget:
+                continue
+            chosen.append((i, j))
+            chosen_rows.append(int(row))
+            opened.add(i)
+            used += cost
+        return chosen, near
+
+    @staticmethod
+    def _render(passages: List[_Passage], chosen: List[Tuple[int, int]]) -> Tuple[str, List[str]]:
+        keep = set(chosen)
+        blocks: List[str] = []
+        sources: List[str] = []
+        for i, (label, units) in enumerate(passages):
+            lines: List[str] = []
+            last_line = None
+            for j, unit in enumerate(units):
+                if (i, j) not in keep:
+                    continue
+                if unit.line == last_line:
+                    lines[-1] += " " + unit.text
+                else:
+                    lines.append(unit.text)
+                last_line = unit.line
+            if not lines:
+                continue
+            blocks.append("\n".join(([f"[{label}]"] if label else []) + lines))
+            if label and label not in sources:
+                sources.append(label)
+        return SEPARATOR.join(blocks), sources
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "tokenizer": self.counter.name,
+                "granularity": self.config.granularity,
+                "budgets": {"concept": self.config.concept_tokens, "practice": self.config.practice_tokens},
+                "builds": self.builds,
+                "compressed": self.compressed,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "saved_ratio": round(1 - self.tokens_after / self.tokens_before, 3) if self.tokens_before else 0.0,
+                "prefill_tokens_per_s": round(prefill_tokens_per_s(), 1),
+                "prefill_samples": _prefill.samples,
+                "sentence_cache": {"hits": self._vectors.hits, "misses": self._vectors.misses},
+            }
+
+
+@lru_cache(maxsize=1)
+def get_context_builder() -> ContextBuilder:
+    """Ensamblador compartido por todo el proceso (DEFAULT_CONTEXT_CONFIG)."""
+    return ContextBuilder(DEFAULT_CONTEXT_CONFIG)
@@ -0,0 +1,108 @@
+# src/educhat/courses.py
+
+"""
+Cursos (tenants) que sirve un mismo despliegue.
+
+Cada petición lleva un course_id (ChatRequest.course_id); None es el curso
+de siempre, con sus documentos en data/raw y su índice en rag_store.FAISS_DIR.
+Los demás cursos viven en:
+
+    data/courses/<id>/raw/          documentos (.txt), como data/raw
+    data/courses/<id>/course.json   opcional: {"name": "Operating Systems"}
+    data/courses/<id>/course_info.txt  opcional: bloque de logística para faq_prompt
+    data/processed/courses/<id>/faiss/  índice publicado por build_rag --course <id>
+
+Un curso existe si tiene documentos o índice; cualquier otro id (o uno con
+caracteres fuera de [a-z0-9_-]) lanza UnknownCourse, que la API devuelve como 404.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+import json
+import os
+import re
+
+from .config import CourseConfig, DEFAULT_COURSE_CONFIG, DEFAULT_FAQ_CONFIG
+
+COURSE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+COURSE_FILE = "course.json"
+COURSE_INFO_FILE = "course_info.txt"
+
+
+class UnknownCourse(LookupError):
+    """El course_id no es válido o el curso no tiene documentos ni índice."""
+
+
+@dataclass(frozen=True)
+class Course:
+    id: str
+    name: str
+    raw_dir: str    # documentos del curso (build_rag, faq_engine)
+    index_dir: str  # persist_dir del índice (CURRENT + versiones, ver rag_store.py)
+
+
+def _course_dir(course_id: str, config: CourseConfig) -> str:
+    return os.path.join(config.courses_dir, course_id)
+
+
+@lru_cache(maxsize=256)
+def _load_course(course_id: str) -> Course:
+    # Import aquí: api.py importa este módulo y no debe cargar FAISS/transformers
+    from .rag_store import FAISS_DIR
+
+    config = DEFAULT_COURSE_CONFIG
+    if course_id == config.default_course:
+        return Course(course_id, config.default_course_name, DEFAULT_FAQ_CONFIG.raw_dir, FAISS_DIR)
+
+    raw_dir = os.path.join(_course_dir(course_id, config), "raw")
+    index_dir = os.path.join(config.index_root, course_id, "faiss")
+    if not (os.path.isdir(raw_dir) or os.path.isdir(index_dir)):
+        raise UnknownCourse(f"Unknown course: {course_id}")
+
+    name = course_id.replace("-", " ").replace("_", " ").title()
+    meta_path = os.path.join(_course_dir(course_id, config), COURSE_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            name = json.load(f).get("name") or name
+    return Course(course_id, name, raw_dir, index_dir)
+
+
+def get_course(course_id: Optional[str] = None) -> Course:
+    """Curso de `course_id` (None o "" = el curso por defecto)."""
+    course_id = (course_id or DEFAULT_COURSE_CONFIG.default_course).strip().lower()
+    if not COURSE_ID_PATTERN.match(course_id):
+        raise UnknownCourse(f"Invalid course id: {course_id!r}")
+    return _load_course(course_id)
+
+
+def list_courses(config: CourseConfig = DEFAULT_COURSE_CONFIG) -> List[str]:
+    """Ids de todos los cursos disponibles (no carga ninguno)."""
+    ids = {config.default_course}
+    for root in (config.courses_dir, config.index_root):
+        if os.path.isdir(root):
+            ids.update(name for name in os.listdir(root) if COURSE_ID_PATTERN.match(name))
+    return sorted(ids)
+
+
+@lru_cache(maxsize=DEFAULT_COURSE_CONFIG.faq_engines)
+def course_info(course_id: Optional[str] = None) -> str:
+    """
+    Bloque de datos del curso (contenidos, horario, evaluación) que va al
+    principio de faq_prompt. Es fijo por curso, así que el prefijo del prompt
+    sigue siendo reutilizable por la caché KV de Ollama.
+    """
+    course = get_course(course_id)
+    if course.id == DEFAULT_COURSE_CONFIG.default_course:
+        from .prompts import DATABASES_COURSE_INFO
+
+        return DATABASES_COURSE_INFO
+
+    path = os.path.join(_course_dir(course.id, DEFAULT_COURSE_CONFIG), COURSE_INFO_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+
+    from .faq_engine import describe_knowledge, get_faq_engine
+
+    return describe_knowledge(get_faq_engine(course.id).kb)
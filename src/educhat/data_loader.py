@@ -1,9 +1,40 @@
 import pathlib
-from typing import List
+from typing import Iterator, List, Tuple
 
 def load_txt_files(folder: str) -> List[str]:
+    return [text for _, text in iter_txt_sources(folder)]
+
+
+def load_txt_sources(folder: str) -> List[Tuple[str, str]]:
+    """
+    Igual que load_txt_files, pero conserva el nombre del fichero
+    (relativo a `folder`) para poder usarlo como metadato "source".
+    """
+    return list(iter_txt_sources(folder))
+
+
+def iter_txt_sources(folder: str) -> Iterator[Tuple[str, str]]:
+    """
+    Como load_txt_sources, pero lee los ficheros de uno en uno a medida que
+    se piden: en memoria solo está el fichero actual.
+    """
     base = pathlib.Path(folder)
-    texts = []
-    for path in base.rglob("*.txt"):
-        texts.append(path.read_text(encoding="utf-8"))
-    return texts
+    for path in sorted(base.rglob("*.txt")):
+        yield path.relative_to(base).as_posix(), path.read_text(encoding="utf-8")
+
+
+class TxtSources:
+    """
+    (source, texto) de los .txt de una carpeta, leídos bajo demanda. Se puede
+    recorrer varias veces (rag_store.update_vector_store hace una pasada
+    para los hashes y otra para trocear los ficheros que cambiaron).
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter_txt_sources(self.folder)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in pathlib.Path(self.folder).rglob("*.txt"))
@@ -0,0 +1,324 @@
+# src/educhat/embeddings.py
+
+"""
+Motor de embeddings en CPU (MiniLM) para indexar y para las consultas.
+
+Antes todo pasaba por HuggingFaceEmbeddings, es decir PyTorch en CPU con
+sus hilos por defecto. Ahora get_embeddings (rag_store.py) devuelve el motor
+configurado en EmbeddingConfig:
+
+  - torch      sentence-transformers, como antes, con batch_size y número de
+               hilos configurables;
+  - onnx       el mismo modelo exportado a ONNX y ejecutado con ONNX Runtime
+               (mean pooling + normalización L2, como sentence-transformers);
+  - onnx_int8  lo mismo con cuantización dinámica int8 de los pesos: más
+               rápido en CPU con una diferencia mínima de embeddings.
+
+El modelo ONNX se exporta (y cuantiza) la primera vez en onnx_dir. Si falta
+onnxruntime se sigue con torch y un aviso. Al indexar, los textos se
+ordenan por longitud y se procesan en lotes de batch_size, para rellenar lo
+mínimo con padding.
+
+Hilos: cada worker de uvicorn tiene su propio motor, así que por defecto se
+usan núcleos / WEB_CONCURRENCY hilos (y no todos los núcleos en cada worker).
+
+Micro-batching: las consultas de peticiones simultáneas (embed_query) se
+juntan en un único forward. Un hilo atiende una cola; toma la primera
+consulta y todas las que ya esperan (hasta micro_batch), opcionalmente
+esperando micro_batch_wait_ms más. Una consulta sola no espera nada; con
+carga, las que llegan durante un forward van juntas en el siguiente.
+
+benchmark.py --embeddings compara los motores: paridad con torch
+(similitud coseno), documentos/s por tamaño de lote y consultas/s
+concurrentes con y sin micro-batching.
+"""
+
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import DEFAULT_EMBEDDING_CONFIG, EmbeddingConfig
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+
+
+def embedding_threads(config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG) -> int:
+    """Hilos de cómputo por proceso: num_threads o núcleos / workers de uvicorn."""
+    if config.num_threads > 0:
+        return config.num_threads
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1") or 1))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+# ---------------------------------------------------------------------------
+# Motor torch (sentence-transformers)
+# ---------------------------------------------------------------------------
+
+def make_torch_embeddings(config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG) -> Embeddings:
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    torch.set_num_threads(embedding_threads(config))
+    return HuggingFaceEmbeddings(
+        model_name=config.model_name,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"batch_size": config.batch_size},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Motor ONNX Runtime
+# ---------------------------------------------------------------------------
+
+def _model_dir(config: EmbeddingConfig) -> str:
+    return os.path.join(config.onnx_dir, config.model_name.replace("/", "__"))
+
+
+def export_onnx(config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG, quantize: bool = False) -> str:
+    """
+    Exporta el transformer de config.model_name a ONNX (y, con quantize=True,
+    su versión int8) si no existe ya; devuelve la ruta del modelo.
+    """
+    model_dir = _model_dir(config)
+    fp32_path = os.path.join(model_dir, ONNX_FILE)
+    int8_path = os.path.join(model_dir, ONNX_INT8_FILE)
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(config.model_name)
+        model = AutoModel.from_pretrained(config.model_name).eval()
+        sample = tokenizer(["warm up"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {name: {0: "batch", 1: "tokens"} for name in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+        tmp_path = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=axes,
+                opset_version=17,
+                dynamo=False,
+            )
+        tokenizer.save_pretrained(model_dir)
+        os.replace(tmp_path, fp32_path)
+        logger.info("Exported %s to %s", config.model_name, fp32_path)
+
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+        logger.info("Quantized %s to int8 in %s", config.model_name, int8_path)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """MiniLM en ONNX Runtime: tokenizer de transformers + mean pooling + normalización L2."""
+
+    def __init__(self, config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG, quantized: bool = False):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.config = config
+        path = export_onnx(config, quantize=quantized)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = embedding_threads(config)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.config.max_length, return_tensors="np"
+        )
+        feed = {name: value.astype(np.int64) for name, value in tokens.items() if name in self._inputs}
+        hidden = self.session.run(None, feed)[0]
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Lotes de textos de longitud parecida: menos padding por forward
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        out = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.config.batch_size):
+            batch = order[start: start + self.config.batch_size]
+            vectors = self._encode([texts[i] for i in batch])
+            if out.shape[1] == 0:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+        return out.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+@lru_cache(maxsize=None)
+def _onnx_missing(backend: str) -> Optional[str]:
+    """Motivo por el que no se puede usar el motor ONNX `backend` (None si se puede)."""
+    try:
+        import onnxruntime  # noqa: F401
+        import transformers  # noqa: F401
+
+        if backend == "onnx_int8":
+            import onnxruntime.quantization  # noqa: F401
+    except ImportError as exc:
+        logger.warning("Could not load the %s embedding backend, using torch: %s", backend, exc)
+        return str(exc)
+    return None
+
+
+def resolve_backend(config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG) -> str:
+    """
+    Motor que make_embeddings carga de verdad para config: config.backend, o
+    "torch" si es ONNX y falta onnxruntime. Es lo que se guarda en el manifest
+    del índice (embed_backend), aunque los embeddings se calculen en otros
+    procesos.
+    """
+    if config.backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {config.backend!r}; expected one of {BACKENDS}")
+    if config.backend != "torch" and _onnx_missing(config.backend) is not None:
+        return "torch"
+    return config.backend
+
+
+def make_embeddings(config: EmbeddingConfig = DEFAULT_EMBEDDING_CONFIG) -> Embeddings:
+    """Motor de resolve_backend(config), sin micro-batching (builds, benchmark)."""
+    if resolve_backend(config) != "torch":
+        return OnnxEmbeddings(config, quantized=config.backend == "onnx_int8")
+    return make_torch_embeddings(config)
+
+
+# ---------------------------------------------------------------------------
+# Micro-batching de consultas
+# ---------------------------------------------------------------------------
+
+class MicroBatcher:
+    """Junta las llamadas concurrentes a embed() en una sola llamada a embed_many."""
+
+    def __init__(self, embed_many, max_batch: int, max_wait_ms: float = 0.0):
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.max_seen = 0
+
+    def embed(self, text: str) -> List[float]:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="educhat-embed-batcher", daemon=True)
+                    self._thread.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self.embed_many([text for text, _ in batch])
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch": self.queries / self.batches if self.batches else 0.0,
+            "max_batch": self.max_seen,
+        }
+
+
+class BatchingEmbeddings(Embeddings):
+    """Motor con micro-batching en embed_query; embed_documents va directo (ya es un lote)."""
+
+    def __init__(self, inner: Embeddings, max_batch: int, max_wait_ms: float = 0.0):
+        self.inner = inner
+        self.batcher = MicroBatcher(inner.embed_documents, max_batch, max_wait_ms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.embed(text)
+
+    def stats(self) -> Dict[str, object]:
+        return self.batcher.stats()
+
+
+@lru_cache(maxsize=1)
+def load_embeddings() -> Embeddings:
+    """Motor compartido del proceso (DEFAULT_EMBEDDING_CONFIG), con micro-batching si está activado."""
+    config = DEFAULT_EMBEDDING_CONFIG
+    embeddings = make_embeddings(config)
+    if config.micro_batch > 1:
+        embeddings = BatchingEmbeddings(embeddings, config.micro_batch, config.micro_batch_wait_ms)
+    return embeddings
+
+
+# ---------------------------------------------------------------------------
+# Paridad con torch
+# ---------------------------------------------------------------------------
+
+def parity(reference: List[List[float]], candidate: List[List[float]]) -> Dict[str, float]:
+    """Similitud coseno fila a fila entre los embeddings de dos motores."""
+    a = np.asarray(reference, dtype=np.float32)
+    b = np.asarray(candidate, dtype=np.float32)
+    a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    cosine = (a * b).sum(axis=1)
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(a - b).max()),
+    }
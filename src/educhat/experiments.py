@@ -1,4 +1,8 @@
+import asyncio
 import json
+import os
+
+from .batch import arun_batch, question_id
 from .graph import compile_graph
 from .config import LLMConfig
 from .llm_factory import make_hf_llm
@@ -11,17 +15,20 @@ TEST_QUESTIONS = [
 ]
 
 def run_with_config(config: LLMConfig, label: str):
-    # Aquí podrías reconstruir el grafo usando este config
-    # Para simplificar, supón que llm_factory usa config global;
-    # en la práctica, puedes pasar config al construir el grafo.
-    graph = compile_graph()
+    # El grafo se construye con la configuración de LLM de este experimento
+    graph = compile_graph(llm_config=config)
+
+    # Todas las preguntas en lote (ver batch.py) en lugar de una a una
+    async def collect():
+        return {r["id"]: r async for r in arun_batch(graph, TEST_QUESTIONS)}
 
-    results = []
-    for q in TEST_QUESTIONS:
-        state = {"user_input": q}
-        out = graph.invoke(state, config={"configurable": {"thread_id": label}})
-        results.append({"question": q, "final_answer": out.get("final_answer", "")})
+    answered = asyncio.run(collect())
+    results = [
+        {"question": q, "final_answer": answered[question_id(q)].get("answer", "")}
+        for q in TEST_QUESTIONS
+    ]
 
+    os.makedirs("logs/eval", exist_ok=True)
     with open(f"logs/eval/results_{label}.json", "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
 
@@ -0,0 +1,446 @@
+# src/educhat/faq_engine.py
+
+"""
+Respuestas precalculadas para las preguntas de logística (modo faq).
+
+faq_prompt ya lleva todos los datos escritos (horario, porcentajes) y pide
+al modelo usar SOLO esa información, así que para las preguntas habituales
+("what time does the Monday class start", "weight of the quizzes in the
+second term") el LLM no aporta nada. Este módulo:
+
+  1. Construye una base de conocimiento estructurada a partir de
+     data/raw/evaluation.txt y data/raw/syllabus.txt (horario, aula,
+     ponderaciones por periodo, unidades, bibliografía, supletorio y
+     asistencia).
+  2. Precalcula todas las respuestas (intención + valores de los slots).
+  3. Para cada pregunta detecta intención y slots con expresiones regulares
+     y devuelve la respuesta ya hecha, en microsegundos.
+
+Si la pregunta no encaja (o es condicional / de cálculo: "if I get 5 in the
+midterm..."), graph.faq_node sigue usando faq_chain y la pregunta se registra
+como fallo en FaqConfig.misses_path para ir añadiendo plantillas.
+
+Hay una base por curso (get_faq_engine(course_id), ver courses.py), leída de
+los documentos de ese curso la primera vez que se pregunta por él.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from .config import FaqConfig, DEFAULT_COURSE_CONFIG, DEFAULT_FAQ_CONFIG
+from .courses import get_course
+from .log_writer import get_log_writer
+
+logger = logging.getLogger(__name__)
+
+TERMS = ("first", "second")
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Componentes de la evaluación (nombre normalizado) -> cómo los escriben los estudiantes
+COMPONENT_PATTERNS: Dict[str, str] = {
+    "midterm theory": r"\bmidterm\b.*\btheor|\btheor\w*\b.*\b(?:midterm|exam)",
+    "midterm practice": r"\bmidterm\b.*\bpracti|\bpracti\w*\b.*\b(?:midterm|exam)",
+    "final project": r"\bfinal project\b",
+    "project advances": r"\bproject (?:advances?|progress|deliverables?)\b|\badvances\b",
+    "assignments": r"\bassignments?\b|\bhomeworks?\b",
+    "quizzes": r"\bquiz(?:zes|es)?\b",
+}
+# "midterm" a secas = teoría + práctica
+MIDTERM_PATTERN = r"\bmidterms?\b"
+
+# Preguntas que piden razonar sobre los datos, no solo consultarlos
+COMPLEX_PATTERN = r"\b(?:if|why|need to|calculate|compute|explain|compare|difference|average|minimum grade)\b"
+
+# Intenciones en orden de prioridad: la primera que encaja gana
+INTENT_PATTERNS: List[Tuple[str, str]] = [
+    ("exam_date", r"\b(?:when|date|day|deadline|due)\b.*\b(?:midterm|exams?|final project|quiz(?:zes)?|deliver\w*)\b"
+                  r"|\b(?:midterm|exams?|final project|quiz(?:zes)?)\b.*\b(?:when|date|deadline|due)\b"),
+    ("makeup", r"\bmake[- ]?up\b|\bsupletorio\b|\brecovery exam\b|\bremedial\b"),
+    ("attendance", r"\battendance\b|\babsen\w*|\bjustif\w*"),
+    ("weight", r"\b(?:weight|weighs?|worth|counts?|percent(?:age)?|points?|value)\b|\bhow much\b|%"),
+    ("scheme", r"\b(?:evaluat\w*|grading|graded|scheme|assessment)\b|\bhow many terms\b"),
+    ("unit", r"\buc ?[1-9]\b|\bunit ?[1-9]\b"),
+    ("units", r"\b(?:units|contents|syllabus)\b"),
+    ("books", r"\b(?:books?|textbooks?|bibliograph\w*|references|readings?)\b"),
+    ("location", r"\bwhere\b|\bclassroom\b|\broom\b|\bbuilding\b"),
+    ("schedule", r"\b(?:schedule|timetable|what time|when|days?|hours?|start|starts|end|ends|finish)\b"
+                 r"|\b(?:" + "|".join(DAYS) + r")\b"),
+]
+
+# Slots de cada intención, en el orden de la clave de la respuesta precalculada
+SLOT_NAMES: Dict[str, Tuple[str, ...]] = {
+    "weight": ("component", "term"),
+    "unit": ("unit",),
+    "schedule": ("day",),
+}
+
+# El horario solo se contesta si se habla de la clase (no de "when" a secas)
+CLASS_PATTERN = r"\b(?:class|classes|lectures?|sessions?|course|meet|schedule|timetable)\b|\b(?:" + "|".join(DAYS) + r")\b"
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+def _fmt(value: float) -> str:
+    return f"{value:g}%"
+
+
+def _component_name(raw: str) -> str:
+    name = raw.strip().lower()
+    return name[: -len(" exam")] if name.endswith(" exam") else name
+
+
+@dataclass
+class FaqKnowledge:
+    classroom: Optional[str] = None
+    sessions: List[Tuple[str, str, str]] = field(default_factory=list)   # (día, inicio, fin)
+    term_weights: Dict[str, float] = field(default_factory=dict)         # periodo -> % de la nota final
+    components: Dict[str, Dict[str, float]] = field(default_factory=dict)  # periodo -> componente -> %
+    units: Dict[int, Tuple[str, List[str]]] = field(default_factory=dict)  # UCn -> (título, temas)
+    textbook: Optional[str] = None
+    references: List[str] = field(default_factory=list)
+    makeup: Optional[Tuple[str, str, str]] = None      # (nota mínima, nota máxima, nota tras aprobar)
+    attendance: Optional[Tuple[str, str, str]] = None  # (% general, % idiomas, días para justificar)
+
+
+def _sections(text: str) -> Dict[str, List[str]]:
+    """Secciones "=== NOMBRE ===" del syllabus."""
+    sections: Dict[str, List[str]] = {}
+    current: List[str] = sections.setdefault("", [])
+    for line in text.splitlines():
+        m = re.match(r"^===\s*(.+?)\s*===\s*$", line)
+        if m:
+            current = sections.setdefault(m.group(1).upper(), [])
+        else:
+            current.append(line)
+    return sections
+
+
+def _parse_scheme(lines: List[str], kb: FaqKnowledge) -> None:
+    term = None
+    for line in lines:
+        if line.strip().lower().startswith("therefore"):
+            break  # resumen redundante al final de evaluation.txt
+        m = re.search(r"\b(First|Second) Term of the Period\s*\((\d+(?:\.\d+)?)%", line)
+        if m:
+            term = m.group(1).lower()
+            kb.term_weights[term] = float(m.group(2))
+            kb.components.setdefault(term, {})
+            continue
+        m = re.match(r"^\s*[-*]\s*([A-Za-z][A-Za-z ]*?):\s*(\d+(?:\.\d+)?)%\s*$", line)
+        if term and m and not m.group(1).lower().startswith("subtotal"):
+            kb.components[term][_component_name(m.group(1))] = float(m.group(2))
+
+
+def parse_knowledge(raw_dir: str) -> FaqKnowledge:
+    """Lee evaluation.txt y syllabus.txt; los datos que falten quedan vacíos."""
+    kb = FaqKnowledge()
+
+    def read(name: str) -> str:
+        path = os.path.join(raw_dir, name)
+        if not os.path.exists(path):
+            logger.warning("FAQ source %s not found", path)
+            return ""
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    sections = _sections(read("syllabus.txt"))
+
+    # evaluation.txt es la fuente principal del esquema; el syllabus, la alternativa
+    _parse_scheme(read("evaluation.txt").splitlines(), kb)
+    if not kb.components:
+        _parse_scheme(sections.get("EVALUATION SCHEME", []), kb)
+
+    for line in sections.get("SCHEDULE", []):
+        m = re.match(r"^\s*Classroom:\s*(\S+)", line)
+        if m:
+            kb.classroom = m.group(1)
+        m = re.match(r"^\s*-\s*(\w+)\s+(\d{1,2}h\d{2})\s*[–-]\s*(\d{1,2}h\d{2})", line)
+        if m and m.group(1).lower() in DAYS:
+            kb.sessions.append((m.group(1).capitalize(), m.group(2), m.group(3)))
+
+    unit = None
+    for line in sections.get("CONTENTS", []):
+        m = re.match(r"^UC(\d+):\s*(.+?)\s*$", line)
+        if m:
+            unit = int(m.group(1))
+            kb.units[unit] = (m.group(2), [])
+            continue
+        m = re.match(r"^\s+\d+\.\d+\s+(.+?)\s*$", line)
+        if unit and m:
+            kb.units[unit][1].append(m.group(1))
+
+    bibliography = "\n".join(sections.get("BIBLIOGRAPHY", []))
+    titles = re.findall(r'^\s*-\s*"(.+?)"(.*)$', bibliography, flags=re.M)
+    if titles:
+        books = [f'"{title}"{rest.rstrip()}' for title, rest in titles]
+        kb.textbook, kb.references = books[0], books[1:]
+
+    makeup = " ".join(sections.get("MAKE UP EXAM POLICY", []))
+    m_range = re.search(r"between (\d+(?:\.\d+)?) and (\d+(?:\.\d+)?)", makeup)
+    m_raise = re.search(r"raise the student.s total grade to (\d+(?:\.\d+)?)", makeup)
+    if m_range and m_raise:
+        kb.makeup = (m_range.group(1), m_range.group(2), m_raise.group(1))
+
+    attendance = " ".join(" ".join(sections.get("STUDENT ATTENDANCE POLICY", [])).split())
+    m_general = re.search(r"minimum attendance required for passing is (\d+)%", attendance)
+    m_language = re.search(r"minimum attendance of (\d+)% is required", attendance)
+    m_days = re.search(r"within \w+ \((\d+)\) days", attendance)
+    if m_general and m_language and m_days:
+        kb.attendance = (m_general.group(1), m_language.group(1), m_days.group(1))
+    return kb
+
+
+def describe_knowledge(kb: FaqKnowledge) -> str:
+    """
+    Bloque de datos del curso para faq_prompt (mismo formato que el texto
+    fijo del curso por defecto), para los cursos sin course_info.txt.
+    """
+    lines: List[str] = []
+    if kb.units:
+        lines.append("Course contents:")
+        lines += [f"- UC{n}: {title}." for n, (title, _) in kb.units.items()]
+        lines.append("")
+    if kb.sessions:
+        lines.append("Official schedule of this course:")
+        where = f" in classroom {kb.classroom}" if kb.classroom else ""
+        lines += [f"- {day}: {start} to {end}{where}." for day, start, end in kb.sessions]
+        lines.append("")
+    if kb.components:
+        lines.append("Official evaluation scheme:")
+        for term in (t for t in TERMS if t in kb.components):
+            lines.append(f"- {term.capitalize()} term ({_fmt(kb.term_weights.get(term, 0))} of final grade):")
+            lines += [f"  - {name.capitalize()}: {_fmt(w)}" for name, w in kb.components[term].items()]
+        lines.append("")
+    return "\n".join(lines).strip() or "No schedule or evaluation information is available for this course."
+
+
+@dataclass
+class FaqMatch:
+    intent: str
+    slots: Dict[str, str]
+    answer: str
+
+
+class FaqEngine:
+    def __init__(self, kb: FaqKnowledge, config: FaqConfig = DEFAULT_FAQ_CONFIG, course_id: Optional[str] = None):
+        self.kb = kb
+        self.config = config
+        self.course_id = course_id
+        self._intents = [(name, re.compile(p)) for name, p in INTENT_PATTERNS]
+        self._components = {name: re.compile(p) for name, p in COMPONENT_PATTERNS.items()}
+        self._midterm = re.compile(MIDTERM_PATTERN)
+        self._complex = re.compile(COMPLEX_PATTERN)
+        self._class = re.compile(CLASS_PATTERN)
+        self._answers = self._precompute()
+
+        self._lock = threading.Lock()
+        self.hits: Counter = Counter()   # intención -> respuestas servidas
+        self.misses = 0
+        self._top_misses: Counter = Counter()
+
+    # -------- respuestas precalculadas -------- #
+
+    def _schedule_text(self) -> str:
+        return " and ".join(f"{day} {start}–{end}" for day, start, end in self.kb.sessions)
+
+    def _term_text(self, term: str) -> str:
+        items = "; ".join(f"{name.capitalize()} {_fmt(w)}" for name, w in self.kb.components[term].items())
+        return f"{term.capitalize()} term ({_fmt(self.kb.term_weights[term])} of the final grade): {items}."
+
+    def _component_text(self, name: str, term: Optional[str]) -> Optional[str]:
+        weights = {t: items[name] for t, items in self.kb.components.items() if name in items}
+        if not weights:
+            return None
+        # "Quizzes count ..." / "The final project is worth ..." / "The midterm theory exam is worth ..."
+        label = f"{name} exam" if name.startswith("midterm") else name
+        subject, verb = (label.capitalize(), "count") if name.endswith("s") else (f"The {label}", "is worth")
+        if term:
+            if term not in weights:
+                return f"{subject} {'are' if verb == 'count' else 'is'} not part of the {term} term evaluation."
+            return f"{subject} {verb} {_fmt(weights[term])} of the final grade in the {term} term."
+        if len(weights) == 1:
+            (only_term, weight), = weights.items()
+            return f"{subject} {verb} {_fmt(weight)} of the final course grade ({only_term} term)."
+        parts = " and ".join(f"{_fmt(w)} in the {t} term" for t, w in weights.items())
+        return f"{subject} {verb} {parts} ({_fmt(sum(weights.values()))} of the final grade in total)."
+
+    def _precompute(self) -> Dict[Tuple[str, ...], str]:
+        kb = self.kb
+        answers: Dict[Tuple[str, ...], str] = {}
+
+        if kb.sessions:
+            where = f" in classroom {kb.classroom}" if kb.classroom else ""
+            answers[("schedule",)] = f"Classes are on {self._schedule_text()}{where}."
+            scheduled = {day.lower(): (start, end) for day, start, end in kb.sessions}
+            for day in DAYS:
+                if day in scheduled:
+                    start, end = scheduled[day]
+                    answers[("schedule", day)] = f"On {day.capitalize()} the class is from {start} to {end}{where}."
+                else:
+                    answers[("schedule", day)] = (
+                        f"There is no class on {day.capitalize()}. Classes are on {self._schedule_text()}{where}."
+                    )
+        if kb.classroom:
+            when = f" ({self._schedule_text()})" if kb.sessions else ""
+            answers[("location",)] = f"Classes are held in classroom {kb.classroom}{when}."
+
+        if kb.components:
+            terms = [t for t in TERMS if t in kb.components]
+            answers[("scheme",)] = (
+                f"The course is evaluated in {len(terms)} terms. "
+                + " ".join(self._term_text(t) for t in terms)
+            )
+            for term in terms:
+                answers[("weight", "", term)] = self._term_text(term)
+            names = {name for items in kb.components.values() for name in items}
+            for name in names:
+                for term in (None,) + tuple(terms):
+                    text = self._component_text(name, term)
+                    if text:
+                        answers[("weight", name, term or "")] = text
+            midterm = {n: w for t in terms for n, w in kb.components[t].items() if n.startswith("midterm")}
+            if midterm:
+                parts = " and ".join(f"{n[len('midterm '):]} exam {_fmt(w)}" for n, w in midterm.items())
+                answers[("weight", "midterm", "")] = (
+                    f"The midterm is worth {_fmt(sum(midterm.values()))} of the final grade: {parts}."
+                )
+
+        for number, (title, topics) in kb.units.items():
+            answers[("unit", str(number))] = f"UC{number}: {title}. Topics: " + "; ".join(topics) + "."
+        if kb.units:
+            answers[("units",)] = "The course has {} units: {}.".format(
+                len(kb.units), "; ".join(f"UC{n}: {title}" for n, (title, _) in kb.units.items())
+            )
+
+        if kb.textbook:
+            text = f"The main textbook is {kb.textbook}."
+            if kb.references:
+                text += " Complementary references: " + "; ".join(kb.references) + "."
+            answers[("books",)] = text
+
+        if kb.makeup:
+            low, high, raised = kb.makeup
+            answers[("makeup",)] = (
+                f"If your final grade is between {low} and {high}, you are entitled to a make-up exam at the "
+                f"end of the term. It covers all the contents of the subject, and passing it raises your "
+                f"total grade to {raised}."
+            )
+        if kb.attendance:
+            general, language, days = kb.attendance
+            answers[("attendance",)] = (
+                f"Attendance is mandatory: you need at least {general}% attendance to pass "
+                f"({language}% for second-language subjects). If you miss a class, present the supporting "
+                f"documents within {days} days of the absence."
+            )
+
+        # Las fechas no están en los documentos del curso: lo decimos sin pasar por el LLM
+        answers[("exam_date",)] = (
+            "The exact date is not specified in the course information I have. "
+            "Please check the announcements or ask the teacher."
+        )
+        return answers
+
+    # -------- matching -------- #
+
+    def _slots(self, intent: str, text: str) -> Optional[Tuple[str, ...]]:
+        """Clave de la respuesta precalculada para esa intención, o None."""
+        term = next((t for t in TERMS if re.search(rf"\b{t}\b|\b{t[:1]}(?:st|nd)\b", text)), "")
+        if intent == "scheme" and term:
+            return ("weight", "", term)
+        if intent == "weight":
+            names = [name for name, pattern in self._components.items() if pattern.search(text)]
+            if not names and self._midterm.search(text):
+                names = ["midterm"]
+            if len(names) == 1:
+                return ("weight", names[0], term)
+            if not names and term:
+                return ("weight", "", term)
+            return None  # varios componentes o ninguno: que lo redacte el LLM
+        if intent == "unit":
+            m = re.search(r"\b(?:uc|unit) ?([1-9])\b", text)
+            return ("unit", m.group(1))
+        if intent == "schedule":
+            if not self._class.search(text):
+                return None
+            day = next((d for d in DAYS if re.search(rf"\b{d}\b", text)), None)
+            return ("schedule", day) if day else ("schedule",)
+        return (intent,)
+
+    def match(self, question: str) -> Optional[FaqMatch]:
+        text = normalize(question)
+        if not text or len(text.split()) > self.config.max_words or self._complex.search(text):
+            return None
+        for intent, pattern in self._intents:
+            if not pattern.search(text):
+                continue
+            key = self._slots(intent, text)
+            if key is None or key not in self._answers:
+                return None
+            slots = dict(zip(SLOT_NAMES.get(key[0], ()), key[1:]))
+            return FaqMatch(intent=intent, slots={k: v for k, v in slots.items() if v}, answer=self._answers[key])
+        return None
+
+    def answer(self, question: str) -> Optional[FaqMatch]:
+        """Respuesta precalculada si la pregunta encaja; si no, registra el fallo y devuelve None."""
+        if not self.config.enabled:
+            return None
+        found = self.match(question)
+        with self._lock:
+            if found:
+                self.hits[found.intent] += 1
+            else:
+                self.misses += 1
+                self._top_misses[normalize(question)] += 1
+                if len(self._top_misses) > self.config.max_tracked_misses:
+                    keep = self._top_misses.most_common(self.config.max_tracked_misses // 2)
+                    self._top_misses = Counter(dict(keep))
+        if found is None:
+            self._record_miss(question)
+        return found
+
+    def _record_miss(self, question: str) -> None:
+        path = self.config.misses_path
+        if not path:
+            return
+        # Lo escribe el hilo de log_writer: la respuesta no espera al disco
+        get_log_writer().write(
+            path, {"ts": round(time.time(), 3), "course_id": self.course_id, "question": question}
+        )
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.config.enabled,
+                "course_id": self.course_id,
+                "answers": len(self._answers),
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "top_misses": self._top_misses.most_common(20),
+            }
+
+
+@lru_cache(maxsize=DEFAULT_COURSE_CONFIG.faq_engines)
+def _faq_engine(course_id: str) -> FaqEngine:
+    return FaqEngine(parse_knowledge(get_course(course_id).raw_dir), DEFAULT_FAQ_CONFIG, course_id)
+
+
+def get_faq_engine(course_id: Optional[str] = None) -> FaqEngine:
+    """
+    Base de FAQ del curso (None = curso por defecto). Se construye la primera
+    vez que se usa (lee sus documentos, sin embeddings) y se guardan las de
+    los CourseConfig.faq_engines cursos usados más recientemente.
+    """
+    return _faq_engine(get_course(course_id).id)
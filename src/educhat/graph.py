@@ -1,44 +1,119 @@
 # src/educhat/graph.py
 
-from typing import TypedDict, Literal, Optional
+from typing import Dict, List, TypedDict, Literal, Optional
+import asyncio
+import time
 
+from langchain_core.callbacks import adispatch_custom_event, dispatch_custom_event
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
 
-from .config import DEFAULT_CONFIG_LOW_TEMP
-from .llm_factory import make_hf_llm
+from .config import (
+    LLMConfig,
+    CheckpointConfig,
+    PipelineConfig,
+    DEFAULT_CONFIG_LOW_TEMP,
+    DEFAULT_ROUTER_CONFIG,
+    DEFAULT_PIPELINE_CONFIG,
+    DEFAULT_CHECKPOINT_CONFIG,
+    DEFAULT_CONTEXT_CONFIG,
+    DEFAULT_TELEMETRY_CONFIG,
+)
+from .checkpoint_store import make_checkpointer, start_maintenance
+from .llm_scheduler import PRIORITY_ROUTER, PRIORITY_FAQ, PRIORITY_BACKGROUND
+from .llm_factory import make_hf_llm, make_json_llm
 from .chains import (
-    build_memory,
     build_router_chain,
     build_faq_chain,
     build_concept_sequential_chain,
+    build_concept_json_chain,
     build_practice_chain,
 )
-from .tools import course_rag_search
+from .json_output import ANSWER_SCHEMA, repair_answer
+from .context_builder import get_context_builder
+from .courses import course_info, get_course
+from .index_pool import get_index_pool
+from .tools import course_rag_retrieve, format_context, start_retrieval
+from .faq_engine import get_faq_engine
+from .response_cache import get_response_cache
+from .local_router import get_local_router
+from .session_memory import SessionSummarizer, render_history, update_memory
+from .telemetry import get_telemetry
+
+
+def _emit(name: str, data: dict) -> None:
+    """
+    Publica un evento de progreso (visible en astream_events como
+    "on_custom_event"). Fuera de un run de LangGraph no hay run padre y
+    LangChain lanza RuntimeError; en ese caso simplemente lo ignoramos.
+    """
+    try:
+        dispatch_custom_event(name, data)
+    except RuntimeError:
+        pass
+
+
+async def _aemit(name: str, data: dict, config: RunnableConfig) -> None:
+    """_emit desde los nodos async (en el event loop, con el config del nodo)."""
+    try:
+        await adispatch_custom_event(name, data, config=config)
+    except RuntimeError:
+        pass
 
 
 class EduChatState(TypedDict, total=False):
     user_input: str
+    course_id: Optional[str]          # curso de la petición (None = curso por defecto, ver courses.py)
     mode: Literal["faq", "concept", "practice"]
-    history: str
+    history: str                      # resumen + ventana reciente (lo que ven los prompts)
+    turns: List[Dict[str, str]]       # ventana deslizante de turnos
+    summary: str                      # resumen de los turnos antiguos
     retrieved_context: Optional[str]
+    retrieved_ids: Optional[List[str]]  # ids de los chunks del contexto (para los logs)
+    context_sources: Optional[List[str]]  # etiquetas de origen de los pasajes del contexto
     draft_answer: Optional[str]
     json_answer: Optional[str]
     final_answer: str
+    cache_hit: bool
 
 
-def build_educhat_graph() -> StateGraph:
+def build_educhat_graph(
+    llm_config: LLMConfig = DEFAULT_CONFIG_LOW_TEMP,
+    make_llm=make_hf_llm,
+    make_structured_llm=make_json_llm,
+    pipeline_config: PipelineConfig = DEFAULT_PIPELINE_CONFIG,
+) -> StateGraph:
+    """
+    `make_llm` / `make_structured_llm` tienen la firma de make_hf_llm /
+    make_json_llm; el benchmark (benchmark.py) los sustituye por un LLM simulado.
+    """
     # LLM con configuración por defecto (baja temperatura)
-    llm = make_hf_llm(DEFAULT_CONFIG_LOW_TEMP)
+    # Una instancia por prioridad en la cola del LLM (comparten el cliente HTTP)
+    llm = make_llm(llm_config)
+    router_llm = make_llm(llm_config, priority=PRIORITY_ROUTER)
+    faq_llm = make_llm(llm_config, priority=PRIORITY_FAQ)
+    summary_llm = make_llm(llm_config, priority=PRIORITY_BACKGROUND)
+    # Mismo modelo, pero con la salida restringida al esquema JSON de respuesta
+    json_llm = make_structured_llm(llm_config, ANSWER_SCHEMA)
 
-    # Memoria tipo buffer (para conversaciones)
-    memory = build_memory()
+    # Memoria por sesión (ventana + resumen en segundo plano), ver session_memory.py
+    summarizer = SessionSummarizer(summary_llm)
 
     # Chains de LangChain (clásicas)
-    router_chain = build_router_chain(llm)
-    faq_chain = build_faq_chain(llm, memory)
-    concept_chain = build_concept_sequential_chain(llm, memory)
-    practice_chain = build_practice_chain(llm)
+    router_chain = build_router_chain(router_llm)
+    faq_chain = build_faq_chain(faq_llm)
+    single_pass = pipeline_config.concept_mode == "single_pass"
+    if single_pass:
+        concept_chain = build_concept_json_chain(json_llm)
+    else:
+        concept_chain = build_concept_sequential_chain(llm)
+    practice_chain = build_practice_chain(json_llm)
+
+    # Caché semántica de respuestas (compartida entre sesiones)
+    cache = get_response_cache()
+
+    # Router local (embeddings + palabras clave); el LLM solo si hay dudas
+    local_router = get_local_router()
 
     # Creamos el grafo de estado
     builder = StateGraph(EduChatState)
@@ -46,67 +121,198 @@ def build_educhat_graph() -> StateGraph:
     # -------- NODOS -------- #
 
     def input_node(state: EduChatState) -> EduChatState:
+        # Id normalizado; un curso desconocido falla aquí (UnknownCourse)
+        state["course_id"] = get_course(state.get("course_id")).id
+        get_index_pool().touch(state["course_id"])  # cursos más pedidos, para la precarga
+        return state
+
+    def cache_node(state: EduChatState) -> EduChatState:
+        # Después del router: solo se sirven respuestas de la misma ruta (una
+        # paráfrasis de una pregunta de concept que va a practice no reutiliza
+        # su respuesta, ni al revés)
+        if state["mode"] == "faq":  # FAQ no se guarda en la caché (ver cache_store_node)
+            state["cache_hit"] = False
+            return state
+        hit = cache.lookup(state["user_input"], mode=state["mode"], course_id=state["course_id"])
+        state["cache_hit"] = hit is not None
+        if hit:
+            state["final_answer"] = hit.answer
+            _emit("cache_hit", {"mode": hit.mode, "similarity": round(hit.similarity, 4)})
         return state
 
-    def router_node(state: EduChatState) -> EduChatState:
-        # invoke devuelve un dict con la clave "mode"
-        out = router_chain.invoke({"user_input": state["user_input"]})
-        mode = out.get("mode", "").strip().lower()
-        if mode not in {"faq", "concept", "practice"}:
-            mode = "concept"  # fallback razonable
+    # Los nodos que llaman al LLM son async: con ainvoke la espera en la cola
+    # del planificador (aslot) y la llamada a Ollama no ocupan ningún hilo.
+    # Lo que es CPU (embeddings, FAISS) va a asyncio.to_thread para no
+    # bloquear el event loop.
+
+    async def router_node(state: EduChatState, config: RunnableConfig) -> EduChatState:
+        query = state["user_input"]
+        decision = await asyncio.to_thread(lambda: local_router.classify(query, vector=cache.embed(query)))
+        mode, source = decision.mode, "local"
+        speculative = False
+
+        if decision.confidence < DEFAULT_ROUTER_CONFIG.confidence_threshold and DEFAULT_ROUTER_CONFIG.llm_fallback:
+            # La recuperación no depende de la ruta: la lanzamos ya para que
+            # corra mientras el LLM decide (si gana faq, simplemente no se usa)
+            if pipeline_config.speculative_retrieval:
+                start_retrieval(query, state["course_id"])
+                speculative = True
+            # ainvoke devuelve un dict con la clave "mode"
+            out = await router_chain.ainvoke({"user_input": query}, config=config)
+            llm_mode = out.get("mode", "").strip().lower()
+            if llm_mode in {"faq", "concept", "practice"}:
+                mode, source = llm_mode, "llm"
+            # si el LLM divaga nos quedamos con la mejor opción local
+
         state["mode"] = mode
+        await _aemit(
+            "route",
+            {
+                "mode": mode,
+                "source": source,
+                "confidence": round(decision.confidence, 4),
+                "speculative_retrieval": speculative,
+            },
+            config,
+        )
         return state
 
-    def faq_node(state: EduChatState) -> EduChatState:
-        out = faq_chain.invoke({"user_input": state["user_input"]})
+    async def faq_node(state: EduChatState, config: RunnableConfig) -> EduChatState:
+        # Las preguntas conocidas se responden con plantilla, sin pasar por el LLM
+        # (respuestas precalculadas de logística de cada curso, ver faq_engine.py)
+        course_id = state["course_id"]
+        match = get_faq_engine(course_id).answer(state["user_input"])
+        if match:
+            await _aemit("faq_answered", {"source": "template", "intent": match.intent, "slots": match.slots}, config)
+            state["final_answer"] = match.answer
+            return state
+
+        await _aemit("faq_answered", {"source": "llm"}, config)
+        await _aemit("draft_started", {"node": "faq_node"}, config)
+        out = await faq_chain.ainvoke(
+            {
+                "course_name": get_course(course_id).name,
+                "course_info": course_info(course_id),
+                "user_input": state["user_input"],
+                "history": state.get("history", ""),
+            },
+            config=config,
+        )
         answer = out.get("answer", "")
         state["final_answer"] = answer
         return state
 
-    def concept_node(state: EduChatState) -> EduChatState:
+    def retrieve_context(query: str, course_id: str, mode: str):
+        # wait_ms: lo que el nodo espera de verdad (menos que timings_ms si la
+        # recuperación especulativa ya estaba en marcha o terminada)
+        t0 = time.perf_counter()
+        retrieval = course_rag_retrieve(query, course_id)
+        wait_ms = (time.perf_counter() - t0) * 1000
+        _emit(
+            "retrieval_done",
+            {
+                "chars": sum(len(doc.page_content) for doc in retrieval.docs),
+                "chunks": len(retrieval.docs),
+                "timings_ms": retrieval.timings_ms,
+                "wait_ms": round(wait_ms, 3),
+            },
+        )
+        if not DEFAULT_CONTEXT_CONFIG.enabled:
+            return retrieval, format_context(retrieval.docs), []
+
+        # Presupuesto de tokens del modo, sin frases repetidas, con la etiqueta de origen de cada pasaje
+        context = get_context_builder().build(query, retrieval.docs, mode)
+        _emit("context_built", {"mode": mode, **context.report()})
+        return retrieval, context.text, context.sources
+
+    async def concept_node(state: EduChatState, config: RunnableConfig) -> EduChatState:
         # 1) RAG: obtenemos contexto del curso
-        context = course_rag_search(state["user_input"])
+        retrieval, context, sources = await asyncio.to_thread(
+            retrieve_context, state["user_input"], state["course_id"], "concept"
+        )
 
-        # 2) Ejecutamos la SequentialChain con ese contexto
-        out = concept_chain.invoke(
+        # 2) Ejecutamos la chain de concept (una pasada o SequentialChain) con ese contexto
+        await _aemit("draft_started", {"node": "concept_node"}, config)
+        out = await concept_chain.ainvoke(
             {
+                "course_name": get_course(state["course_id"]).name,
                 "user_input": state["user_input"],
                 "history": state.get("history", ""),
                 "retrieved_context": context,
-            }
+            },
+            config=config,
         )
 
+        json_answer, repaired = repair_answer(out.get("json_answer") or out.get("draft_answer") or "", sources)
+        if repaired:
+            await _aemit("json_repaired", {"node": "concept_node"}, config)
+
         state["retrieved_context"] = context
-        state["draft_answer"] = out.get("draft_answer")
-        state["json_answer"] = out.get("json_answer")
-        state["final_answer"] = out.get("json_answer", state.get("draft_answer", ""))
+        state["retrieved_ids"] = [doc.id for doc in retrieval.docs]
+        state["context_sources"] = sources
+        state["draft_answer"] = None if single_pass else out.get("draft_answer")
+        state["json_answer"] = json_answer
+        state["final_answer"] = json_answer
 
         return state
 
-    def practice_node(state: EduChatState) -> EduChatState:
+    async def practice_node(state: EduChatState, config: RunnableConfig) -> EduChatState:
         # 1) RAG: contexto del curso para generar ejercicios relevantes
-        context = course_rag_search(state["user_input"])
+        retrieval, context, sources = await asyncio.to_thread(
+            retrieve_context, state["user_input"], state["course_id"], "practice"
+        )
+        await _aemit("draft_started", {"node": "practice_node"}, config)
 
         # IMPORTANTE: structured_json_prompt espera también "draft_answer",
         # así que le pasamos una cadena vacía para satisfacer la firma.
-        out = practice_chain.invoke(
+        out = await practice_chain.ainvoke(
             {
+                "course_name": get_course(state["course_id"]).name,
                 "user_input": state["user_input"],
                 "retrieved_context": context,
                 "draft_answer": "",  # <- añadido
-            }
+            },
+            config=config,
         )
 
+        json_answer, repaired = repair_answer(out.get("json_answer", ""), sources)
+        if repaired:
+            await _aemit("json_repaired", {"node": "practice_node"}, config)
+
         state["retrieved_context"] = context
-        state["json_answer"] = out.get("json_answer")
-        state["final_answer"] = out.get("json_answer", "")
+        state["retrieved_ids"] = [doc.id for doc in retrieval.docs]
+        state["context_sources"] = sources
+        state["json_answer"] = json_answer
+        state["final_answer"] = json_answer
         return state
 
 
-    def memory_node(state: EduChatState) -> EduChatState:
-        prev = state.get("history", "")
-        new_turn = f"User: {state['user_input']}\nAgent: {state.get('final_answer', '')}\n"
-        state["history"] = (prev + "\n" + new_turn).strip()
+    def cache_store_node(state: EduChatState) -> EduChatState:
+        # FAQ no se guarda: las plantillas ya son instantáneas y las respuestas
+        # del LLM de respaldo no están respaldadas por los datos del curso
+        if state["mode"] == "faq":
+            return state
+        cache.put(
+            state["user_input"],
+            state.get("final_answer") or "",
+            state["mode"],
+            course_id=state["course_id"],
+        )
+        return state
+
+    def memory_node(state: EduChatState, config: RunnableConfig) -> EduChatState:
+        thread_id = config.get("configurable", {}).get("thread_id", "default")
+        # El resumen más reciente lo tiene el summarizer (se actualiza en segundo plano)
+        summary = summarizer.get(thread_id, state.get("summary", ""))
+        turns, evicted = update_memory(
+            state.get("turns"), summary, state["user_input"], state.get("final_answer", "")
+        )
+        if evicted:
+            summarizer.submit(thread_id, summary, evicted)
+
+        state["turns"] = turns
+        state["summary"] = summary
+        state["history"] = render_history(summary, turns)
         return state
 
     def final_node(state: EduChatState) -> EduChatState:
@@ -115,10 +321,12 @@ def build_educhat_graph() -> StateGraph:
     # -------- REGISTRO DE NODOS -------- #
 
     builder.add_node("input", input_node)
+    builder.add_node("cache", cache_node)
     builder.add_node("router", router_node)
     builder.add_node("faq_node", faq_node)
     builder.add_node("concept_node", concept_node)
     builder.add_node("practice_node", practice_node)
+    builder.add_node("cache_store", cache_store_node)
     builder.add_node("memory_node", memory_node)
     builder.add_node("final_node", final_node)
 
@@ -126,24 +334,28 @@ def build_educhat_graph() -> StateGraph:
 
     builder.add_edge(START, "input")
     builder.add_edge("input", "router")
+    builder.add_edge("router", "cache")
 
-    # Ruteo condicional según el modo
+    # Si la caché ya tiene la respuesta (de esa ruta) nos saltamos los LLM de respuesta;
+    # si no, ruteo condicional según el modo
     def mode_selector(state: EduChatState) -> str:
-        return state["mode"]
+        return "hit" if state.get("cache_hit") else state["mode"]
 
     builder.add_conditional_edges(
-        "router",
+        "cache",
         mode_selector,
         {
+            "hit": "memory_node",
             "faq": "faq_node",
             "concept": "concept_node",
             "practice": "practice_node",
         },
     )
 
-    builder.add_edge("faq_node", "memory_node")
-    builder.add_edge("concept_node", "memory_node")
-    builder.add_edge("practice_node", "memory_node")
+    builder.add_edge("faq_node", "cache_store")
+    builder.add_edge("concept_node", "cache_store")
+    builder.add_edge("practice_node", "cache_store")
+    builder.add_edge("cache_store", "memory_node")
 
     builder.add_edge("memory_node", "final_node")
     builder.add_edge("final_node", END)
@@ -151,12 +363,23 @@ def build_educhat_graph() -> StateGraph:
     return builder
 
 
-def compile_graph():
+def compile_graph(
+    llm_config: LLMConfig = DEFAULT_CONFIG_LOW_TEMP,
+    checkpoint_config: CheckpointConfig = DEFAULT_CHECKPOINT_CONFIG,
+    make_llm=make_hf_llm,
+    make_structured_llm=make_json_llm,
+    pipeline_config: PipelineConfig = DEFAULT_PIPELINE_CONFIG,
+):
     """
-    Compila el grafo de EduChatAgent con un checkpointer en memoria
-    para poder tener sesiones (thread_id).
+    Compila el grafo de EduChatAgent con el checkpointer configurado
+    (CheckpointConfig: SQLite/WAL persistente o en memoria) para poder tener
+    sesiones (thread_id), y arranca el hilo que expulsa sesiones inactivas.
     """
-    builder = build_educhat_graph()
-    checkpointer = InMemorySaver()
+    builder = build_educhat_graph(llm_config, make_llm, make_structured_llm, pipeline_config)
+    checkpointer = make_checkpointer(checkpoint_config)
+    start_maintenance(checkpointer, checkpoint_config)
     graph = builder.compile(checkpointer=checkpointer)
+    if DEFAULT_TELEMETRY_CONFIG.enabled:
+        # Métricas y spans de todas las ejecuciones (ver telemetry.py)
+        graph = graph.with_config(callbacks=[get_telemetry()])
     return graph
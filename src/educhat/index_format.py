@@ -0,0 +1,204 @@
+# src/educhat/index_format.py
+
+"""
+Formato en disco del índice vectorial, sin pickle.
+
+`FAISS.save_local` guarda el docstore en `index.pkl`, que hay que cargar con
+`allow_dangerous_deserialization=True` y que cada worker de uvicorn
+deserializa entero en su memoria. Este formato lo sustituye por:
+
+  - index.faiss     - índice FAISS en su formato binario nativo. Para servir
+                      se abre con IO_FLAG_MMAP: los vectores no se copian a
+                      memoria y los workers comparten las páginas a través de
+                      la page cache del sistema operativo.
+  - chunks.sqlite3  - textos y metadatos de los chunks (tabla `chunks`,
+                      indexada por posición e id), abierta en solo lectura y
+                      leída bajo demanda: solo se tocan las filas devueltas.
+                      La tabla `meta` hace de cabecera (formato, versión,
+                      dimensión, número de vectores).
+
+Abrir un índice es abrir dos ficheros y leer la tabla posición -> id.
+
+Los builds incrementales trabajan sobre una copia escribible de los chunks
+(WritableSqliteDocstore), no sobre un docstore en memoria: el texto de los
+chunks no pasa por la memoria del proceso, ni al cargarlo ni al guardarlo.
+"""
+
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+import json
+import os
+import sqlite3
+import threading
+
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_core.documents import Document
+
+FORMAT_NAME = "educhat-index"
+FORMAT_VERSION = 1
+VECTORS_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite3"
+
+
+def has_index(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, CHUNKS_FILE)) and os.path.exists(
+        os.path.join(index_dir, VECTORS_FILE)
+    )
+
+
+def save_index(vectordb: FAISS, index_dir: str) -> None:
+    """Escribe index.faiss + chunks.sqlite3 en index_dir (que debe ser nuevo o temporal)."""
+    os.makedirs(index_dir, exist_ok=True)
+    faiss.write_index(vectordb.index, os.path.join(index_dir, VECTORS_FILE))
+
+    path = os.path.join(index_dir, CHUNKS_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE chunks (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        # Filas generadas de una en una: no se juntan todos los chunks en memoria
+        def rows() -> Iterator[Tuple[int, str, str, str]]:
+            for position, doc_id in sorted(vectordb.index_to_docstore_id.items()):
+                doc = vectordb.docstore.search(doc_id)
+                if not isinstance(doc, Document):
+                    raise ValueError(f"Chunk {doc_id} is in the FAISS index but not in the docstore")
+                yield position, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)
+
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows())
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("format", FORMAT_NAME),
+                ("format_version", str(FORMAT_VERSION)),
+                ("dim", str(vectordb.index.d)),
+                ("count", str(vectordb.index.ntotal)),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SqliteDocstore(Docstore):
+    """Docstore de solo lectura sobre chunks.sqlite3; lee cada chunk al pedirlo."""
+
+    def __init__(self, path: str):
+        # immutable=1: el fichero de una versión publicada no cambia nunca,
+        # así SQLite no necesita locks ni ficheros -wal/-shm
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def header(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def index_to_id(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, id FROM chunks"))
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def iter_documents(self) -> Iterable[Document]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, text, metadata FROM chunks ORDER BY position").fetchall()
+        for doc_id, text, metadata in rows:
+            yield Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class WritableSqliteDocstore(Docstore, AddableMixin):
+    """
+    Docstore escribible en un SQLite de trabajo, para los builds: FAISS.add_embeddings
+    y FAISS.delete escriben aquí y save_index lo lee fila a fila.
+    """
+
+    def __init__(self, path: str, copy_from: Optional[str] = None):
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        if copy_from:
+            # Copia dentro de SQLite, sin pasar los textos por Python
+            self._conn.execute("ATTACH DATABASE ? AS old", (f"file:{copy_from}?mode=ro&immutable=1",))
+            self._conn.execute("INSERT INTO docs SELECT id, text, metadata FROM old.chunks")
+            self._conn.commit()
+            self._conn.execute("DETACH DATABASE old")
+        self._lock = threading.Lock()
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs VALUES (?, ?, ?)",
+                [(doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)) for doc_id, doc in texts.items()],
+            )
+            self._conn.commit()
+
+    def delete(self, ids: list) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self._conn.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def close(self, remove: bool = True) -> None:
+        self._conn.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_index(index_dir: str, embeddings, writable: bool = False, work_path: Optional[str] = None) -> FAISS:
+    """
+    Abre un índice guardado con save_index.
+
+    - writable=False (servir): vectores por mmap y chunks leídos bajo demanda.
+    - writable=True (builds incrementales): vectores en memoria, para poder
+      añadir/borrar vectores antes de publicar una versión nueva. Los chunks
+      se copian a un WritableSqliteDocstore en work_path (o, sin work_path,
+      a un docstore en memoria).
+    """
+    docstore = SqliteDocstore(os.path.join(index_dir, CHUNKS_FILE))
+    header = docstore.header()
+    if header.get("format") != FORMAT_NAME or header.get("format_version") != str(FORMAT_VERSION):
+        docstore.close()
+        raise ValueError(
+            f"Unsupported index format in {index_dir}: "
+            f"{header.get('format')!r} v{header.get('format_version')!r}"
+        )
+
+    flags = 0 if writable else faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    index = faiss.read_index(os.path.join(index_dir, VECTORS_FILE), flags)
+    if index.ntotal != int(header["count"]) or index.d != int(header["dim"]):
+        docstore.close()
+        raise ValueError(f"index.faiss and chunks.sqlite3 do not match in {index_dir}")
+
+    index_to_id = docstore.index_to_id()
+    store: Docstore = docstore
+    if writable and work_path:
+        docstore.close()
+        store = WritableSqliteDocstore(work_path, copy_from=os.path.join(index_dir, CHUNKS_FILE))
+    elif writable:
+        store = InMemoryDocstore({doc.id: doc for doc in docstore.iter_documents()})
+        docstore.close()
+    return FAISS(embeddings, index, store, index_to_id)
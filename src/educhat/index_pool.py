@@ -0,0 +1,280 @@
+# src/educhat/index_pool.py
+
+"""
+Pool de índices por curso (FAISS + BM25 + retriever híbrido).
+
+Con un solo curso bastaba un retriever singleton. Con decenas de cursos no
+se pueden tener todos cargados, así que:
+
+  - cada índice se carga la primera vez que se pide su curso (dos peticiones
+    a la vez al mismo curso frío lo cargan una sola vez);
+  - las peticiones toman el índice con lease() y lo sueltan al terminar
+    (contador de referencias): nunca se expulsa un índice en uso;
+  - el pool tiene límite de cursos (max_loaded) y de bytes (tamaño en disco
+    del índice publicado); al pasarse se expulsa el menos usado sin
+    referencias;
+  - si build_rag publica una versión nueva de un curso, la siguiente petición
+    carga esa versión (la vieja se libera cuando terminan sus lecturas);
+  - un hilo precarga, si caben sin expulsar nada, los `prefetch_hot` cursos
+    más pedidos (contador de peticiones con decaimiento exponencial) que no
+    estén cargados.
+
+Así la memoria depende de los cursos activos, no del total de cursos.
+"""
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+import logging
+import os
+import threading
+import time
+
+from .config import CourseConfig, DEFAULT_COURSE_CONFIG, DEFAULT_RETRIEVAL_CONFIG
+from .courses import Course, get_course
+from .rag_store import current_index_dir, current_index_version
+from .retrieval import HybridRetriever, load_hybrid_retriever
+
+logger = logging.getLogger(__name__)
+
+
+def index_bytes(persist_dir: str) -> int:
+    """Tamaño en disco de la versión publicada del índice (vectores, docstore, BM25)."""
+    index_dir = current_index_dir(persist_dir)
+    if not os.path.isdir(index_dir):
+        return 0
+    total = 0
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+    return total
+
+
+@dataclass
+class _Slot:
+    course_id: str
+    version: str
+    retriever: HybridRetriever
+    bytes: int
+    refs: int = 0
+    loaded_at: float = field(default_factory=time.time)
+
+
+class IndexPool:
+    def __init__(self, config: CourseConfig = DEFAULT_COURSE_CONFIG):
+        self.config = config
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, _Slot]" = OrderedDict()  # LRU: el último es el más reciente
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._heat: Dict[str, float] = {}       # curso -> peticiones recientes (con decaimiento)
+        self._heat_at: Dict[str, float] = {}
+        self._load_ms: deque = deque(maxlen=200)
+        self._prefetcher: Optional[ThreadPoolExecutor] = None
+        self._prefetching: Dict[str, int] = {}  # curso -> bytes, precargas aún sin cargar
+        self.hits = 0
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.prefetches = 0
+
+    # -------- préstamo de índices -------- #
+
+    @contextmanager
+    def lease(self, course_id: Optional[str] = None) -> Iterator[HybridRetriever]:
+        """Retriever del curso, que no se expulsa mientras dure el bloque."""
+        slot = self._acquire(get_course(course_id))
+        try:
+            yield slot.retriever
+        finally:
+            self._release(slot)
+
+    def get(self, course_id: Optional[str] = None) -> HybridRetriever:
+        """Retriever del curso sin retenerlo (estadísticas, calentamiento)."""
+        slot = self._acquire(get_course(course_id))
+        self._release(slot)
+        return slot.retriever
+
+    def _acquire(self, course: Course) -> _Slot:
+        version = current_index_version(course.index_dir)
+        with self._lock:
+            slot = self._take(course.id, version)
+            if slot is not None:
+                self.hits += 1
+                return slot
+            load_lock = self._load_locks.setdefault(course.id, threading.Lock())
+
+        # La carga va fuera del lock del pool: otros cursos siguen atendiéndose
+        with load_lock:
+            with self._lock:
+                slot = self._take(course.id, version)  # otro hilo acaba de cargarlo
+                if slot is not None:
+                    self.hits += 1
+                    return slot
+            slot = self._load(course, version)
+            with self._lock:
+                if self._slots.pop(course.id, None) is not None:
+                    self.reloads += 1  # versión anterior: se libera cuando terminen sus lecturas
+                self._slots[course.id] = slot
+                slot.refs += 1
+                self._evict()
+            return slot
+
+    def _take(self, course_id: str, version: str) -> Optional[_Slot]:
+        """Slot cargado con esa versión, ya retenido (con el lock tomado)."""
+        slot = self._slots.get(course_id)
+        if slot is None or slot.version != version:
+            return None
+        slot.refs += 1
+        self._slots.move_to_end(course_id)
+        return slot
+
+    def _load(self, course: Course, version: str) -> _Slot:
+        t0 = time.perf_counter()
+        retriever = load_hybrid_retriever(DEFAULT_RETRIEVAL_CONFIG, course.index_dir, course.id)
+        ms = (time.perf_counter() - t0) * 1000
+        slot = _Slot(course.id, retriever.index_version or version, retriever, index_bytes(course.index_dir))
+        with self._lock:
+            self.loads += 1
+            self._load_ms.append(ms)
+        logger.info("Loaded index of course %s (%s, %.1f MB) in %.1f ms",
+                    course.id, slot.version, slot.bytes / 1e6, ms)
+        return slot
+
+    def _release(self, slot: _Slot) -> None:
+        with self._lock:
+            slot.refs -= 1
+            self._evict()
+
+    def _over_budget(self) -> bool:
+        total = sum(slot.bytes for slot in self._slots.values())
+        return len(self._slots) > self.config.max_loaded or total > self.config.max_bytes
+
+    def _evict(self) -> None:
+        """Expulsa los menos usados sin referencias hasta volver al límite (con el lock tomado)."""
+        while self._over_budget():
+            idle = next((cid for cid, slot in self._slots.items() if slot.refs <= 0), None)
+            if idle is None:
+                return  # todos en uso: se expulsarán al soltarlos
+            del self._slots[idle]
+            self.evictions += 1
+            logger.info("Evicted index of course %s", idle)
+
+    # -------- cursos más pedidos y precarga -------- #
+
+    def touch(self, course_id: str) -> None:
+        """Cuenta una petición al curso (la llama graph.input_node, use o no su índice)."""
+        now = time.time()
+        with self._lock:
+            self._heat[course_id] = self._decayed(course_id, now) + 1.0
+            self._heat_at[course_id] = now
+
+    def _decayed(self, course_id: str, now: float) -> float:
+        elapsed = now - self._heat_at.get(course_id, now)
+        return self._heat.get(course_id, 0.0) * 0.5 ** (elapsed / self.config.hot_half_life_seconds)
+
+    def hot_courses(self, n: int) -> List[str]:
+        now = time.time()
+        with self._lock:
+            heat = {course_id: self._decayed(course_id, now) for course_id in self._heat}
+        return sorted(heat, key=heat.get, reverse=True)[:n]
+
+    def prefetch(self, course_ids: List[str]) -> int:
+        """Carga en segundo plano los cursos que quepan sin expulsar a otro; devuelve cuántos."""
+        submitted = 0
+        for course_id in course_ids:
+            try:
+                course = get_course(course_id)
+            except LookupError:
+                continue
+            size = index_bytes(course.index_dir)
+            with self._lock:
+                if course.id in self._slots or course.id in self._prefetching or not size:
+                    continue
+                # Las precargas pendientes también ocupan su sitio
+                loaded = len(self._slots) + len(self._prefetching)
+                total = sum(slot.bytes for slot in self._slots.values()) + sum(self._prefetching.values())
+                if loaded + 1 > self.config.max_loaded or total + size > self.config.max_bytes:
+                    continue
+                if self._prefetcher is None:
+                    self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="educhat-prefetch")
+                self._prefetching[course.id] = size
+                self.prefetches += 1
+            self._prefetcher.submit(self._prefetch_one, course.id)
+            submitted += 1
+        return submitted
+
+    def _prefetch_one(self, course_id: str) -> None:
+        try:
+            self.get(course_id)
+        finally:
+            with self._lock:
+                self._prefetching.pop(course_id, None)
+
+    def prefetch_hot(self) -> int:
+        return self.prefetch(self.hot_courses(self.config.prefetch_hot))
+
+    # -------- estadísticas -------- #
+
+    def stats(self) -> Dict[str, object]:
+        import numpy as np
+
+        now = time.time()
+        with self._lock:
+            load_ms = np.array(self._load_ms) if self._load_ms else None
+            return {
+                "loaded": {
+                    course_id: {
+                        "version": slot.version,
+                        "bytes": slot.bytes,
+                        "refs": slot.refs,
+                        "age_s": round(now - slot.loaded_at, 1),
+                    }
+                    for course_id, slot in self._slots.items()
+                },
+                "bytes": sum(slot.bytes for slot in self._slots.values()),
+                "max_bytes": self.config.max_bytes,
+                "max_loaded": self.config.max_loaded,
+                "hits": self.hits,
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "prefetches": self.prefetches,
+                "load_ms": {
+                    "mean": float(load_ms.mean()),
+                    "p95": float(np.percentile(load_ms, 95)),
+                } if load_ms is not None else None,
+                "hot": {
+                    course_id: round(self._decayed(course_id, now), 2)
+                    for course_id in sorted(self._heat, key=lambda c: -self._decayed(c, now))[:10]
+                },
+            }
+
+
+def start_prefetcher(pool: IndexPool, config: CourseConfig = DEFAULT_COURSE_CONFIG) -> Optional[threading.Thread]:
+    """Lanza un hilo daemon que ejecuta prefetch_hot cada prefetch_interval_seconds."""
+    if config.prefetch_interval_seconds <= 0 or config.prefetch_hot <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(config.prefetch_interval_seconds)
+            try:
+                pool.prefetch_hot()
+            except Exception:
+                logger.exception("Index prefetch failed")
+
+    thread = threading.Thread(target=loop, name="educhat-index-prefetch", daemon=True)
+    thread.start()
+    return thread
+
+
+@lru_cache(maxsize=1)
+def get_index_pool() -> IndexPool:
+    """Pool compartido por todo el proceso; arranca también el hilo de precarga."""
+    pool = IndexPool(DEFAULT_COURSE_CONFIG)
+    start_prefetcher(pool, DEFAULT_COURSE_CONFIG)
+    return pool
@@ -0,0 +1,303 @@
+# src/educhat/ingest.py
+
+"""
+Piezas de la ingesta por streaming que usa rag_store.update_vector_store.
+
+Antes build_rag leía todos los .txt a una lista, troceaba todo y calculaba
+todos los embeddings en una sola llamada. Ahora los ficheros se leen de
+uno en uno (data_loader.TxtSources), sus chunks pasan por:
+
+  1. normalize_text  - NFKC, espacios al final de línea y líneas en blanco
+                       repetidas fuera: el mismo texto da el mismo chunk_id;
+  2. Deduplicator    - descarta chunks iguales (tras normalizar, sin
+                       mayúsculas ni puntuación) o casi iguales (MinHash de
+                       shingles de palabras + LSH, similitud de Jaccard
+                       estimada >= near_threshold) a uno ya indexado, p. ej.
+                       las listas de contenidos repetidas en
+                       uc_contents.txt.txt y syllabus.txt;
+  3. EmbeddingPipeline - lotes de embed_batch chunks, en este proceso o en
+                       un pool de procesos, con un máximo de lotes en vuelo;
+                       cada lote se añade al índice en cuanto está listo.
+
+Así en memoria solo hay un fichero, unos pocos lotes y, por chunk, su
+vector (el propio índice FAISS) y su firma MinHash (minhash_perms * 4
+bytes), nunca el corpus. IngestStats lleva el progreso y el throughput.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import multiprocessing
+import os
+import re
+import resource
+import time
+import unicodedata
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .config import DEFAULT_INGEST_CONFIG, IngestConfig
+
+DEDUP_FILE = "dedup.npz"
+DEDUP_MODES = ("off", "exact", "near")
+_WORD_RE = re.compile(r"\w+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_text(text: str) -> str:
+    """Normalización del texto de un chunk antes de calcular su id y su embedding."""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def dedup_config(config: IngestConfig = DEFAULT_INGEST_CONFIG) -> Dict[str, object]:
+    """Parte de la configuración que se guarda en el manifest (si cambia, se reconstruye todo)."""
+    if config.dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode {config.dedup!r}; expected one of {DEDUP_MODES}")
+    values = asdict(config)
+    return {
+        name: values[name]
+        for name in ("dedup", "near_threshold", "shingle_words", "minhash_perms", "lsh_bands")
+    }
+
+
+# ---------------------------------------------------------------------------
+# Deduplicación
+# ---------------------------------------------------------------------------
+
+def _hash64(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Deduplicator:
+    """
+    Chunks ya indexados (clave exacta + firma MinHash) y sus buckets LSH.
+    Las entradas cargadas de la versión anterior empiezan inactivas y se
+    activan si su chunk sigue en el índice; solo las activas cuentan como
+    original de un duplicado.
+    """
+
+    def __init__(self, config: IngestConfig = DEFAULT_INGEST_CONFIG):
+        self.config = config
+        self.rows = config.minhash_perms // config.lsh_bands
+        rng = np.random.default_rng(0x5EED)
+        self._seeds = rng.integers(0, 2 ** 63, config.minhash_perms, dtype=np.uint64)
+        self._mults = rng.integers(0, 2 ** 63, config.minhash_perms, dtype=np.uint64) | np.uint64(1)
+        self.ids: List[str] = []
+        self._row: Dict[str, int] = {}
+        self._active: List[bool] = []
+        self._row_keys: List[int] = []
+        self._keys: Dict[int, int] = {}  # clave exacta -> fila activa
+        self._sigs = np.empty((0, config.minhash_perms), dtype=np.uint32)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(config.lsh_bands)]
+
+    # -------- firmas -------- #
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        return _WORD_RE.findall(text.casefold())
+
+    def key(self, text: str) -> int:
+        return _hash64(" ".join(self._words(text)))
+
+    def signature(self, text: str) -> np.ndarray:
+        words = self._words(text)
+        n = self.config.shingle_words
+        shingles = {" ".join(words[i: i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((_hash64(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Una permutación por fila: ((h xor seed) * mult) mod 2^64, nos quedamos con los 32 bits altos
+        with np.errstate(over="ignore"):
+            mixed = (hashes[None, :] ^ self._seeds[:, None]) * self._mults[:, None]
+        return (mixed >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def _bands(self, sig: np.ndarray) -> Iterator[Tuple[int, bytes]]:
+        for band in range(self.config.lsh_bands):
+            yield band, sig[band * self.rows: (band + 1) * self.rows].tobytes()
+
+    # -------- consulta y altas -------- #
+
+    def check(self, text: str) -> Tuple[Optional[str], Optional[str], int, Optional[np.ndarray]]:
+        """(tipo de duplicado o None, id del original, clave, firma) de un chunk nuevo."""
+        key = self.key(text)
+        row = self._keys.get(key)
+        if row is not None:
+            return "exact", self.ids[row], key, None
+        if self.config.dedup != "near":
+            return None, None, key, None
+
+        sig = self.signature(text)
+        candidates = {r for band, bucket in self._bands(sig) for r in self._buckets[band].get(bucket, ())}
+        best, best_sim = None, 0.0
+        for r in candidates:
+            if not self._active[r]:
+                continue
+            sim = float(np.mean(self._sigs[r] == sig))
+            if sim > best_sim:
+                best, best_sim = r, sim
+        if best is not None and best_sim >= self.config.near_threshold:
+            return "near", self.ids[best], key, sig
+        return None, None, key, sig
+
+    def add(self, chunk_id: str, key: int, sig: Optional[np.ndarray], active: bool = True) -> None:
+        row = len(self.ids)
+        self.ids.append(chunk_id)
+        self._row[chunk_id] = row
+        self._active.append(active)
+        self._row_keys.append(key)
+        if active:
+            self._keys.setdefault(key, row)
+        if sig is None:
+            sig = np.zeros(self.config.minhash_perms, dtype=np.uint32)
+        elif self.config.dedup == "near":
+            for band, bucket in self._bands(sig):
+                self._buckets[band].setdefault(bucket, []).append(row)
+        if row >= len(self._sigs):
+            grown = np.empty((max(1024, 2 * len(self._sigs)), self.config.minhash_perms), dtype=np.uint32)
+            grown[: len(self._sigs)] = self._sigs
+            self._sigs = grown
+        self._sigs[row] = sig
+
+    def activate(self, chunk_id: str) -> None:
+        """Marca como vigente un chunk de la versión anterior que sigue en el índice."""
+        row = self._row.get(chunk_id)
+        if row is not None and not self._active[row]:
+            self._active[row] = True
+            self._keys.setdefault(self._row_keys[row], row)
+
+    # -------- persistencia (dedup.npz junto al índice) -------- #
+
+    def save(self, path: str, keep: set) -> None:
+        rows = [r for r, chunk_id in enumerate(self.ids) if chunk_id in keep]
+        np.savez(
+            path,
+            ids=np.array([self.ids[r] for r in rows], dtype="U64"),
+            keys=np.array([self._row_keys[r] for r in rows], dtype=np.uint64),
+            sigs=self._sigs[rows] if rows else np.empty((0, self.config.minhash_perms), dtype=np.uint32),
+        )
+
+    def load(self, path: str) -> int:
+        """Carga las entradas de la versión anterior (inactivas); devuelve cuántas."""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            for chunk_id, key, sig in zip(data["ids"], data["keys"], data["sigs"]):
+                self.add(str(chunk_id), int(key), sig, active=False)
+        return len(self.ids)
+
+
+# ---------------------------------------------------------------------------
+# Embeddings por lotes acotados
+# ---------------------------------------------------------------------------
+
+_WORKER_EMBEDDINGS = None
+
+
+def _init_worker(factory: Callable) -> None:
+    global _WORKER_EMBEDDINGS
+    _WORKER_EMBEDDINGS = factory()
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_WORKER_EMBEDDINGS.embed_documents(texts), dtype=np.float32)
+
+
+class EmbeddingPipeline:
+    """
+    Calcula los embeddings de lotes de Documents. submit() devuelve los lotes
+    ya terminados, en el orden en que se enviaron; cuando hay max_pending
+    lotes en vuelo espera al más antiguo, así que la memoria no crece con el
+    corpus aunque la lectura vaya más rápida que los embeddings.
+
+    Con processes > 0 cada proceso del pool carga su propio motor con
+    `factory` (ver embeddings.make_embeddings); con 0 se usa `embeddings`
+    en este proceso.
+    """
+
+    def __init__(self, embeddings=None, factory: Optional[Callable] = None, processes: int = 0, max_pending: int = 0):
+        self.embeddings = embeddings
+        self.max_pending = max_pending or 2 * max(1, processes)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if processes > 0:
+            # spawn: torch no se lleva bien con fork una vez creados sus hilos
+            self._pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(factory,),
+            )
+        self._pending: Deque[Tuple[List[Document], Future]] = deque()
+
+    def submit(self, docs: List[Document]) -> Iterator[Tuple[List[Document], np.ndarray]]:
+        texts = [doc.page_content for doc in docs]
+        if self._pool is None:
+            yield docs, np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            return
+        self._pending.append((docs, self._pool.submit(_embed_in_worker, texts)))
+        while len(self._pending) >= self.max_pending:
+            done, future = self._pending.popleft()
+            yield done, future.result()
+
+    def drain(self) -> Iterator[Tuple[List[Document], np.ndarray]]:
+        while self._pending:
+            done, future = self._pending.popleft()
+            yield done, future.result()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "EmbeddingPipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# Progreso
+# ---------------------------------------------------------------------------
+
+@dataclass
+class IngestStats:
+    files: int = 0             # ficheros leídos
+    files_changed: int = 0     # ficheros troceados (nuevos o modificados)
+    bytes: int = 0             # bytes de texto de los ficheros troceados
+    chunks: int = 0            # chunks de los ficheros troceados
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    embedded: int = 0          # chunks con embedding nuevo
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, object]:
+        elapsed = max(self.elapsed_s, 1e-9)
+        out = {name: value for name, value in asdict(self).items() if name != "started"}
+        out.update({
+            "elapsed_s": round(elapsed, 2),
+            "chunks_per_s": round(self.embedded / elapsed, 1),
+            "mb_per_s": round(self.bytes / 1e6 / elapsed, 2),
+            # Pico de memoria residente del proceso (ru_maxrss está en KB en Linux)
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+        return out
+
+    def line(self) -> str:
+        return describe_stats(self.as_dict())
+
+
+def describe_stats(stats: Dict[str, object]) -> str:
+    """Una línea con el progreso de IngestStats.as_dict() (build_rag)."""
+    return (
+        f"{stats['files_changed']}/{stats['files']} files processed, {stats['chunks']} chunks "
+        f"({stats['exact_duplicates']} exact + {stats['near_duplicates']} near duplicates), "
+        f"{stats['embedded']} embedded in {stats['elapsed_s']} s, {stats['chunks_per_s']} chunks/s, "
+        f"{stats['mb_per_s']} MB/s, peak RSS {stats['peak_rss_mb']} MB"
+    )
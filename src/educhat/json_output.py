@@ -0,0 +1,197 @@
+# src/educhat/json_output.py
+
+"""
+Esquema de la respuesta estructurada (answer / key_points / references),
+validación y una reparación barata para cuando el modelo no devuelve un
+JSON perfecto (bloques ```json, texto antes/después, comas finales...).
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Se pasa tal cual a ChatOllama(format=...) para que Ollama restrinja la salida
+ANSWER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "answer": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}},
+        "references": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["answer", "key_points", "references"],
+}
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def validate_answer(obj: Any) -> List[str]:
+    """Devuelve la lista de problemas frente a ANSWER_SCHEMA (vacía si es válido)."""
+    if not isinstance(obj, dict):
+        return ["not a JSON object"]
+    problems = []
+    if not isinstance(obj.get("answer"), str):
+        problems.append("answer must be a string")
+    for key in ("key_points", "references"):
+        value = obj.get(key)
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            problems.append(f"{key} must be a list of strings")
+    return problems
+
+
+def _as_str_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        lines = [_BULLET_RE.sub("", line).strip() for line in value.splitlines()]
+        return [line for line in lines if line]
+    if isinstance(value, list):
+        return [v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in value]
+    return [str(value)]
+
+
+def _loads(text: str) -> Any:
+    text = _FENCE_RE.sub("", text.strip())
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("no JSON object found")
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", text[start:end + 1])
+    return json.loads(candidate, strict=False)
+
+
+def repair_answer(raw: str, sources: Optional[List[str]] = None) -> Tuple[str, bool]:
+    """
+    Convierte la salida del modelo en un JSON válido según ANSWER_SCHEMA.
+    Devuelve (json_normalizado, reparado) donde `reparado` indica si hubo que tocarlo.
+    Si no hay forma de leerlo, el texto completo pasa a ser "answer".
+    Si el modelo deja "references" vacío se rellena con `sources` (las
+    etiquetas de los pasajes del contexto, ver context_builder.py).
+    """
+    raw = raw or ""
+    repaired = False
+    try:
+        obj = json.loads(raw)
+    except json.JSONDecodeError:
+        repaired = True
+        try:
+            obj = _loads(raw)
+        except ValueError:  # json.JSONDecodeError es subclase de ValueError
+            obj = {"answer": raw.strip()}
+
+    if validate_answer(obj):
+        repaired = True
+    if not isinstance(obj, dict):
+        obj = {"answer": raw.strip()}
+
+    answer = obj.get("answer", "")
+    fixed = {
+        "answer": answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False),
+        "key_points": _as_str_list(obj.get("key_points")),
+        "references": _as_str_list(obj.get("references")) or list(sources or []),
+    }
+    return json.dumps(fixed, ensure_ascii=False), repaired
+
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerStream:
+    """
+    Texto del campo "answer" de una salida JSON según llegan los tokens
+    (lo que /chat/stream reenvía al cliente en lugar del JSON en crudo).
+    Si la salida no empieza por un objeto JSON (p. ej. el borrador de
+    concept en two_pass) el texto pasa tal cual.
+    """
+
+    def __init__(self):
+        self._mode: Optional[str] = None  # None (aún no se sabe), "json" o "text"
+        self._head = ""
+        self._depth = 0
+        self._string: Optional[str] = None  # string abierto: "key", "answer" u "other"
+        self._escape: Optional[str] = None  # escape a medias (sin la barra)
+        self._surrogate = ""                # primera mitad de un par 😀
+        self._key: List[str] = []
+        self._last_key: Optional[str] = None
+        self._expect_value = False
+
+    def feed(self, chunk: str) -> str:
+        if self._mode == "text":
+            return chunk
+        if self._mode is None:
+            self._head += chunk
+            head = self._head.lstrip()
+            if head.startswith("`"):
+                # ```json ... : se salta la primera línea de la valla
+                if "\n" not in head:
+                    return ""
+                head = head.split("\n", 1)[1].lstrip()
+            if not head:
+                return ""
+            self._mode = "json" if head[0] == "{" else "text"
+            if self._mode == "text":
+                return self._head
+            chunk = head
+        return "".join(self._scan(chunk))
+
+    def _scan(self, chunk: str):
+        for c in chunk:
+            if self._string is None:
+                if c in "{[":
+                    self._depth += 1
+                elif c in "}]":
+                    self._depth -= 1
+                elif self._depth == 1 and c == ":":
+                    self._expect_value = True
+                elif self._depth == 1 and c == ",":
+                    self._expect_value = False
+                elif c == '"':
+                    if self._depth != 1:
+                        self._string = "other"
+                    elif not self._expect_value:
+                        self._string, self._key = "key", []
+                    else:
+                        self._string = "answer" if self._last_key == "answer" else "other"
+                continue
+
+            if self._escape is not None:
+                self._escape += c
+                if self._escape[0] == "u" and len(self._escape) < 5:
+                    continue
+                text = self._unescape(self._escape)
+                self._escape = None
+            elif c == "\\":
+                self._escape = ""
+                continue
+            elif c == '"':
+                if self._string == "key":
+                    self._last_key = "".join(self._key)
+                self._string = None
+                continue
+            else:
+                text = c
+
+            if self._string == "key":
+                self._key.append(text)
+            elif self._string == "answer" and text:
+                yield text
+
+    def _unescape(self, escape: str) -> str:
+        if escape[0] != "u":
+            return _ESCAPES.get(escape, escape)
+        try:
+            code = int(escape[1:], 16)
+        except ValueError:
+            return ""
+        if 0xD800 <= code < 0xDC00:
+            self._surrogate = escape
+            return ""
+        if self._surrogate and 0xDC00 <= code < 0xE000:
+            pair, self._surrogate = f"\\{self._surrogate}\\{escape}", ""
+            return json.loads(f'"{pair}"')
+        self._surrogate = ""
+        return chr(code)
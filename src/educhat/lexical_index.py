@@ -0,0 +1,143 @@
+# src/educhat/lexical_index.py
+
+"""
+Índice léxico BM25 en memoria, complementario al índice FAISS.
+
+Los embeddings de MiniLM recuperan bien por significado pero fallan con
+términos exactos ("DDL", "weight of the final project", "UC3"). BM25 sobre
+un índice invertido cubre esos casos. Se construye en build_rag a partir del
+docstore de FAISS (mismos chunks, mismos ids) y se guarda como JSON junto al
+índice vectorial, así que se publica y versiona con él.
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+import json
+import math
+import re
+import unicodedata
+
+BM25_FILE = "bm25.json"
+FORMAT_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Palabras vacías (inglés + español) que no aportan al ranking
+STOPWORDS = frozenset(
+    """
+    a an and are as at be by for from has have how i in is it its of on or that the this
+    to was were what when where which who why will with do does did can you your my me
+    el la los las un una unos unas y o de del al en con por para que como es son se su
+    sus lo le les mi tu qué cuál cuándo dónde cómo
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes, alfanumérico y sin palabras vacías."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 con índice invertido (término -> [(doc, tf)])."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.doc_len: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._avgdl = 0.0
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """items: pares (id del chunk, texto)."""
+        index = cls(k1, b)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, text in items:
+            tokens = tokenize(text)
+            pos = len(index.ids)
+            index.ids.append(doc_id)
+            index.doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((pos, tf))
+        index.postings = dict(postings)
+        index._prepare()
+        return index
+
+    def _prepare(self) -> None:
+        n = len(self.ids)
+        self._avgdl = (sum(self.doc_len) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Devuelve hasta k pares (id, score) ordenados por score descendente."""
+        if not self.ids:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for pos, tf in self.postings[term]:
+                norm = 1 - self.b + self.b * self.doc_len[pos] / (self._avgdl or 1.0)
+                scores[pos] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[pos], score) for pos, score in best]
+
+    # -------- persistencia (JSON, sin pickle) -------- #
+
+    def to_dict(self) -> dict:
+        return {
+            "format": FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "doc_len": self.doc_len,
+            "postings": {term: [list(p) for p in plist] for term, plist in self.postings.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format: {data.get('format')!r}")
+        index = cls(data["k1"], data["b"])
+        index.ids = list(data["ids"])
+        index.doc_len = list(data["doc_len"])
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        index._prepare()
+        return index
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _indexed_text(doc) -> str:
+    # El título de sección también cuenta ("Grading", "Final project"...)
+    section = doc.metadata.get("section", "") if doc.metadata else ""
+    return f"{section}\n{doc.page_content}" if section else doc.page_content
+
+
+def build_from_vectorstore(vectordb) -> BM25Index:
+    """Construye el índice BM25 con los mismos chunks (e ids) que el docstore de FAISS."""
+    items = []
+    for docstore_id in vectordb.index_to_docstore_id.values():
+        doc = vectordb.docstore.search(docstore_id)
+        if hasattr(doc, "page_content"):
+            items.append((docstore_id, _indexed_text(doc)))
+    return BM25Index.build(items)
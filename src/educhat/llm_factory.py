@@ -6,24 +6,117 @@ Factoría de LLMs para EduChat.
 Antes usábamos un modelo de HuggingFace en local (transformers + pipeline).
 Ahora usamos un modelo de Ollama (gemma3:4b) vía ChatOllama, que es más ligero
 para tu máquina y cumple con la rúbrica de usar LLMs open-source (Ollama).
+
+Todas las instancias pasan por el planificador (llm_scheduler.py) y comparten
+el cliente HTTP de Ollama, en lugar de abrir uno por chain. También comparten
+las opciones que obligan a recargar el modelo si cambian (num_ctx), y piden a
+Ollama que lo mantenga cargado (keep_alive), para que la caché KV del prefijo
+fijo de los prompts (ver prompts.py) sirva de una petición a la siguiente.
 """
 
+from typing import Any, Dict, Tuple
+
 from langchain_ollama import ChatOllama  # integración oficial Ollama + LangChain
 from .config import LLMConfig
+from .llm_scheduler import PRIORITY_GENERATION, get_scheduler
+
+# Clientes HTTP (sync, async) de Ollama compartidos, por base_url
+_SHARED_CLIENTS: Dict[str, Tuple[object, object]] = {}
+
+
+class SchedulerSlotMixin:
+    """
+    Pide turno al planificador antes de cada llamada al modelo.
+    La clase final debe declarar el campo `priority` (ver llm_scheduler.PRIORITY_*).
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with get_scheduler().slot(self.priority):
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with get_scheduler().slot(self.priority):
+            yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        async with get_scheduler().aslot(self.priority):
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async with get_scheduler().aslot(self.priority):
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+
+
+class ScheduledChatOllama(SchedulerSlotMixin, ChatOllama):
+    """ChatOllama que pasa por la cola del planificador."""
+
+    priority: int = PRIORITY_GENERATION
+
+
+def _share_clients(llm: ChatOllama) -> ChatOllama:
+    """Reutiliza el pool de conexiones HTTP del primer ChatOllama creado para ese host."""
+    key = llm.base_url or ""
+    if key in _SHARED_CLIENTS:
+        llm._client, llm._async_client = _SHARED_CLIENTS[key]
+    else:
+        _SHARED_CLIENTS[key] = (llm._client, llm._async_client)
+    return llm
+
+
+def ollama_options(config: LLMConfig) -> Dict[str, Any]:
+    """Opciones de generación de Ollama para `config` (las mismas en todas las instancias)."""
+    return {
+        "temperature": config.temperature,  # control de aleatoriedad
+        "top_p": config.top_p,
+        "top_k": config.top_k,
+        "num_predict": config.num_predict if config.num_predict is not None else config.max_new_tokens,
+        "num_ctx": config.num_ctx,
+    }
 
 
-def make_hf_llm(config: LLMConfig):
+def make_hf_llm(config: LLMConfig, priority: int = PRIORITY_GENERATION):
     """
     Crea un LLM de Ollama usando la configuración dada.
 
     Mantenemos el nombre `make_hf_llm` para no cambiar nada en graph.py,
     pero internamente ya no usa HuggingFace, sino ChatOllama.
     """
-    llm = ChatOllama(
-        model=config.model_id,           # ej. "gemma3:4b"
-        temperature=config.temperature,  # control de aleatoriedad
-        top_p=config.top_p,
-        # num_predict=config.max_new_tokens,  # si quieres limitar tokens de salida
-        # puedes descomentar esta línea
+    llm = ScheduledChatOllama(
+        model=config.model_id,  # ej. "gemma3:4b"
+        keep_alive=config.keep_alive,
+        priority=priority,
+        **ollama_options(config),
+    )
+    return _share_clients(llm)
+
+
+def make_json_llm(config: LLMConfig, schema: dict, priority: int = PRIORITY_GENERATION):
+    """
+    Igual que make_hf_llm, pero Ollama restringe la salida al JSON Schema dado
+    (parámetro `format`), así el modelo genera el objeto final en una sola pasada.
+    """
+    llm = ScheduledChatOllama(
+        model=config.model_id,
+        keep_alive=config.keep_alive,
+        format=schema,
+        priority=priority,
+        **ollama_options(config),
+    )
+    return _share_clients(llm)
+
+
+def warm_up_model(config: LLMConfig) -> None:
+    """
+    Pide a Ollama que cargue el modelo en memoria (un generate con prompt
+    vacío no genera nada, solo carga). Se pasa el mismo num_ctx que usarán las
+    chains para que la primera petición real no vuelva a cargarlo.
+    Lanza excepción si Ollama no responde.
+    """
+    llm = make_hf_llm(config)
+    llm._client.generate(
+        model=config.model_id,
+        prompt="",
+        options={"num_ctx": config.num_ctx},
+        keep_alive=config.keep_alive,
     )
-    return llm
@@ -0,0 +1,250 @@
+# src/educhat/llm_scheduler.py
+
+"""
+Planificador de llamadas al LLM (Ollama).
+
+Todas las llamadas de los nodos del grafo pasan por aquí antes de llegar al
+modelo local (ver llm_factory.ScheduledChatOllama):
+
+  - Como mucho `max_in_flight` generaciones a la vez contra Ollama.
+  - Cola con prioridad: router y FAQ (respuestas cortas) antes que las
+    generaciones largas de concept/practice, y el resumen de memoria el último.
+  - Equidad por sesión: dentro de la misma prioridad pasa antes la sesión
+    que menos peticiones tiene ya en vuelo/en cola.
+  - Si la cola está llena (o se espera más de `queue_timeout_seconds`) se
+    lanza QueueFull, que la API traduce a HTTP 429.
+  - Métricas de tiempo en cola.
+"""
+
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from .config import SchedulerConfig, DEFAULT_SCHEDULER_CONFIG
+
+# Prioridades (menor = antes)
+PRIORITY_ROUTER = 0
+PRIORITY_FAQ = 1
+PRIORITY_GENERATION = 2
+PRIORITY_BACKGROUND = 3
+
+
+class QueueFull(RuntimeError):
+    """No hay sitio en la cola del LLM (o se agotó la espera)."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def current_session() -> str:
+    """
+    thread_id de la ejecución de LangGraph en curso (lo propaga LangChain en
+    el contexto del Runnable); "background" fuera de una ejecución del grafo.
+    """
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    config = var_child_runnable_config.get() or {}
+    thread_id = config.get("configurable", {}).get("thread_id") or config.get("metadata", {}).get("thread_id")
+    return str(thread_id) if thread_id else "background"
+
+
+class LLMScheduler:
+    def __init__(self, config: SchedulerConfig = DEFAULT_SCHEDULER_CONFIG):
+        self.config = config
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._load: Dict[str, int] = defaultdict(int)  # peticiones en cola + en vuelo por sesión
+        self._waits = deque(maxlen=1000)                 # últimos tiempos en cola (ms)
+        self._async_waiters: Dict[int, tuple] = {}       # seq del ticket -> (loop, future, inicio) de aslot
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.by_priority: Dict[int, int] = defaultdict(int)
+
+    def saturated(self) -> bool:
+        """True si una petición nueva sería rechazada (para responder 429 antes de empezar)."""
+        with self._cond:
+            return len(self._heap) >= self.config.max_queue
+
+    def _acquire(self, priority: int, session: str) -> None:
+        start = time.perf_counter()
+        with self._cond:
+            if self._in_flight >= self.config.max_in_flight or self._heap:
+                ticket = self._enqueue(priority, session)
+                deadline = time.monotonic() + self.config.queue_timeout_seconds
+
+                while self._in_flight >= self.config.max_in_flight or self._heap[0] is not ticket:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._leave_queue(ticket, session)
+                        self.timeouts += 1
+                        raise QueueFull("Timed out waiting for the LLM, please retry shortly")
+                    self._cond.wait(remaining)
+                heapq.heappop(self._heap)
+            else:
+                self._load[session] += 1
+
+            self._admit(priority, start)
+            # Puede haber más huecos libres: que el siguiente de la cola lo compruebe
+            self._dispatch()
+
+    async def _aacquire(self, priority: int, session: str) -> None:
+        """
+        Como _acquire, pero la espera es un Future del event loop, no un hilo
+        bloqueado: cientos de peticiones en cola no ocupan el executor de
+        asyncio (que también atiende /health y el streaming).
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._in_flight < self.config.max_in_flight and not self._heap:
+                self._load[session] += 1
+                self._admit(priority, start)
+                return
+            ticket = self._enqueue(priority, session)
+            granted = loop.create_future()
+            self._async_waiters[ticket[2]] = (loop, granted, start)
+
+        # Sin wait_for: en Python < 3.12 puede tragarse una cancelación que
+        # llega justo cuando el hueco se concede
+        timer = loop.call_later(self.config.queue_timeout_seconds, _expire, granted)
+        try:
+            await granted
+        except BaseException as exc:  # cancelación o timeout
+            with self._cond:
+                queued = self._async_waiters.pop(ticket[2], None) is not None
+                if queued:
+                    self._leave_queue(ticket, session)
+                    if isinstance(exc, asyncio.TimeoutError):
+                        self.timeouts += 1
+            if not queued:
+                # _dispatch ya nos había dado el hueco: lo devolvemos
+                self._release(session)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise QueueFull("Timed out waiting for the LLM, please retry shortly") from None
+            raise
+        finally:
+            timer.cancel()
+
+    def _enqueue(self, priority: int, session: str):
+        """Mete una petición en la cola (con el lock tomado) o lanza QueueFull."""
+        if len(self._heap) >= self.config.max_queue:
+            self.rejected += 1
+            raise QueueFull("LLM queue is full, please retry shortly")
+        ticket = (priority, self._load[session], next(self._seq), session)
+        self._load[session] += 1
+        heapq.heappush(self._heap, ticket)
+        return ticket
+
+    def _admit(self, priority: int, start: float) -> None:
+        self._in_flight += 1
+        self.admitted += 1
+        self.by_priority[priority] += 1
+        self._waits.append((time.perf_counter() - start) * 1000)
+
+    def _dispatch(self) -> None:
+        """
+        Con el lock tomado, tras cualquier cambio: los huecos libres se dan a
+        las peticiones async de la cabeza de la cola; si en la cabeza hay un
+        hilo, se despierta y lo toma él.
+        """
+        while self._heap and self._in_flight < self.config.max_in_flight:
+            ticket = self._heap[0]
+            waiter = self._async_waiters.pop(ticket[2], None)
+            if waiter is None:
+                break
+            heapq.heappop(self._heap)
+            loop, granted, start = waiter
+            self._admit(ticket[0], start)
+            try:
+                loop.call_soon_threadsafe(_grant, granted)
+            except RuntimeError:  # el event loop ya se cerró: nadie usará el hueco
+                self._in_flight -= 1
+                self._release_load(ticket[3])
+        self._cond.notify_all()
+
+    def _leave_queue(self, ticket, session: str) -> None:
+        """Saca un ticket que no llegó a entrar (con el lock tomado)."""
+        self._heap.remove(ticket)
+        heapq.heapify(self._heap)
+        self._release_load(session)
+        self._dispatch()
+
+    def _release_load(self, session: str) -> None:
+        self._load[session] -= 1
+        if self._load[session] <= 0:
+            del self._load[session]
+
+    def _release(self, session: str) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._release_load(session)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_GENERATION, session: str = "") -> Iterator[None]:
+        session = session or current_session()
+        self._acquire(priority, session)
+        try:
+            yield
+        finally:
+            self._release(session)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_GENERATION, session: str = ""):
+        # Misma cola y prioridades que slot, sin bloquear ningún hilo mientras
+        # espera; si la tarea se cancela (cliente SSE que se va, lote
+        # cancelado) sale de la cola o devuelve el hueco que ya tenía.
+        session = session or current_session()
+        await self._aacquire(priority, session)
+        try:
+            yield
+        finally:
+            self._release(session)
+
+    def stats(self) -> Dict[str, object]:
+        import numpy as np
+
+        with self._cond:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(self._heap),
+                "max_in_flight": self.config.max_in_flight,
+                "max_queue": self.config.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "by_priority": dict(self.by_priority),
+                "queue_wait_ms": {
+                    "mean": float(waits.mean()),
+                    "p50": float(np.percentile(waits, 50)),
+                    "p95": float(np.percentile(waits, 95)),
+                    "max": float(waits.max()),
+                },
+            }
+
+
+def _grant(granted: "asyncio.Future") -> None:
+    if not granted.done():
+        granted.set_result(None)
+
+
+def _expire(granted: "asyncio.Future") -> None:
+    if not granted.done():
+        granted.set_exception(asyncio.TimeoutError())
+
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> LLMScheduler:
+    """Planificador compartido por todo el proceso."""
+    return LLMScheduler(DEFAULT_SCHEDULER_CONFIG)
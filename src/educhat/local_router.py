@@ -0,0 +1,163 @@
+# src/educhat/local_router.py
+
+"""
+Router local (sin LLM) para decidir entre faq / concept / practice.
+
+Antes cada pregunta pasaba por gemma3:4b solo para obtener una palabra.
+Aquí clasificamos con:
+  1) similitud coseno entre el embedding de la pregunta y un conjunto de
+     preguntas de ejemplo etiquetadas (prototipos), y
+  2) un pequeño refuerzo por palabras clave.
+
+Las puntuaciones por clase pasan por un softmax y la probabilidad de la
+clase ganadora es la confianza. graph.router_node solo llama al router LLM
+cuando la confianza queda por debajo de RouterConfig.confidence_threshold.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+import re
+
+import numpy as np
+
+from .config import RouterConfig, DEFAULT_ROUTER_CONFIG
+from .rag_store import get_embeddings
+
+MODES = ("faq", "concept", "practice")
+
+PROTOTYPES: Dict[str, List[str]] = {
+    "faq": [
+        "When is the midterm exam?",
+        "What is the class schedule?",
+        "What days do we have class?",
+        "Which classroom is the course in?",
+        "How much is the final project worth?",
+        "What percentage of the grade are the quizzes?",
+        "How is the course evaluated?",
+        "What is the weight of the midterm practice exam?",
+        "How many terms does the course have?",
+        "What are the main textbooks of the course?",
+        "What topics are covered in UC1?",
+        "What units does the course have?",
+        "Is attendance mandatory?",
+        "When is the final project due?",
+    ],
+    "concept": [
+        "What is a primary key?",
+        "Explain the relational model.",
+        "What is the difference between DDL and DML?",
+        "How does an inner join work?",
+        "What is normalization in databases?",
+        "Explain referential integrity with an example.",
+        "What is a foreign key?",
+        "What is a DBMS?",
+        "How do stored procedures work?",
+        "What is the difference between SQL and NoSQL databases?",
+        "Explain the three-level DBMS architecture.",
+        "What is data independence?",
+        "How do I design an entity relationship diagram?",
+        "What is a REST API for a database?",
+    ],
+    "practice": [
+        "Give me 3 practice questions about joins.",
+        "Quiz me on normalization.",
+        "Can you give me some exercises about SQL SELECT?",
+        "Create a multiple choice question about primary keys.",
+        "I want to practice aggregation queries.",
+        "Give me a practice problem on ER diagrams.",
+        "Test me on MongoDB.",
+        "Make a short quiz about Flask and SQLAlchemy.",
+        "Generate exercises to prepare for the midterm.",
+        "Give me quiz-style questions about UC2.",
+        "Ask me questions about Docker and MySQL.",
+        "Write an exercise where I have to write a SQL query.",
+    ],
+}
+
+# Palabras clave -> modo. Cada coincidencia suma KEYWORD_BONUS a la similitud de ese modo.
+KEYWORDS: Dict[str, List[str]] = {
+    "faq": [
+        r"\bschedule\b", r"\bclassroom\b", r"\bgrad(e|es|ing)\b", r"\bweight\b",
+        r"\bpercent(age)?\b", r"%", r"\bdeadline\b", r"\bdue\b", r"\bwhen is\b",
+        r"\bmidterm\b", r"\bevaluat(ed|ion)\b", r"\bbibliography\b", r"\btextbooks?\b",
+        r"\bmonday\b", r"\bwednesday\b",
+    ],
+    "concept": [
+        r"\bexplain\b", r"\bwhat is\b", r"\bwhat are\b", r"\bdifference\b",
+        r"\bhow does\b", r"\bhow do\b", r"\bdefine\b", r"\bmeaning\b",
+    ],
+    "practice": [
+        r"\bpractice\b", r"\bexercises?\b", r"\bquiz\b", r"\btest me\b",
+        r"\bquiz me\b", r"\bproblems?\b", r"\bmultiple choice\b", r"\bgive me \d+\b",
+    ],
+}
+KEYWORD_BONUS = 0.04
+
+
+@dataclass
+class RouteDecision:
+    mode: str
+    confidence: float
+    scores: Dict[str, float]
+    source: str = "local"  # "local" o "llm"
+
+
+class LocalRouter:
+    def __init__(self, config: RouterConfig = DEFAULT_ROUTER_CONFIG, embeddings=None):
+        self.config = config
+        self._embeddings = embeddings
+        self._labels: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._keywords = {
+            mode: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for mode, patterns in KEYWORDS.items()
+        }
+
+    def _prototypes(self) -> np.ndarray:
+        if self._matrix is None:
+            embeddings = self._embeddings or get_embeddings()
+            labels, texts = [], []
+            for mode in MODES:
+                for text in PROTOTYPES[mode]:
+                    labels.append(mode)
+                    texts.append(text)
+            matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._labels, self._matrix = labels, matrix
+        return self._matrix
+
+    def classify(self, query: str, vector=None) -> RouteDecision:
+        """
+        Clasifica una pregunta. Se puede pasar el embedding ya calculado
+        (p.ej. el de la caché de respuestas) para no calcularlo dos veces.
+        """
+        matrix = self._prototypes()
+        if vector is None:
+            embeddings = self._embeddings or get_embeddings()
+            vector = embeddings.embed_query(query)
+        v = np.asarray(vector, dtype=np.float32)
+        v = v / (np.linalg.norm(v) or 1.0)
+
+        sims = matrix @ v
+        raw = {}
+        for mode in MODES:
+            mode_sims = np.sort(sims[[i for i, l in enumerate(self._labels) if l == mode]])[::-1]
+            # media de los 3 prototipos más cercanos: más estable que el máximo
+            raw[mode] = float(mode_sims[:3].mean())
+            raw[mode] += KEYWORD_BONUS * sum(1 for p in self._keywords[mode] if p.search(query))
+
+        logits = np.array([raw[m] for m in MODES]) / self.config.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return RouteDecision(
+            mode=MODES[best],
+            confidence=float(probs[best]),
+            scores={m: round(raw[m], 4) for m in MODES},
+        )
+
+
+@lru_cache(maxsize=1)
+def get_local_router() -> LocalRouter:
+    return LocalRouter(DEFAULT_ROUTER_CONFIG)
@@ -0,0 +1,235 @@
+# src/educhat/log_writer.py
+
+"""
+Logs JSONL escritos en segundo plano (interacciones, spans, fallos de FAQ).
+
+Antes cli.py hacía os.makedirs + open + write en cada turno y volcaba el
+estado completo del grafo (contexto recuperado, historial, borrador y JSON),
+así que cada línea crecía con la sesión; la API no registraba nada. Ahora:
+
+  - write() solo encola el registro (put_nowait): si la cola está llena el
+    registro se descarta y se cuenta, la petición nunca espera al disco.
+  - Un hilo escritor agrupa hasta `batch_size` registros o espera como mucho
+    `flush_interval_seconds`, y escribe cada grupo de una vez.
+  - Cada fichero rota por tamaño (`max_bytes`) o antigüedad (`max_age_seconds`);
+    los rotados se comprimen con gzip y se conservan `keep_rotated`.
+  - Las interacciones solo guardan los campos de LoggingConfig.fields: en
+    lugar del contexto completo, su hash y los ids de los chunks.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from .config import LoggingConfig, DEFAULT_LOGGING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+INTERACTIONS_FILE = "interactions.jsonl"
+
+_STOP = object()
+
+
+class _LogFile:
+    """Un fichero JSONL abierto, con su rotación."""
+
+    def __init__(self, path: str, config: LoggingConfig):
+        self.path = path
+        self.config = config
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._open()
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab")
+        self.size = self._file.tell()
+        self.opened = time.time()
+
+    def write(self, data: bytes) -> bool:
+        """Escribe `data`; devuelve True si antes hubo que rotar."""
+        rotated = False
+        too_big = self.size + len(data) > self.config.max_bytes
+        too_old = time.time() - self.opened > self.config.max_age_seconds
+        if self.size and (too_big or too_old):
+            self.rotate()
+            rotated = True
+        self._file.write(data)
+        self._file.flush()
+        self.size += len(data)
+        return rotated
+
+    def rotate(self) -> None:
+        self._file.close()
+        base, ext = os.path.splitext(self.path)
+        target = f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+        os.replace(self.path, target)
+        if self.config.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+
+        # El nombre lleva la fecha: el orden alfabético es el cronológico
+        rotated = sorted(glob.glob(f"{glob.escape(base)}-*{ext}*"))
+        for old in rotated[: max(0, len(rotated) - self.config.keep_rotated)]:
+            os.remove(old)
+        self._open()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class LogWriter:
+    def __init__(self, config: LoggingConfig = DEFAULT_LOGGING_CONFIG):
+        self.config = config
+        self._queue: "queue.Queue" = queue.Queue(maxsize=config.max_queue)
+        self._files: Dict[str, _LogFile] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="educhat-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------- productores (hilos de las peticiones) -------- #
+
+    def write(self, path: str, record: Dict[str, Any]) -> bool:
+        """Encola un registro para `path` sin bloquear; False si se descartó."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((path, record))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def log_interaction(
+        self,
+        source: str,
+        session_id: str,
+        state: Dict[str, Any],
+        elapsed_ms: Optional[float] = None,
+    ) -> bool:
+        """Registra un turno (cli / api) en <dir>/interactions.jsonl."""
+        if not self.config.enabled:
+            return False
+        record = interaction_record(source, session_id, state, self.config.fields, elapsed_ms)
+        return self.write(os.path.join(self.config.dir, INTERACTIONS_FILE), record)
+
+    # -------- hilo escritor -------- #
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[Tuple[str, Dict[str, Any]]] = []
+            deadline = time.monotonic() + self.config.flush_interval_seconds
+            while len(batch) < self.config.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                self._flush(batch)
+        for log_file in self._files.values():
+            log_file.close()
+
+    def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        # Un write por fichero y grupo, en el orden de llegada
+        lines: Dict[str, List[str]] = {}
+        for path, record in batch:
+            lines.setdefault(path, []).append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        for path, group in lines.items():
+            try:
+                log_file = self._files.get(path)
+                if log_file is None:
+                    log_file = self._files[path] = _LogFile(path, self.config)
+                rotated = log_file.write("".join(group).encode("utf-8"))
+                with self._lock:
+                    self.written += len(group)
+                    self.rotations += rotated
+            except OSError as exc:
+                logger.warning("Could not write %d log records to %s: %s", len(group), path, exc)
+                self._files.pop(path, None)  # se vuelve a abrir en el siguiente grupo
+                with self._lock:
+                    self.errors += len(group)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Escribe lo pendiente y para el hilo (se llama también al salir del proceso)."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Log queue still full on shutdown, pending records are lost")
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "rotations": self.rotations,
+                "errors": self.errors,
+            }
+
+
+def interaction_record(
+    source: str,
+    session_id: str,
+    state: Dict[str, Any],
+    fields: Tuple[str, ...],
+    elapsed_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Registro de un turno con solo los campos pedidos (ver LoggingConfig.fields)."""
+    record: Dict[str, Any] = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "source": source,
+        "session_id": session_id,
+    }
+    # El contexto del estado puede ser de un turno anterior (faq o acierto de caché)
+    retrieved = not state.get("cache_hit") and state.get("mode") in ("concept", "practice")
+    context = state.get("retrieved_context") if retrieved else None
+    for name in fields:
+        if name == "context_hash":
+            record[name] = hashlib.sha1(context.encode("utf-8")).hexdigest()[:16] if context else None
+        elif name == "chunk_ids":
+            record[name] = state.get("retrieved_ids") if retrieved else None
+        elif name == "retrieved_context":
+            record[name] = context
+        elif name == "trace":
+            from .telemetry import get_telemetry
+
+            record[name] = get_telemetry().last_request(session_id)
+        else:
+            record[name] = state.get(name)
+    if elapsed_ms is not None:
+        record["elapsed_ms"] = round(elapsed_ms, 1)
+    return record
+
+
+@lru_cache(maxsize=1)
+def get_log_writer() -> LogWriter:
+    """Escritor compartido por todo el proceso (cli, api, telemetría, FAQ)."""
+    return LogWriter(DEFAULT_LOGGING_CONFIG)
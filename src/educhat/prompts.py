@@ -1,33 +1,20 @@
-from langchain_core.prompts import PromptTemplate
-
-# Router: decide between faq / concept / practice
-router_prompt = PromptTemplate(
-    input_variables=["user_input"],
-    template="""
-You are a router for EduChatAgent, a teaching assistant for the Databases course at Yachay Tech.
-
-Based ONLY on the user question, choose the most appropriate mode:
-- "faq"      -> questions about course logistics (schedule, grading, exams, deadlines, policies).
-- "concept"  -> questions asking to explain database concepts, theory, or how something works.
-- "practice" -> questions asking for exercises, quiz-style questions, or practice problems.
-
-Return EXACTLY one word: faq, concept, or practice.
-
-User question: {user_input}
+from typing import Dict, List, Tuple
 
-Mode:
-""".strip(),
-)
+from langchain_core.prompts import PromptTemplate
 
-# FAQ prompt (logistics, schedule, evaluation – sin RAG)
-faq_prompt = PromptTemplate(
-    input_variables=["user_input", "history"],
-    template="""
-You are EduChatAgent, a helpful teaching assistant for the Databases course at Yachay Tech.
+# Cada prompt es un PREFIJO fijo (persona, datos del curso, instrucciones y
+# formato de salida) seguido del SUFIJO variable (historial, contexto
+# recuperado y pregunta, de más estable a menos). Así el texto inicial es
+# idéntico en todas las llamadas y Ollama reutiliza su caché KV para ese
+# prefijo (ver LLMConfig.keep_alive / num_ctx): solo hay que procesar el sufijo.
+# Nada que cambie entre peticiones debe ir en el prefijo; los datos del curso
+# ({course_name}, {course_info}, ver courses.py) sí, porque son fijos por curso.
 
-This assistant is ONLY for the DATABASES course.
+COURSE_HEADER = "You are EduChatAgent, a teaching assistant for the {course_name} course at Yachay Tech.\n\n"
 
-Course contents:
+# Datos del curso por defecto (Databases) para faq_prompt; los demás cursos
+# los leen de sus documentos (courses.course_info)
+DATABASES_COURSE_INFO = """Course contents:
 - UC1: Fundamentals and Database Design (introduction to databases, relational model, conceptual/logical/physical modeling).
 - UC2: Structured Query Language (DDL, DML, SELECT, WHERE, joins, aggregation, functions, stored procedures, permissions, backup/restore).
 - UC3: Development of APIs for Database Operations.
@@ -48,84 +35,180 @@ Official evaluation scheme:
   - Quizzes: 7.5%
   - Project advances: 10%
   - Assignments: 7.5%
-  - Final project: 25%
+  - Final project: 25%"""
+
+
+def _layout(prefix: str, suffix: str, input_variables: List[str]) -> PromptTemplate:
+    return PromptTemplate(input_variables=input_variables, template=(prefix + suffix).strip())
+
+
+# Router: decide between faq / concept / practice
+ROUTER_PREFIX = """
+You are a router for EduChatAgent, a teaching assistant for the courses at Yachay Tech.
+
+Based ONLY on the user question, choose the most appropriate mode:
+- "faq"      -> questions about course logistics (schedule, grading, exams, deadlines, policies).
+- "concept"  -> questions asking to explain course concepts, theory, or how something works.
+- "practice" -> questions asking for exercises, quiz-style questions, or practice problems.
+
+Return EXACTLY one word: faq, concept, or practice.
+
+"""
+
+ROUTER_SUFFIX = """User question: {user_input}
+
+Mode:
+"""
+
+router_prompt = _layout(ROUTER_PREFIX, ROUTER_SUFFIX, ["user_input"])
+
+# FAQ prompt (logistics, schedule, evaluation – sin RAG)
+FAQ_PREFIX = COURSE_HEADER + """This assistant is ONLY for the {course_name} course.
+
+{course_info}
 
 When answering questions about schedule, grading, evaluation, exams, or logistics:
 - Use ONLY the information above.
 - Do NOT invent dates, times or percentages.
 - If the information is not specified here, say that it is not specified in the course information you have.
 
-Conversation history (may be empty):
+Give a concise answer in English, explicitly mentioning the schedule or percentages when relevant.
+If the question is not about this course, say that it is outside the scope of the {course_name} course.
+
+"""
+
+FAQ_SUFFIX = """Conversation history (may be empty):
 {history}
 
 Student question:
 {user_input}
 
-Give a concise answer in English, explicitly mentioning the schedule or percentages when relevant.
-If the question is not about this course, say that it is outside the scope of the Databases course.
-""".strip(),
-)
+Answer:
+"""
 
-# Concept explanation prompt with RAG context
-concept_prompt = PromptTemplate(
-    input_variables=["user_input", "history", "retrieved_context"],
-    template="""
-You are EduChatAgent, a teaching assistant for the Databases course at Yachay Tech.
+faq_prompt = _layout(FAQ_PREFIX, FAQ_SUFFIX, ["course_name", "course_info", "user_input", "history"])
 
-You are answering a CONCEPT question. Use ONLY the information in the retrieved course documents below
-to answer. These documents include the official syllabus, unit contents (UC1–UC4), and quiz materials.
+# Concept explanation prompt with RAG context
+CONCEPT_PREFIX = COURSE_HEADER + """You are answering a CONCEPT question. Use ONLY the information in the retrieved course documents
+given below to answer. These documents include the official syllabus, unit contents (UC1–UC4), and quiz materials.
+Each passage starts with a [source · section] label and may contain only the sentences relevant to the question.
 
 If the documents do NOT contain the answer, say: "According to the course documents I have, this is not specified."
 
-Retrieved course documents:
+Explain the answer in English, step by step, using simple language.
+When relevant, include small SQL examples formatted in backticks.
+Do NOT invent information that is not supported by the retrieved documents.
+
+"""
+
+CONCEPT_SUFFIX = """Conversation history (may be empty):
 ```text
-{retrieved_context}
+{history}
 ```
 
-Conversation history (may be empty):
+Retrieved course documents:
 ```text
-{history}
+{retrieved_context}
 ```
 
 Student question:
 {user_input}
 
-Explain the answer in English, step by step, using simple language.
-When relevant, include small SQL examples formatted in backticks.
-Do NOT invent information that is not supported by the retrieved documents.
-""".strip(),
+Answer:
+"""
+
+concept_prompt = _layout(
+    CONCEPT_PREFIX, CONCEPT_SUFFIX, ["course_name", "user_input", "history", "retrieved_context"]
 )
 
 # JSON-format prompt (second step of SequentialChain)
-structured_json_prompt = PromptTemplate(
-    input_variables=["user_input", "draft_answer", "retrieved_context"],
-    template="""
-You are EduChatAgent, an AI tutor for a Databases course.
+STRUCTURED_JSON_PREFIX = """
+You are EduChatAgent, an AI tutor for the {course_name} course.
 
 You are given:
+- The retrieved course documents (each passage starts with a [source · section] label).
 - The student's question.
 - A draft answer written earlier.
-- The retrieved course documents.
 
 Your task is to rewrite the draft answer into a CLEAN JSON object with the following keys:
 - "answer": a clear final answer in plain English.
 - "key_points": a list of short bullet points summarizing the most important ideas.
-- "references": a short list of relevant sections or topics from the course documents (for example "UC1 - Introduction to databases", "Evaluation table - final project 25%").
+- "references": a short list of the course document passages you used, copying their [source · section] labels without the brackets (for example "uc1_content.txt · UC1 - Introduction to databases").
+
+Output ONLY a valid JSON object. Do not include any explanation or text before or after the JSON.
 
 Input data:
 
+"""
+
+STRUCTURED_JSON_SUFFIX = """[Retrieved course documents]
+{retrieved_context}
+
 [Question]
 {user_input}
 
 [Draft answer]
 {draft_answer}
 
-[Retrieved course documents]
-{retrieved_context}
+JSON:
+"""
 
-Now output ONLY a valid JSON object. Do not include any explanation or text before or after the JSON.
-""".strip(),
+structured_json_prompt = _layout(
+    STRUCTURED_JSON_PREFIX,
+    STRUCTURED_JSON_SUFFIX,
+    ["course_name", "user_input", "draft_answer", "retrieved_context"],
 )
 
+# Single-pass concept prompt: RAG + explanation written directly as JSON
+# (replaces concept_prompt + structured_json_prompt when concept_mode="single_pass")
+CONCEPT_JSON_PREFIX = COURSE_HEADER + """You are answering a CONCEPT question. Use ONLY the information in the retrieved course documents
+given below to answer. These documents include the official syllabus, unit contents (UC1–UC4), and quiz materials.
+Each passage starts with a [source · section] label and may contain only the sentences relevant to the question.
+
+If the documents do NOT contain the answer, set "answer" to: "According to the course documents I have, this is not specified."
+
+Output ONLY a valid JSON object with the following keys:
+- "answer": the explanation in English, step by step, using simple language. When relevant, include small SQL examples formatted in backticks.
+- "key_points": a list of short bullet points summarizing the most important ideas.
+- "references": a short list of the course document passages you used, copying their [source · section] labels without the brackets (for example "uc1_content.txt · UC1 - Introduction to databases").
+
+Do NOT invent information that is not supported by the retrieved documents.
+
+"""
+
+concept_json_prompt = _layout(
+    CONCEPT_JSON_PREFIX, CONCEPT_SUFFIX, ["course_name", "user_input", "history", "retrieved_context"]
+)
+
+# Rolling summary of older turns (runs in the background, see session_memory.py)
+# max_words es fijo por proceso (MemoryConfig.summary_max_tokens), así que puede ir en el prefijo.
+SUMMARY_PREFIX = """
+You maintain a short running summary of a tutoring conversation between a student and EduChatAgent
+(a course tutor at Yachay Tech).
+
+Write the updated summary in at most {max_words} words. Keep the topics the student asked about,
+what was already explained, and any preferences the student stated. Output only the summary.
+
+"""
+
+SUMMARY_SUFFIX = """Current summary (may be empty):
+{summary}
+
+Older conversation turns to fold into the summary:
+{turns}
+
+Updated summary:
+"""
+
+summary_prompt = _layout(SUMMARY_PREFIX, SUMMARY_SUFFIX, ["summary", "turns", "max_words"])
+
+# Prefijo y sufijo de los prompts de respuesta (los usa benchmark.py --prefill);
+# el prefijo solo lleva las variables del curso
+PROMPT_LAYOUTS: Dict[str, Tuple[str, str]] = {
+    "faq": (FAQ_PREFIX, FAQ_SUFFIX),
+    "concept": (CONCEPT_PREFIX, CONCEPT_SUFFIX),
+    "concept_json": (CONCEPT_JSON_PREFIX, CONCEPT_SUFFIX),
+}
+
 # Backwards compatibility name (used by some chains)
 persona_prompt = concept_prompt
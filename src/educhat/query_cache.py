@@ -0,0 +1,135 @@
+# src/educhat/query_cache.py
+
+"""
+Caché LRU por consulta: embedding de MiniLM y chunks recuperados.
+
+Calcular el embedding de la consulta es el paso sin LLM más caro en las
+máquinas solo-CPU, y antes se hacía varias veces por petición (caché
+semántica, router y otra vez en course_rag_search) y de nuevo en cada
+pregunta repetida aunque la respuesta cacheada no sirviera. Esta caché:
+
+  - usa como clave la consulta normalizada (minúsculas, espacios colapsados,
+    sin puntuación final);
+  - guarda el embedding (lo comparten response_cache, local_router y
+    retrieval, y no depende del curso) y los ids de los chunks ordenados para
+    cada (curso, top_k), junto con la versión del índice de la que salieron;
+  - no sirve ids de otra versión del índice: cuando build_rag publica una
+    versión nueva de un curso sus ids dejan de valer (y se cuentan como
+    invalidación);
+  - tiene límite de entradas (LRU) y cuenta aciertos/fallos de cada tipo.
+
+batch.py la rellena de antemano con los embeddings y las recuperaciones de
+un lote completo.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+
+from .config import DEFAULT_RETRIEVAL_CONFIG
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold().rstrip("?!.¿¡ ")
+
+
+@dataclass
+class _Entry:
+    vector: Optional[List[float]] = None
+    # (curso, top_k) -> (versión del índice, ids de los chunks)
+    ids: Dict[Tuple[str, int], Tuple[str, List[str]]] = field(default_factory=dict)
+
+
+class QueryCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = {"embedding": 0, "chunks": 0}
+        self.misses = {"embedding": 0, "chunks": 0}
+        self.invalidations = 0
+
+    def _entry(self, query: str, create: bool) -> Optional[_Entry]:
+        """Entrada de la consulta (con el lock tomado)."""
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        elif create and self.max_entries > 0:
+            entry = self._entries[key] = _Entry()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    # -------- embeddings -------- #
+
+    def embedding(self, query: str, embed: Callable[[str], List[float]]) -> List[float]:
+        """Embedding de la consulta; `embed` (p. ej. embed_query) solo se llama si no está."""
+        with self._lock:
+            entry = self._entry(query, create=False)
+            if entry is not None and entry.vector is not None:
+                self.hits["embedding"] += 1
+                return entry.vector
+            self.misses["embedding"] += 1
+        vector = embed(query.strip())
+        self.prime([query], [vector])
+        return vector
+
+    def prime(self, queries: List[str], vectors) -> None:
+        """Guarda embeddings ya calculados en lote (p. ej. por batch.py)."""
+        with self._lock:
+            for query, vector in zip(queries, vectors):
+                entry = self._entry(query, create=True)
+                if entry is not None:
+                    entry.vector = vector
+
+    # -------- chunks recuperados -------- #
+
+    def get_ids(self, query: str, k: int, course_id: str, version: str) -> Optional[List[str]]:
+        """Ids recuperados para `query` en esa versión del índice del curso (o None)."""
+        with self._lock:
+            entry = self._entry(query, create=False)
+            cached = entry.ids.get((course_id, k)) if entry is not None else None
+            if cached is not None and cached[0] != version:
+                del entry.ids[(course_id, k)]
+                self.invalidations += 1
+                cached = None
+            if cached is None:
+                self.misses["chunks"] += 1
+                return None
+            self.hits["chunks"] += 1
+            return cached[1]
+
+    def put_ids(self, query: str, k: int, ids: List[str], course_id: str, version: str) -> None:
+        with self._lock:
+            entry = self._entry(query, create=True)
+            if entry is not None:
+                entry.ids[(course_id, k)] = (version, list(ids))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            out: Dict[str, object] = {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "invalidations": self.invalidations,
+            }
+            for kind in ("embedding", "chunks"):
+                total = self.hits[kind] + self.misses[kind]
+                out[kind] = {
+                    "hits": self.hits[kind],
+                    "misses": self.misses[kind],
+                    "hit_rate": self.hits[kind] / total if total else 0.0,
+                }
+            return out
+
+
+@lru_cache(maxsize=1)
+def get_query_cache() -> QueryCache:
+    """Caché compartida por todos los nodos del grafo (y por batch.py)."""
+    return QueryCache(DEFAULT_RETRIEVAL_CONFIG.query_cache_entries)
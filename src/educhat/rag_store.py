@@ -1,46 +1,459 @@
 # src/educhat/rag_store.py
 
-from typing import List
+from dataclasses import asdict, replace
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import hashlib
+import json
+import logging
 import os
+import shutil
 
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores.faiss import FAISS
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
-EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+from .ann_index import build_ann_index, build_config, write_ann_index
+from .chunking import chunk_text
+from .config import (
+    ChunkConfig,
+    VectorIndexConfig,
+    IngestConfig,
+    DEFAULT_CHUNK_CONFIG,
+    DEFAULT_EMBEDDING_CONFIG,
+    DEFAULT_INGEST_CONFIG,
+    DEFAULT_VECTOR_INDEX_CONFIG,
+)
+from .embeddings import load_embeddings, make_embeddings, resolve_backend
+from .index_format import (
+    FORMAT_VERSION as INDEX_FORMAT_VERSION,
+    WritableSqliteDocstore,
+    has_index,
+    load_index,
+    save_index,
+)
+from .ingest import (
+    DEDUP_FILE,
+    Deduplicator,
+    EmbeddingPipeline,
+    IngestStats,
+    dedup_config,
+    normalize_text,
+)
+from .lexical_index import BM25_FILE, BM25Index, build_from_vectorstore
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL_NAME = DEFAULT_EMBEDDING_CONFIG.model_name
 FAISS_DIR = "data/processed/faiss"
 
+# Publicación atómica: cada build se escribe en su propio subdirectorio
+# FAISS_DIR/<version>/ y el fichero FAISS_DIR/CURRENT apunta al activo.
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+KEEP_VERSIONS = 2  # versiones antiguas que se conservan (una API puede estar cargándolas)
+
+
+def get_embeddings() -> Embeddings:
+    """
+    Modelo de embeddings compartido (se carga una sola vez por proceso): el
+    motor de EmbeddingConfig (torch u ONNX Runtime), ver embeddings.py.
+    """
+    return load_embeddings()
 
-def build_vector_store(texts: List[str], persist_dir: str = FAISS_DIR):
+
+def build_vector_store(texts: List[Union[str, Document]], persist_dir: str = FAISS_DIR):
     """
-    Crea un vector store FAISS a partir de una lista de strings (texts),
-    lo guarda en disco y lo devuelve.
+    Crea un vector store FAISS a partir de una lista de strings o de Documents
+    ya troceados (ver chunking.py), lo guarda en disco y lo devuelve.
     """
-    # Modelo de embeddings de HuggingFace
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+    # Modelo de embeddings de HuggingFace (compartido)
+    embeddings = get_embeddings()
 
-    # Convertimos cada texto en un Document de LangChain
-    docs = [Document(page_content=t) for t in texts if t.strip()]
+    # Convertimos cada texto en un Document de LangChain (los Documents se usan tal cual)
+    docs = [
+        t if isinstance(t, Document) else Document(page_content=t)
+        for t in texts
+        if (t.page_content if isinstance(t, Document) else t).strip()
+    ]
 
     # Creamos el índice FAISS en memoria
     vectordb = FAISS.from_documents(docs, embeddings)
 
-    # Guardamos en disco
-    os.makedirs(persist_dir, exist_ok=True)
-    vectordb.save_local(persist_dir)
+    # Guardamos en disco (formato sin pickle, ver index_format.py)
+    save_index(vectordb, persist_dir)
+    build_from_vectorstore(vectordb).save(os.path.join(persist_dir, BM25_FILE))
+    ann, _ = build_ann_index(vectordb.index)
+    if ann is not None:
+        write_ann_index(ann, persist_dir)
 
     return vectordb
 
 
-def load_vector_store(persist_dir: str = FAISS_DIR):
+def current_index_dir(persist_dir: str = FAISS_DIR) -> str:
     """
-    Carga el vector store FAISS desde disco y lo devuelve.
+    Devuelve el directorio del índice publicado. Si no hay fichero CURRENT
+    (índices construidos antes de los builds incrementales) es el propio persist_dir.
     """
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+    pointer = os.path.join(persist_dir, CURRENT_FILE)
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return os.path.join(persist_dir, version)
+    return persist_dir
 
+
+def current_index_version(persist_dir: str = FAISS_DIR) -> str:
+    """
+    Identificador de la versión publicada del índice ("legacy" si no hay CURRENT).
+    Sirve para invalidar cachés cuando build_rag publica un índice nuevo.
+    """
+    index_dir = current_index_dir(persist_dir)
+    if index_dir == persist_dir:
+        return "legacy"
+    return os.path.basename(index_dir)
+
+
+def load_vector_store(persist_dir: str = FAISS_DIR, writable: bool = False, work_path: Optional[str] = None):
+    """
+    Carga el vector store publicado y lo devuelve.
+
+    Por defecto los vectores se abren por mmap y los chunks se leen bajo
+    demanda (ver index_format.py); writable=True carga los vectores en
+    memoria para modificarlos (y los chunks en una copia SQLite en
+    work_path, si se da). Los índices antiguos (index.pkl) se siguen pudiendo
+    abrir, pero hay que reconstruirlos con build_rag para dejar de usar pickle.
+    """
+    embeddings = get_embeddings()
+    index_dir = current_index_dir(persist_dir)
+
+    if has_index(index_dir):
+        return load_index(index_dir, embeddings, writable=writable, work_path=work_path)
+
+    logger.warning("Loading legacy pickled index in %s; run build_rag to convert it", index_dir)
     vectordb = FAISS.load_local(
-        persist_dir,
+        index_dir,
         embeddings,
         allow_dangerous_deserialization=True,  # hace falta en versiones nuevas
     )
     return vectordb
+
+
+def load_lexical_index(vectordb, persist_dir: str = FAISS_DIR) -> BM25Index:
+    """
+    Carga el índice BM25 publicado junto al índice FAISS. Los índices
+    construidos antes de la búsqueda híbrida no lo tienen: se construye en
+    memoria a partir del docstore.
+    """
+    path = os.path.join(current_index_dir(persist_dir), BM25_FILE)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    return build_from_vectorstore(vectordb)
+
+
+# ---------------------------------------------------------------------------
+# Builds incrementales
+# ---------------------------------------------------------------------------
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(doc: Document) -> str:
+    """Id estable de un chunk: hash de su fichero de origen + contenido."""
+    return _sha256(doc.metadata.get("source", "") + "\0" + doc.page_content)[:32]
+
+
+def load_manifest(persist_dir: str = FAISS_DIR) -> Optional[dict]:
+    path = os.path.join(current_index_dir(persist_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _publish(
+    vectordb,
+    manifest: dict,
+    persist_dir: str,
+    index_config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+    dedup: Optional[Deduplicator] = None,
+) -> str:
+    """
+    Escribe el índice en un subdirectorio nuevo y cambia CURRENT con os.replace,
+    que es atómico: un proceso que carga el índice ve la versión vieja o la
+    nueva, nunca una a medio escribir. El índice ANN (ver ann_index.py) se
+    construye aquí, a partir de los vectores del índice plano ya actualizado.
+    """
+    version = manifest["version"]
+    tmp_dir = os.path.join(persist_dir, f".{version}.tmp")
+    final_dir = os.path.join(persist_dir, version)
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    save_index(vectordb, tmp_dir)
+    build_from_vectorstore(vectordb).save(os.path.join(tmp_dir, BM25_FILE))
+    ann, manifest["vector_index"] = build_ann_index(vectordb.index, index_config)
+    if ann is not None:
+        write_ann_index(ann, tmp_dir)
+    if dedup is not None:
+        dedup.save(os.path.join(tmp_dir, DEDUP_FILE), set(vectordb.index_to_docstore_id.values()))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_dir, final_dir)
+
+    pointer_tmp = os.path.join(persist_dir, CURRENT_FILE + ".tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(persist_dir, CURRENT_FILE))
+
+    _prune_versions(persist_dir, keep=version)
+    return version
+
+
+def _prune_versions(persist_dir: str, keep: str) -> None:
+    versions = sorted(
+        name for name in os.listdir(persist_dir)
+        if name.startswith("v") and os.path.isdir(os.path.join(persist_dir, name))
+    )
+    old = [v for v in versions if v != keep]
+    for name in old[: max(0, len(old) - KEEP_VERSIONS)]:
+        shutil.rmtree(os.path.join(persist_dir, name), ignore_errors=True)
+
+
+def update_vector_store(
+    sources: Iterable[Tuple[str, str]],
+    persist_dir: str = FAISS_DIR,
+    chunk_config: ChunkConfig = DEFAULT_CHUNK_CONFIG,
+    force: bool = False,
+    index_config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+    ingest_config: IngestConfig = DEFAULT_INGEST_CONFIG,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+) -> Dict[str, object]:
+    """
+    Reconstruye el índice de forma incremental a partir de (source, texto).
+
+    Un manifest guarda el hash de cada fichero y de cada chunk. Solo se
+    trocean los ficheros que cambiaron, solo se calculan embeddings de los
+    chunks nuevos y se borran los vectores de los chunks que desaparecieron.
+    Si el modelo o el motor de embeddings, la configuración de chunking o la
+    de deduplicación cambian (o con force=True) se reconstruye todo. Si solo
+    cambia la configuración del índice ANN se publica una versión nueva con
+    los mismos vectores.
+
+    Los chunks descartados por duplicados quedan anotados (duplicate_of) con
+    el chunk original: si el fichero del original cambia o se borra, el
+    fichero del duplicado se vuelve a trocear y su contenido no se pierde.
+
+    `sources` se recorre dos veces (hashes y troceado) y no se guarda: con
+    data_loader.TxtSources solo hay un fichero en memoria. Los chunks se
+    normalizan y deduplican y sus embeddings se calculan por lotes acotados
+    que se añaden al índice a medida que salen (ver ingest.py); `progress`
+    recibe IngestStats tras cada lote.
+
+    Devuelve un resumen: version, added, removed, unchanged, files_changed,
+    duplicates, vector_index (tipo de índice ANN publicado, ver
+    ann_index.py), published (False si el índice ya estaba al día) e ingest
+    (IngestStats: throughput y pico de memoria).
+    """
+    os.makedirs(persist_dir, exist_ok=True)
+    chunk_cfg = asdict(chunk_config)
+    ingest_cfg = dedup_config(ingest_config)
+
+    # Motor que se carga de verdad (torch si falta onnxruntime), no el configurado
+    embed_backend = resolve_backend(DEFAULT_EMBEDDING_CONFIG)
+    manifest = None if force else load_manifest(persist_dir)
+    if manifest and (
+        manifest.get("embed_model") != EMBED_MODEL_NAME
+        or manifest.get("embed_backend", "torch") != embed_backend
+        or manifest.get("chunk_config") != chunk_cfg
+        or manifest.get("index_format") != INDEX_FORMAT_VERSION
+        or manifest.get("ingest") != ingest_cfg
+    ):
+        manifest = None
+    old_files = manifest["files"] if manifest else {}
+    ann_config = build_config(index_config)
+    stats = IngestStats()
+
+    # 1) Primera pasada, solo hashes: qué ficheros cambiaron y cuáles desaparecieron
+    hashes: Dict[str, str] = {}
+    for source, text in sources:
+        stats.files += 1
+        if text.strip():
+            hashes[source] = _sha256(text)
+    files: Dict[str, dict] = {
+        source: old_files[source]
+        for source, file_hash in hashes.items()
+        if source in old_files and old_files[source]["sha256"] == file_hash
+    }
+    changed = set(hashes) - set(files)
+    existing = {cid for entry in old_files.values() for cid in entry["chunks"]}
+    # Un fichero sin cambios cuyos duplicados apuntan a chunks que se van (su
+    # fichero cambió o desapareció) se vuelve a trocear: si no, ese contenido
+    # se perdería del índice. Los manifests sin "duplicate_of" se tratan igual
+    # si el fichero tenía duplicados y se pierde cualquier chunk.
+    lost = {cid for source, entry in old_files.items() if source not in files for cid in entry["chunks"]}
+    rescued = set()
+    if lost:
+        for source, entry in list(files.items()):
+            originals = entry.get("duplicate_of")
+            if (originals is None and entry.get("duplicates")) or lost & set(originals or ()):
+                del files[source]
+                rescued.add(source)
+    changed |= rescued
+
+    if manifest and not changed and set(hashes) == set(old_files) and manifest.get("vector_index_config") == ann_config:
+        return {
+            "version": manifest["version"],
+            "added": 0,
+            "removed": 0,
+            "unchanged": len(existing),
+            "files_changed": 0,
+            "duplicates": sum(entry.get("duplicates", 0) for entry in old_files.values()),
+            "vector_index": manifest.get("vector_index"),
+            "published": False,
+            "ingest": stats.as_dict(),
+        }  # nada que hacer: no se carga ni el modelo de embeddings
+
+    # Deduplicación frente a los chunks que siguen en el índice (los de ficheros sin cambios)
+    dedup = Deduplicator(ingest_config)
+    if manifest:
+        dedup.load(os.path.join(current_index_dir(persist_dir), DEDUP_FILE))
+        for entry in files.values():
+            for cid in entry["chunks"]:
+                dedup.activate(cid)
+
+    work_path = os.path.join(persist_dir, f".build-{os.getpid()}.sqlite3")
+    vectordb = None
+
+    def open_store(dim: Optional[int] = None):
+        nonlocal vectordb
+        if vectordb is None and manifest:
+            vectordb = load_vector_store(persist_dir, writable=True, work_path=work_path)
+        elif vectordb is None and dim is not None:
+            import faiss
+
+            vectordb = FAISS(get_embeddings(), faiss.IndexFlatL2(dim), WritableSqliteDocstore(work_path), {})
+        return vectordb
+
+    def add_batch(docs: List[Document], vectors) -> None:
+        open_store(vectors.shape[1]).add_embeddings(
+            zip([doc.page_content for doc in docs], vectors.tolist()),
+            metadatas=[doc.metadata for doc in docs],
+            ids=[doc.metadata["chunk_id"] for doc in docs],
+        )
+        stats.embedded += len(docs)
+        if progress:
+            progress(stats)
+
+    # 2) Segunda pasada: trocear, normalizar, deduplicar y calcular embeddings por lotes
+    processes = ingest_config.embed_processes
+    # Cada proceso del pool usa su parte de los núcleos
+    worker_config = replace(DEFAULT_EMBEDDING_CONFIG, num_threads=max(1, (os.cpu_count() or 1) // max(1, processes)))
+    pipeline = EmbeddingPipeline(
+        embeddings=None if processes else get_embeddings(),
+        factory=partial(make_embeddings, worker_config),
+        processes=processes,
+        max_pending=ingest_config.max_pending_batches,
+    )
+    seen = set()
+    added = 0
+    try:
+        with pipeline:
+            batch: List[Document] = []
+            # Primero los ficheros que cambiaron y después los que se vuelven a trocear
+            # por sus duplicados, que así se comparan con los chunks ya procesados
+            for todo in (changed - rescued, rescued):
+                if not todo:
+                    continue
+                for source, text in sources:
+                    if source not in todo or not text.strip():
+                        continue
+                    stats.files_changed += 1
+                    stats.bytes += len(text.encode("utf-8"))
+                    ids, duplicates, originals = [], 0, set()
+                    for doc in chunk_text(text, source, chunk_config):
+                        doc.page_content = normalize_text(doc.page_content)
+                        cid = chunk_id(doc)
+                        if not doc.page_content or cid in seen:
+                            continue
+                        seen.add(cid)
+                        stats.chunks += 1
+                        if cid in existing:  # mismo chunk que en la versión anterior: se conserva su vector
+                            dedup.activate(cid)
+                            ids.append(cid)
+                            continue
+                        if ingest_config.dedup == "off":
+                            kind, key, sig = None, dedup.key(doc.page_content), None
+                        else:
+                            kind, original, key, sig = dedup.check(doc.page_content)
+                        if kind:
+                            duplicates += 1
+                            originals.add(original)
+                            if kind == "exact":
+                                stats.exact_duplicates += 1
+                            else:
+                                stats.near_duplicates += 1
+                            continue
+                        dedup.add(cid, key, sig)
+                        doc.metadata["chunk_id"] = cid
+                        ids.append(cid)
+                        batch.append(doc)
+                        added += 1
+                        if len(batch) >= ingest_config.embed_batch:
+                            for done in pipeline.submit(batch):
+                                add_batch(*done)
+                            batch = []
+                    files[source] = {
+                        "sha256": _sha256(text),
+                        "chunks": ids,
+                        "duplicates": duplicates,
+                        "duplicate_of": sorted(originals),
+                    }
+            if batch:
+                for done in pipeline.submit(batch):
+                    add_batch(*done)
+            for done in pipeline.drain():
+                add_batch(*done)
+
+        wanted = {cid for entry in files.values() for cid in entry["chunks"]}
+        if not wanted:
+            raise ValueError("No hay documentos que indexar en las fuentes dadas.")
+        to_remove = sorted(existing - wanted)
+        if to_remove:
+            open_store().delete(to_remove)
+
+        digest = _sha256("\n".join(sorted(wanted)))[:8]
+        version = f"v{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{digest}"
+        new_manifest = {
+            "version": version,
+            "embed_model": EMBED_MODEL_NAME,
+            "embed_backend": embed_backend,
+            "chunk_config": chunk_cfg,
+            "index_format": INDEX_FORMAT_VERSION,
+            "ingest": ingest_cfg,
+            "vector_index_config": ann_config,
+            "files": files,
+        }
+        _publish(open_store(), new_manifest, persist_dir, index_config, dedup)
+    finally:
+        if vectordb is not None and isinstance(vectordb.docstore, WritableSqliteDocstore):
+            vectordb.docstore.close()
+        elif os.path.exists(work_path):
+            os.remove(work_path)
+
+    return {
+        "version": version,
+        "added": added,
+        "removed": len(to_remove),
+        "unchanged": len(wanted & existing),
+        "files_changed": len(changed) + len(set(old_files) - set(hashes)),
+        "duplicates": stats.exact_duplicates + stats.near_duplicates
+        + sum(entry.get("duplicates", 0) for source, entry in files.items() if source not in changed),
+        "vector_index": new_manifest["vector_index"],
+        "published": True,
+        "ingest": stats.as_dict(),
+    }
@@ -0,0 +1,258 @@
+# src/educhat/response_cache.py
+
+"""
+Caché semántica de respuestas.
+
+Los estudiantes repiten mucho las mismas preguntas ("what is a primary key",
+"give me a SQL join exercise"). Después del router y antes de los LLM de
+respuesta buscamos una pregunta ya respondida cuyo embedding (mismo MiniLM
+que rag_store) tenga una similitud coseno >= `similarity_threshold`; si
+existe devolvemos su `final_answer` directamente.
+
+- Cada entrada guarda el curso, el modo (concept/practice) y la versión
+  del índice de ese curso; solo se sirven respuestas del mismo curso y de
+  la misma ruta (graph.cache_node pasa el modo que decidió el router). Las
+  respuestas FAQ no se guardan (ver graph.cache_store_node).
+- Las entradas de otra versión del índice no se sirven: cuando build_rag
+  publica un índice nuevo de un curso, sus entradas se descartan solas.
+- TTL + expulsión LRU con `max_entries`.
+- Opcionalmente se persiste en SQLite (`CacheConfig.path`) para sobrevivir
+  a reinicios.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .config import CacheConfig, DEFAULT_CACHE_CONFIG, DEFAULT_COURSE_CONFIG
+from .courses import get_course
+from .query_cache import get_query_cache
+from .rag_store import current_index_version, get_embeddings
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    vector: np.ndarray  # normalizado (norma 1)
+    answer: str
+    mode: str
+    index_version: str
+    created: float
+    course_id: str = DEFAULT_COURSE_CONFIG.default_course
+
+
+@dataclass
+class CacheHit:
+    answer: str
+    mode: str
+    similarity: float
+    query: str
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class _SQLiteBackend:
+    """Persistencia write-through de las entradas en un fichero SQLite."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                index_version TEXT NOT NULL,
+                created REAL NOT NULL,
+                course_id TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if "course_id" not in columns:
+            # Cachés creadas antes de los cursos múltiples: todo es del curso por defecto
+            self._conn.execute("ALTER TABLE responses ADD COLUMN course_id TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def load(self) -> Dict[int, CacheEntry]:
+        rows = self._conn.execute(
+            "SELECT id, query, vector, answer, mode, index_version, created, course_id "
+            "FROM responses ORDER BY created"
+        )
+        return {
+            row[0]: CacheEntry(
+                query=row[1],
+                vector=np.frombuffer(row[2], dtype=np.float32),
+                answer=row[3],
+                mode=row[4],
+                index_version=row[5],
+                created=row[6],
+                course_id=row[7] or DEFAULT_COURSE_CONFIG.default_course,
+            )
+            for row in rows
+        }
+
+    def insert(self, entry: CacheEntry) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO responses (query, vector, answer, mode, index_version, created, course_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.query, entry.vector.tobytes(), entry.answer, entry.mode,
+             entry.index_version, entry.created, entry.course_id),
+        )
+        self._conn.commit()
+        return cur.lastrowid
+
+    def delete(self, ids: List[int]) -> None:
+        if ids:
+            self._conn.executemany("DELETE FROM responses WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+
+class SemanticCache:
+    def __init__(self, config: CacheConfig = DEFAULT_CACHE_CONFIG, embeddings=None):
+        self.config = config
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 1
+        self._backend = _SQLiteBackend(config.path) if config.path else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self._backend:
+            for entry_id, entry in self._backend.load().items():
+                self._entries[entry_id] = entry
+                self._next_id = max(self._next_id, entry_id + 1)
+
+    # ------------------------------------------------------------------ #
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Embedding normalizado de la consulta. Se guarda en la caché de
+        consultas (query_cache.py), que comparten lookup, put, el router y la recuperación.
+        """
+        embeddings = self._embeddings or get_embeddings()
+        return _normalize(get_query_cache().embedding(query, embeddings.embed_query))
+
+    def _drop(self, ids: List[int]) -> None:
+        for entry_id in ids:
+            self._entries.pop(entry_id, None)
+        if self._backend:
+            self._backend.delete(ids)
+
+    def _purge(self, course_id: str, index_version: str, now: float) -> None:
+        """Quita entradas caducadas o de otra versión del índice del curso."""
+        stale = [
+            i for i, e in self._entries.items()
+            if (e.course_id == course_id and e.index_version != index_version)
+            or now - e.created > self.config.ttl_seconds
+        ]
+        self.expirations += len(stale)
+        self._drop(stale)
+
+    def lookup(
+        self,
+        query: str,
+        mode: Optional[str] = None,
+        index_version: Optional[str] = None,
+        course_id: Optional[str] = None,
+    ) -> Optional[CacheHit]:
+        """
+        Busca una respuesta del curso (None = curso por defecto) para una
+        pregunta parecida. Si se pasa `mode`, solo se consideran entradas de ese modo.
+        """
+        if not self.config.enabled:
+            return None
+        course = get_course(course_id)
+        index_version = index_version or current_index_version(course.index_dir)
+        vector = self.embed(query)
+        now = time.time()
+
+        with self._lock:
+            self._purge(course.id, index_version, now)
+            candidates = [
+                (i, e) for i, e in self._entries.items()
+                if e.course_id == course.id and (mode is None or e.mode == mode)
+            ]
+            if candidates:
+                matrix = np.stack([e.vector for _, e in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.config.similarity_threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return CacheHit(entry.answer, entry.mode, float(scores[best]), entry.query)
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        answer: str,
+        mode: str,
+        index_version: Optional[str] = None,
+        course_id: Optional[str] = None,
+    ) -> None:
+        if not self.config.enabled or not answer.strip():
+            return
+        course = get_course(course_id)
+        entry = CacheEntry(
+            query=query.strip(),
+            vector=self.embed(query),
+            answer=answer,
+            mode=mode,
+            index_version=index_version or current_index_version(course.index_dir),
+            created=time.time(),
+            course_id=course.id,
+        )
+        with self._lock:
+            if self._backend:
+                entry_id = self._backend.insert(entry)
+            else:
+                entry_id = self._next_id
+            self._next_id = max(self._next_id, entry_id) + 1
+            self._entries[entry_id] = entry
+
+            overflow = len(self._entries) - self.config.max_entries
+            if overflow > 0:
+                lru = list(self._entries)[:overflow]
+                self.evictions += len(lru)
+                self._drop(lru)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._drop(list(self._entries))
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> SemanticCache:
+    """Caché compartida por todo el proceso (API / CLI)."""
+    return SemanticCache(DEFAULT_CACHE_CONFIG)
@@ -0,0 +1,342 @@
+# src/educhat/retrieval.py
+
+"""
+Recuperación híbrida para course_rag_search.
+
+Antes solo había similitud FAISS; las preguntas con términos exactos
+("what does DDL stand for", "weight of the final project") a menudo fallaban
+y el estudiante volvía a preguntar. Ahora cada consulta pasa por:
+
+  1. embed   - embedding de la consulta (MiniLM compartido)
+  2. vector  - candidatos de FAISS (vector_k): el índice ANN publicado por
+               build_rag si lo hay (IVF/HNSW/int8/PQ, con rerank exacto
+               opcional, ver ann_index.py) o el índice plano
+  3. bm25    - candidatos del índice léxico BM25 (bm25_k, ver lexical_index.py)
+  4. fuse    - Reciprocal Rank Fusion de ambas listas
+  5. rerank  - opcional: cross-encoder en CPU sobre los primeros candidatos,
+               limitado por un presupuesto de latencia
+
+El embedding y los ids resultantes se guardan en la caché de consultas
+(query_cache.py), por curso y versión del índice: una consulta repetida solo
+lee sus chunks del docstore (etapa "cache").
+
+Se mide el tiempo de cada etapa; RetrievalResult.timings_ms lo devuelve por
+consulta y HybridRetriever.stats() agrega media/p95.
+"""
+
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from .ann_index import AnnSearcher, load_ann_searcher
+from .config import (
+    RetrievalConfig,
+    VectorIndexConfig,
+    DEFAULT_COURSE_CONFIG,
+    DEFAULT_RETRIEVAL_CONFIG,
+    DEFAULT_VECTOR_INDEX_CONFIG,
+)
+from .query_cache import QueryCache, get_query_cache
+from .rag_store import (
+    FAISS_DIR,
+    current_index_dir,
+    current_index_version,
+    get_embeddings,
+    load_lexical_index,
+    load_vector_store,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("cache", "embed", "vector", "bm25", "fuse", "rerank", "total")
+
+
+@dataclass
+class RetrievalResult:
+    docs: List[Document]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    reranked: int = 0  # candidatos que llegó a puntuar el cross-encoder
+    cached: bool = False  # ids sacados de la caché de consultas
+
+
+def _doc_key(doc: Document) -> str:
+    return getattr(doc, "id", None) or doc.metadata.get("chunk_id") or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """RRF: score(d) = sum(1 / (k + rank)) sobre las listas donde aparece d."""
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder de sentence-transformers en CPU. Para respetar el
+    presupuesto de latencia se estima el coste por par con una media móvil
+    y solo se puntúan los candidatos que caben; el resto conserva el orden RRF.
+    """
+
+    def __init__(self, model_name: str, budget_ms: float):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.budget_ms = budget_ms
+        self._ms_per_pair: Optional[float] = None
+
+    def rerank(self, query: str, docs: List[Document]) -> Tuple[List[Document], int]:
+        n = len(docs)
+        if self._ms_per_pair:
+            n = min(n, int(self.budget_ms // self._ms_per_pair))
+        if n < 2:
+            return docs, 0
+
+        t0 = time.perf_counter()
+        scores = self.model.predict([(query, d.page_content) for d in docs[:n]])
+        per_pair = (time.perf_counter() - t0) * 1000 / n
+        self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+
+        order = sorted(range(n), key=lambda i: float(scores[i]), reverse=True)
+        return [docs[i] for i in order] + docs[n:], n
+
+
+@lru_cache(maxsize=4)
+def get_reranker(model_name: str, budget_ms: float) -> Optional[CrossEncoderReranker]:
+    """Carga el cross-encoder una vez; None si no se puede cargar (se sigue sin reranking)."""
+    try:
+        return CrossEncoderReranker(model_name, budget_ms)
+    except Exception as exc:
+        logger.warning("Could not load reranker %s, continuing without it: %s", model_name, exc)
+        return None
+
+
+class HybridRetriever:
+    def __init__(
+        self,
+        vectordb,
+        bm25,
+        config: RetrievalConfig = DEFAULT_RETRIEVAL_CONFIG,
+        cache: Optional[QueryCache] = None,
+        course_id: str = DEFAULT_COURSE_CONFIG.default_course,
+        index_version: str = "",
+        ann: Optional[AnnSearcher] = None,
+    ):
+        self.vectordb = vectordb
+        self.bm25 = bm25
+        self.ann = ann  # None = búsqueda exacta en el índice plano
+        self.config = config
+        self.cache = cache or get_query_cache()
+        # Los ids de la caché de consultas son de este curso y esta versión del índice
+        self.course_id = course_id
+        self.index_version = index_version
+        self.reranker = (
+            get_reranker(config.reranker_model, config.rerank_budget_ms) if config.reranker_model else None
+        )
+        self._lock = threading.Lock()
+        self._timings: Dict[str, deque] = {stage: deque(maxlen=1000) for stage in STAGES}
+        self.queries = 0
+
+    def _bm25_docs(self, query: str) -> List[Document]:
+        docs = []
+        for doc_id, _ in self.bm25.search(query, self.config.bm25_k):
+            doc = self.vectordb.docstore.search(doc_id)
+            if isinstance(doc, Document):  # el docstore devuelve un str si el id no existe
+                docs.append(doc)
+        return docs
+
+    def _cached(self, query: str, k: int) -> Optional[RetrievalResult]:
+        """Resultado a partir de los ids de la caché de consultas (o None)."""
+        start = time.perf_counter()
+        ids = self.cache.get_ids(query, k, self.course_id, self.index_version)
+        if ids is None:
+            return None
+        docs = [doc for doc in map(self.vectordb.docstore.search, ids) if isinstance(doc, Document)]
+        ms = (time.perf_counter() - start) * 1000
+        timings = {"cache": ms, "total": ms}
+        self._record(timings)
+        return RetrievalResult(docs=docs, timings_ms=timings, cached=True)
+
+    def retrieve(self, query: str, k: Optional[int] = None) -> RetrievalResult:
+        k = k or self.config.top_k
+        cached = self._cached(query, k)
+        if cached is not None:
+            return cached
+
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        # El router ya suele haber calculado este embedding (caché semántica)
+        vector = self.cache.embedding(query, get_embeddings().embed_query)
+        timings["embed"] = (time.perf_counter() - start) * 1000
+        t0 = time.perf_counter()
+        vector_docs = self._vector_search([vector])[0]
+        timings["vector"] = (time.perf_counter() - t0) * 1000
+
+        return self._fuse(query, vector_docs, timings, k)
+
+    def _vector_search(self, vectors) -> List[List[Document]]:
+        """Candidatos vectoriales (vector_k) de cada vector, con el ANN si lo hay."""
+        import numpy as np
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if getattr(self.vectordb, "_normalize_L2", False):
+            import faiss
+
+            faiss.normalize_L2(matrix)
+        search = self.ann.search if self.ann is not None else self.vectordb.index.search
+        _, positions = search(matrix, self.config.vector_k)
+
+        results = []
+        for row in positions:
+            docs = []
+            for pos in row:
+                if pos < 0:  # FAISS rellena con -1 si hay menos de vector_k vectores
+                    continue
+                doc = self.vectordb.docstore.search(self.vectordb.index_to_docstore_id[int(pos)])
+                if isinstance(doc, Document):
+                    docs.append(doc)
+            results.append(docs)
+        return results
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        vectors: Optional[List[List[float]]] = None,
+        k: Optional[int] = None,
+    ) -> List[RetrievalResult]:
+        """
+        Igual que retrieve para muchas consultas: un único embed_documents (o
+        los `vectors` ya calculados) y una única búsqueda FAISS para las que
+        no están en la caché. Los tiempos de embed/vector se reparten entre ellas.
+        """
+        k = k or self.config.top_k
+        results: List[Optional[RetrievalResult]] = [self._cached(q, k) for q in queries]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        queries = [queries[i] for i in pending]
+
+        start = time.perf_counter()
+        if vectors is None:
+            vectors = get_embeddings().embed_documents(list(queries))
+            self.cache.prime(queries, vectors)
+        else:
+            vectors = [vectors[i] for i in pending]
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        t0 = time.perf_counter()
+        candidates = self._vector_search(vectors)
+        vector_ms = (time.perf_counter() - t0) * 1000
+
+        n = len(queries)
+        for i, query, vector_docs in zip(pending, queries, candidates):
+            timings = {"embed": embed_ms / n, "vector": vector_ms / n}
+            results[i] = self._fuse(query, vector_docs, timings, k)
+        return results
+
+    def _fuse(
+        self,
+        query: str,
+        vector_docs: List[Document],
+        timings: Dict[str, float],
+        k: int,
+    ) -> RetrievalResult:
+        """Etapas bm25 -> fuse -> rerank comunes a retrieve y retrieve_many."""
+        t0 = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal t0
+            now = time.perf_counter()
+            timings[stage] = (now - t0) * 1000
+            t0 = now
+
+        bm25_docs = self._bm25_docs(query)
+        lap("bm25")
+        fused = reciprocal_rank_fusion([vector_docs, bm25_docs], k=self.config.rrf_k)
+        lap("fuse")
+
+        reranked = 0
+        if self.reranker is not None and fused:
+            head, tail = fused[: self.config.rerank_candidates], fused[self.config.rerank_candidates:]
+            head, reranked = self.reranker.rerank(query, head)
+            fused = head + tail
+            lap("rerank")
+
+        # embed/vector ya vienen medidos (o repartidos, en retrieve_many)
+        timings["total"] = sum(timings.values())
+        self._record(timings)
+        logger.debug(
+            "retrieval %s",
+            " ".join(f"{stage}={ms:.1f}ms" for stage, ms in timings.items()),
+        )
+        docs = fused[:k]
+        ids = [doc.id for doc in docs]
+        if all(ids):
+            self.cache.put_ids(query, k, ids, self.course_id, self.index_version)
+        return RetrievalResult(docs=docs, timings_ms=timings, reranked=reranked)
+
+    def invoke(self, query: str) -> List[Document]:
+        """Misma interfaz que un retriever de LangChain."""
+        return self.retrieve(query).docs
+
+    def _record(self, timings: Dict[str, float]) -> None:
+        with self._lock:
+            self.queries += 1
+            for stage, ms in timings.items():
+                self._timings[stage].append(ms)
+
+    def stats(self) -> Dict[str, object]:
+        import numpy as np
+
+        # Micro-batching de consultas (solo si el motor lo tiene, ver embeddings.py)
+        embedding_stats = getattr(get_embeddings(), "stats", None)
+        with self._lock:
+            stages = {}
+            for stage, values in self._timings.items():
+                if not values:
+                    continue
+                arr = np.array(values)
+                stages[stage] = {
+                    "mean": float(arr.mean()),
+                    "p50": float(np.percentile(arr, 50)),
+                    "p95": float(np.percentile(arr, 95)),
+                }
+            return {
+                "course_id": self.course_id,
+                "index_version": self.index_version,
+                "queries": self.queries,
+                "bm25_docs": len(self.bm25),
+                "vector_index": self.ann.describe() if self.ann is not None else {"kind": "flat"},
+                "reranker": self.config.reranker_model if self.reranker else None,
+                "stage_ms": stages,
+                "query_cache": self.cache.stats(),
+                "embeddings": embedding_stats() if callable(embedding_stats) else None,
+            }
+
+
+def load_hybrid_retriever(
+    config: RetrievalConfig = DEFAULT_RETRIEVAL_CONFIG,
+    persist_dir: str = FAISS_DIR,
+    course_id: str = DEFAULT_COURSE_CONFIG.default_course,
+    index_config: VectorIndexConfig = DEFAULT_VECTOR_INDEX_CONFIG,
+) -> HybridRetriever:
+    version = current_index_version(persist_dir)
+    vectordb = load_vector_store(persist_dir)
+    return HybridRetriever(
+        vectordb,
+        load_lexical_index(vectordb, persist_dir),
+        config,
+        course_id=course_id,
+        index_version=version,
+        ann=load_ann_searcher(current_index_dir(persist_dir), vectordb.index, index_config),
+    )
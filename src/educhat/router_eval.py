@@ -0,0 +1,132 @@
+# src/educhat/router_eval.py
+
+"""
+Informe offline del router: precisión y latencia del clasificador local
+(local_router.py) frente al router LLM (build_router_chain).
+
+Uso (desde src/):
+    python -m educhat.router_eval          # solo el clasificador local
+    python -m educhat.router_eval --llm    # compara también con gemma3:4b (requiere Ollama)
+
+Guarda el resultado en logs/eval/router_report.json.
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .chains import build_router_chain
+from .config import DEFAULT_CONFIG_LOW_TEMP, DEFAULT_ROUTER_CONFIG
+from .llm_factory import make_hf_llm
+from .local_router import MODES, get_local_router
+
+# Preguntas etiquetadas a mano, distintas de los prototipos del router
+EVAL_SET: List[Tuple[str, str]] = [
+    ("What time does the Monday class start?", "faq"),
+    ("How much do the assignments count in the first term?", "faq"),
+    ("Where are the lectures held?", "faq"),
+    ("Is the final project 25% of the grade?", "faq"),
+    ("What is the weight of the quizzes in the second term?", "faq"),
+    ("How many points is the midterm theory exam?", "faq"),
+    ("Which books should I read for this course?", "faq"),
+    ("What does UC3 cover?", "faq"),
+    ("What does DDL stand for?", "concept"),
+    ("Can you explain what a left join returns?", "concept"),
+    ("Why do we normalize tables?", "concept"),
+    ("What is the conceptual level of a DBMS?", "concept"),
+    ("How is a document database different from a relational one?", "concept"),
+    ("What are permissions in SQL?", "concept"),
+    ("Explain what a backup and restore strategy is.", "concept"),
+    ("What is Marshmallow used for in a Flask API?", "concept"),
+    ("Give me five questions to review foreign keys.", "practice"),
+    ("I need exercises on GROUP BY.", "practice"),
+    ("Quiz me about NoSQL databases.", "practice"),
+    ("Prepare a practice test on the relational model.", "practice"),
+    ("Can you ask me multiple choice questions about Docker Compose?", "practice"),
+    ("Give me a SQL problem to solve with a right join.", "practice"),
+    ("Let's practice stored procedures.", "practice"),
+    ("Write two exercises about data independence.", "practice"),
+]
+
+
+def _evaluate(name: str, route: Callable[[str], str]) -> Dict[str, object]:
+    latencies, correct = [], 0
+    confusion = {m: {n: 0 for n in MODES} for m in MODES}
+    errors = []
+    for question, expected in EVAL_SET:
+        t0 = time.perf_counter()
+        predicted = route(question)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        confusion[expected][predicted if predicted in MODES else "concept"] += 1
+        if predicted == expected:
+            correct += 1
+        else:
+            errors.append({"question": question, "expected": expected, "predicted": predicted})
+
+    lat = np.array(latencies)
+    report = {
+        "router": name,
+        "accuracy": correct / len(EVAL_SET),
+        "latency_ms": {
+            "mean": float(lat.mean()),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+        },
+        "confusion": confusion,
+        "errors": errors,
+    }
+    print(
+        f"{name:>8}: accuracy={report['accuracy']:.2%}  "
+        f"mean={report['latency_ms']['mean']:.1f} ms  p95={report['latency_ms']['p95']:.1f} ms"
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline accuracy/latency report for the router")
+    parser.add_argument("--llm", action="store_true", help="also evaluate the LLM router (needs Ollama)")
+    parser.add_argument("--out", default="logs/eval/router_report.json")
+    args = parser.parse_args()
+
+    router = get_local_router()
+    router.classify("warm up")  # carga el modelo de embeddings y los prototipos fuera de la medida
+
+    low_confidence = []
+
+    def local_route(q: str) -> str:
+        decision = router.classify(q)
+        if decision.confidence < DEFAULT_ROUTER_CONFIG.confidence_threshold:
+            low_confidence.append(q)
+        return decision.mode
+
+    reports = [_evaluate("local", local_route)]
+    print(
+        f"          {len(low_confidence)}/{len(EVAL_SET)} below confidence threshold "
+        f"{DEFAULT_ROUTER_CONFIG.confidence_threshold} (would fall back to the LLM)"
+    )
+
+    if args.llm:
+        chain = build_router_chain(make_hf_llm(DEFAULT_CONFIG_LOW_TEMP))
+
+        def llm_route(q: str) -> str:
+            return chain.invoke({"user_input": q}).get("mode", "").strip().lower()
+
+        reports.append(_evaluate("llm", llm_route))
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(
+            {"threshold": DEFAULT_ROUTER_CONFIG.confidence_threshold,
+             "low_confidence": low_confidence,
+             "reports": reports},
+            f, indent=2, ensure_ascii=False,
+        )
+    print(f"Saved report in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
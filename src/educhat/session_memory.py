@@ -0,0 +1,151 @@
+# src/educhat/session_memory.py
+
+"""
+Memoria de conversación por sesión (thread_id) con presupuesto de tokens.
+
+Antes `memory_node` iba concatenando "User:/Agent:" en `state["history"]` sin
+límite y además había un único ConversationBufferMemory compartido por todas
+las sesiones. Ahora cada sesión guarda:
+
+  - `turns`:   ventana deslizante con los últimos turnos (respuestas recortadas).
+  - `summary`: resumen acumulado de los turnos que salieron de la ventana.
+  - `history`: lo que ven los prompts = resumen + ventana, siempre dentro de
+               MemoryConfig.max_history_tokens.
+
+El resumen se compacta con el LLM en un hilo aparte (fuera del camino de la
+petición): el turno actual usa el último resumen disponible y el siguiente
+ya verá el nuevo.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import threading
+
+from .config import MemoryConfig, DEFAULT_MEMORY_CONFIG
+from .prompts import summary_prompt
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # aproximación suficiente para presupuestar prompts
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _answer_text(final_answer: str) -> str:
+    """Para respuestas JSON guardamos solo el campo "answer"."""
+    try:
+        obj = json.loads(final_answer)
+    except (TypeError, ValueError):
+        return final_answer or ""
+    if isinstance(obj, dict) and isinstance(obj.get("answer"), str):
+        return obj["answer"]
+    return final_answer
+
+
+def _render_turns(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"User: {t['user']}\nAgent: {t['agent']}" for t in turns)
+
+
+def render_history(summary: str, turns: List[Dict[str, str]]) -> str:
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation: {summary}")
+    if turns:
+        parts.append(_render_turns(turns))
+    return "\n\n".join(parts)
+
+
+class SessionSummarizer:
+    """
+    Compacta en segundo plano los turnos expulsados de la ventana.
+    Un único hilo de trabajo mantiene el orden de las tareas de cada sesión.
+    """
+
+    def __init__(self, llm=None, config: MemoryConfig = DEFAULT_MEMORY_CONFIG, max_sessions: int = 10000):
+        self.config = config
+        self._chain = (summary_prompt | llm) if llm is not None else None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="educhat-summary")
+        self._lock = threading.Lock()
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._max_sessions = max_sessions
+
+    def get(self, thread_id: str, default: str = "") -> str:
+        with self._lock:
+            if thread_id in self._summaries:
+                self._summaries.move_to_end(thread_id)
+                return self._summaries[thread_id]
+        return default
+
+    def _set(self, thread_id: str, summary: str) -> None:
+        with self._lock:
+            self._summaries[thread_id] = summary
+            self._summaries.move_to_end(thread_id)
+            while len(self._summaries) > self._max_sessions:
+                self._summaries.popitem(last=False)
+
+    def _fallback(self, summary: str, evicted: List[Dict[str, str]]) -> str:
+        asked = "; ".join(t["user"] for t in evicted)
+        merged = f"{summary} The student also asked: {asked}." if summary else f"The student asked: {asked}."
+        return truncate_tokens(merged, self.config.summary_max_tokens)
+
+    def _compact(self, thread_id: str, base_summary: str, evicted: List[Dict[str, str]]) -> None:
+        summary = self.get(thread_id, base_summary)
+        try:
+            if self._chain is None:
+                raise RuntimeError("no summarizer LLM configured")
+            out = self._chain.invoke(
+                {
+                    "summary": summary,
+                    "turns": _render_turns(evicted),
+                    "max_words": int(self.config.summary_max_tokens * 0.75),
+                }
+            )
+            text = getattr(out, "content", out)
+            new_summary = truncate_tokens(str(text).strip(), self.config.summary_max_tokens)
+        except Exception:
+            logger.exception("Summary compaction failed for %s; using extractive fallback", thread_id)
+            new_summary = self._fallback(summary, evicted)
+        self._set(thread_id, new_summary)
+
+    def submit(self, thread_id: str, base_summary: str, evicted: List[Dict[str, str]]) -> None:
+        """Encola la compactación; vuelve inmediatamente."""
+        self._executor.submit(self._compact, thread_id, base_summary, evicted)
+
+
+def update_memory(
+    turns: Optional[List[Dict[str, str]]],
+    summary: str,
+    user_input: str,
+    final_answer: str,
+    config: MemoryConfig = DEFAULT_MEMORY_CONFIG,
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Añade el turno actual a la ventana y expulsa los más antiguos hasta que
+    resumen + ventana quepan en el presupuesto. Devuelve (ventana, expulsados).
+    """
+    turns = list(turns or [])
+    turns.append(
+        {
+            "user": truncate_tokens(user_input, config.max_turn_tokens),
+            "agent": truncate_tokens(_answer_text(final_answer), config.max_turn_tokens),
+        }
+    )
+
+    evicted = []
+    while len(turns) > config.window_turns or (
+        len(turns) > 1 and count_tokens(render_history(summary, turns)) > config.max_history_tokens
+    ):
+        evicted.append(turns.pop(0))
+    return turns, evicted
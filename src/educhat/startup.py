@@ -0,0 +1,96 @@
+# src/educhat/startup.py
+
+"""
+Arranque en caliente de EduChatAgent (API y CLI).
+
+Antes el primer estudiante tras un despliegue pagaba la carga de MiniLM,
+del índice FAISS y del modelo de Ollama. Aquí lo hacemos todo al arrancar,
+por fases y midiendo cuánto tarda cada una:
+
+  1. import_graph     - importar LangChain / LangGraph / transformers
+  2. embeddings       - cargar MiniLM una vez (singleton de rag_store)
+  3. vector_store     - cargar el índice FAISS publicado
+  4. router           - embeddings de los prototipos del router local
+  5. compile_graph    - construir y compilar el grafo
+  6. llm_warmup       - cargar el modelo en Ollama (si falla, queda como aviso)
+
+Los imports pesados se hacen dentro de las fases, así quien importe este
+módulo (p. ej. api.py para /health) no los paga.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StartupReport:
+    phases_ms: Dict[str, float] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    ready: bool = False
+    started_at: float = field(default_factory=time.time)
+    attempt: int = 1                      # la API reintenta el arranque si falla
+    previous_error: Optional[str] = None  # causa del intento anterior
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "phases_ms": {k: round(v, 1) for k, v in self.phases_ms.items()},
+            "total_ms": round(sum(self.phases_ms.values()), 1),
+            "warnings": self.warnings,
+            "error": self.error,
+            "attempt": self.attempt,
+            "previous_error": self.previous_error,
+        }
+
+
+def warm_up(report: Optional[StartupReport] = None, warm_llm: bool = True):
+    """
+    Ejecuta todas las fases y devuelve (graph, report).
+    Los fallos de la fase llm_warmup no impiden arrancar (Ollama puede
+    levantarse después); cualquier otro fallo se propaga.
+    """
+    report = report or StartupReport()
+
+    def phase(name: str, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            report.phases_ms[name] = (time.perf_counter() - t0) * 1000
+            logger.info("startup phase %-14s %8.1f ms", name, report.phases_ms[name])
+
+    try:
+        graph_module = phase("import_graph", lambda: importlib.import_module(".graph", __package__))
+
+        from .rag_store import get_embeddings
+        from .tools import _get_retriever
+        from .local_router import get_local_router
+
+        phase("embeddings", lambda: get_embeddings().embed_query("warm up"))
+        phase("vector_store", _get_retriever)
+        phase("router", lambda: get_local_router().classify("warm up"))
+        graph = phase("compile_graph", graph_module.compile_graph)
+
+        if warm_llm:
+            from .config import DEFAULT_CONFIG_LOW_TEMP
+            from .llm_factory import warm_up_model
+
+            try:
+                phase("llm_warmup", lambda: warm_up_model(DEFAULT_CONFIG_LOW_TEMP))
+            except Exception as exc:  # Ollama caído no debe tumbar el arranque
+                report.warnings.append(f"llm_warmup failed: {exc}")
+                logger.warning("Could not warm up the Ollama model: %s", exc)
+    except Exception as exc:
+        report.error = f"{type(exc).__name__}: {exc}"
+        logger.exception("EduChatAgent startup failed")
+        raise
+
+    report.ready = True
+    logger.info("EduChatAgent ready in %.1f ms", sum(report.phases_ms.values()))
+    return graph, report
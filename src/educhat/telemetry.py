@@ -0,0 +1,409 @@
+# src/educhat/telemetry.py
+
+"""
+Instrumentación del grafo: métricas estilo Prometheus y spans por nodo.
+
+Un único callback de LangChain (TelemetryHandler) se engancha al grafo
+compilado (ver graph.compile_graph), así que ve todas las ejecuciones (API,
+CLI, batch) sin tocar los nodos:
+
+  - cada nodo de LangGraph          -> educhat_node_duration_seconds{node}
+  - cada llamada al LLM             -> educhat_llm_duration_seconds{node},
+                                       tokens de prompt / completion
+  - la recuperación (evento retrieval_done) -> duración y nº de chunks
+  - el contexto del prompt (evento context_built) -> tokens antes/después
+  - la caché semántica (evento cache_hit)   -> aciertos / fallos
+  - la petición completa            -> educhat_request_duration_seconds{mode}
+
+`/metrics` (api.py) devuelve el formato de texto de Prometheus. Si
+TelemetryConfig.spans_path está definido, cada span se escribe además (en
+segundo plano, ver log_writer.py) como una línea JSON con los campos de OTLP/JSON (traceId, spanId, parentSpanId,
+name, startTimeUnixNano, endTimeUnixNano, attributes).
+"""
+
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import bisect
+import logging
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .config import TelemetryConfig, DEFAULT_TELEMETRY_CONFIG
+from .log_writer import get_log_writer
+from .session_memory import count_tokens
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CHUNK_BUCKETS = (0, 1, 2, 4, 8, 16)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self.values[_labels(**labels)] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_fmt_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(labels, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(labels)} {self.sums[labels]}")
+            lines.append(f"{self.name}_count{_fmt_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """Gauge calculado al hacer scrape: fn devuelve {valor_de_label_name: valor}."""
+        self._gauges[name] = (help, fn)
+
+    def locked(self):
+        return self._lock
+
+    def render(self) -> str:
+        with self._lock:
+            lines: List[str] = []
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        for name, (help, fn) in self._gauges.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            try:
+                for label, value in fn().items():
+                    lines.append(f'{name}{{name="{label}"}} {value}')
+            except Exception:
+                logger.exception("Gauge %s failed", name)
+        return "\n".join(lines) + "\n"
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            out.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            out.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            out.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            out.append({"key": key, "value": {"stringValue": str(value)}})
+    return out
+
+
+class TelemetryHandler(BaseCallbackHandler):
+    """
+    Callback compartido por todas las ejecuciones del grafo. Lleva un registro
+    por run_id (abierto en *_start, cerrado en *_end/*_error) y, por cada
+    petición (run raíz), el modo, si vino de la caché y el tiempo por nodo.
+    """
+
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry, config: TelemetryConfig = DEFAULT_TELEMETRY_CONFIG):
+        self.config = config
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._runs: Dict[Any, Dict[str, Any]] = {}       # run_id -> span abierto
+        self._requests: Dict[Any, Dict[str, Any]] = {}   # run raíz -> resumen de la petición
+        self.recent: "deque[Dict[str, Any]]" = deque(maxlen=config.recent_requests)
+        # Los spans los escribe el hilo de log_writer (cola acotada, con rotación)
+        self._spans_path = config.spans_path
+
+        r = registry
+        self.requests = r.counter("educhat_requests_total", "Graph runs by route mode and status")
+        self.request_seconds = r.histogram("educhat_request_duration_seconds", "Graph run latency by route mode")
+        self.node_seconds = r.histogram("educhat_node_duration_seconds", "LangGraph node latency")
+        self.llm_seconds = r.histogram("educhat_llm_duration_seconds", "LLM call latency by graph node")
+        self.prompt_tokens = r.counter("educhat_llm_prompt_tokens_total", "Prompt tokens sent to the LLM")
+        self.completion_tokens = r.counter(
+            "educhat_llm_completion_tokens_total", "Completion tokens generated by the LLM"
+        )
+        self.retrieval_seconds = r.histogram("educhat_retrieval_duration_seconds", "Hybrid retrieval latency")
+        self.retrieved_chunks = r.histogram(
+            "educhat_retrieved_chunks", "Chunks passed to the prompt per retrieval", CHUNK_BUCKETS
+        )
+        self.cache_lookups = r.counter("educhat_cache_lookups_total", "Semantic cache lookups by result")
+        self.faq_answers = r.counter("educhat_faq_answers_total", "FAQ answers by source (template or llm)")
+        self.context_tokens = r.counter(
+            "educhat_context_tokens_total", "Retrieved context tokens before and after assembly (stage)"
+        )
+
+    # -------- registro de spans -------- #
+
+    def _open(self, run_id, parent_run_id, kind: str, name: str, metadata, **attrs) -> None:
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            root = parent["root"] if parent else run_id
+            self._runs[run_id] = {
+                "root": root,
+                "parent": parent_run_id if parent else None,
+                "kind": kind,
+                "name": name,
+                "node": (metadata or {}).get("langgraph_node"),
+                "start": time.time_ns(),
+                "t0": time.perf_counter(),
+                "attrs": attrs,
+            }
+            if root == run_id:
+                self._requests[run_id] = {
+                    "thread_id": (metadata or {}).get("thread_id"),
+                    "mode": None,
+                    "cache_hit": False,
+                    "nodes_ms": {},
+                    "llm_calls": [],
+                    "retrieval": None,
+                    "context": None,
+                }
+
+    def _close(self, run_id, error: Optional[BaseException] = None, **attrs):
+        with self._lock:
+            span = self._runs.pop(run_id, None)
+            if span is None:
+                return None, None
+            span["attrs"].update(attrs)
+            span["seconds"] = time.perf_counter() - span["t0"]
+            span["end"] = time.time_ns()
+            span["error"] = error
+            request = self._requests.get(span["root"])
+        if self._spans_path:
+            self._export(span, run_id)
+        return span, request
+
+    def _export(self, span: Dict[str, Any], run_id) -> None:
+        attributes = dict(span["attrs"], **{"educhat.kind": span["kind"], "langgraph.node": span["node"]})
+        get_log_writer().write(
+            self._spans_path,
+            {
+                "traceId": span["root"].hex,
+                "spanId": run_id.hex[:16],
+                "parentSpanId": span["parent"].hex[:16] if span["parent"] else "",
+                "name": span["name"],
+                "startTimeUnixNano": str(span["start"]),
+                "endTimeUnixNano": str(span["end"]),
+                "attributes": _otlp_attributes(attributes),
+                "status": {"code": 2, "message": str(span["error"])} if span["error"] else {"code": 1},
+            },
+        )
+
+    # -------- grafo y nodos -------- #
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or "chain"
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._open(run_id, None, "request", name, metadata)
+        elif node and name == node:
+            self._open(run_id, parent_run_id, "node", node, metadata)
+        else:
+            # chains internas: no generan métricas, pero enlazan los spans hijos con su petición
+            self._open(run_id, parent_run_id, "chain", name, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish_chain(run_id, None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish_chain(run_id, error)
+
+    def _finish_chain(self, run_id, error) -> None:
+        span, request = self._close(run_id, error)
+        if span is None:
+            return
+        with self.registry.locked():
+            if span["kind"] == "node":
+                self.node_seconds.observe(span["seconds"], node=span["name"])
+                if request is not None:
+                    request["nodes_ms"][span["name"]] = round(span["seconds"] * 1000, 2)
+            elif span["kind"] == "request":
+                self._finish_request(run_id, span, request, error)
+
+    def _finish_request(self, run_id, span, request, error) -> None:
+        with self._lock:
+            self._requests.pop(run_id, None)
+        if request is None:
+            return
+        mode = "cache" if request["cache_hit"] else (request["mode"] or "unknown")
+        self.requests.inc(mode=mode, status="error" if error else "ok")
+        self.request_seconds.observe(span["seconds"], mode=mode)
+        if not request["cache_hit"] and request["mode"] not in (None, "faq"):  # FAQ no consulta la caché
+            self.cache_lookups.inc(result="miss")
+        request["mode"] = mode
+        request["total_ms"] = round(span["seconds"] * 1000, 2)
+        request["error"] = str(error) if error else None
+        self.recent.append(request)
+
+    # -------- LLM -------- #
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        tokens = sum(count_tokens(str(m.content)) for m in messages[0])
+        self._open(run_id, parent_run_id, "llm", kwargs.get("name") or "llm", metadata, prompt_tokens=tokens)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        tokens = sum(count_tokens(p) for p in prompts)
+        self._open(run_id, parent_run_id, "llm", kwargs.get("name") or "llm", metadata, prompt_tokens=tokens)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish_llm(run_id, response, None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish_llm(run_id, None, error)
+
+    def _finish_llm(self, run_id, response, error) -> None:
+        prompt_tokens = completion_tokens = None
+        if response is not None:
+            text, usage, ollama = "", None, {}
+            for generations in response.generations:
+                for gen in generations:
+                    text += gen.text or ""
+                    usage = usage or getattr(getattr(gen, "message", None), "usage_metadata", None)
+                    ollama = ollama or getattr(getattr(gen, "message", None), "response_metadata", None) or {}
+            if ollama.get("prompt_eval_count") and ollama.get("prompt_eval_duration"):
+                # Velocidad de prefill real, para estimar lo que ahorra el contexto comprimido
+                from .context_builder import observe_prefill
+
+                observe_prefill(ollama["prompt_eval_count"], ollama["prompt_eval_duration"] / 1e9)
+            if usage:  # Ollama devuelve los conteos reales
+                prompt_tokens, completion_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+            else:
+                completion_tokens = count_tokens(text)
+        attrs = {"completion_tokens": completion_tokens}
+        if prompt_tokens is not None:
+            attrs["prompt_tokens"] = prompt_tokens
+        span, request = self._close(run_id, error, **attrs)
+        if span is None:
+            return
+        node = span["node"] or "none"
+        with self.registry.locked():
+            self.llm_seconds.observe(span["seconds"], node=node)
+            self.prompt_tokens.inc(span["attrs"].get("prompt_tokens") or 0, node=node)
+            self.completion_tokens.inc(span["attrs"].get("completion_tokens") or 0, node=node)
+        if request is not None:
+            request["llm_calls"].append(
+                {
+                    "node": node,
+                    "ms": round(span["seconds"] * 1000, 2),
+                    "prompt_tokens": span["attrs"].get("prompt_tokens"),
+                    "completion_tokens": span["attrs"].get("completion_tokens"),
+                }
+            )
+
+    # -------- eventos del grafo (graph._emit) -------- #
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        with self._lock:
+            span = self._runs.get(run_id)
+            request = self._requests.get(span["root"]) if span else None
+        if request is None:
+            return
+        with self.registry.locked():
+            if name == "route":
+                request["mode"] = data.get("mode")
+            elif name == "cache_hit":
+                request["cache_hit"] = True
+                request["mode"] = data.get("mode")
+                self.cache_lookups.inc(result="hit")
+            elif name == "retrieval_done":
+                total_ms = (data.get("timings_ms") or {}).get("total")
+                if total_ms is not None:
+                    self.retrieval_seconds.observe(total_ms / 1000)
+                if data.get("chunks") is not None:
+                    self.retrieved_chunks.observe(data["chunks"])
+                request["retrieval"] = {"chunks": data.get("chunks"), "timings_ms": data.get("timings_ms")}
+            elif name == "context_built":
+                self.context_tokens.inc(data.get("tokens_before") or 0, stage="retrieved")
+                self.context_tokens.inc(data.get("tokens") or 0, stage="prompt")
+                request["context"] = {
+                    key: data.get(key)
+                    for key in ("tokens_before", "tokens", "saved_tokens", "prefill_saved_ms", "compressed", "ms")
+                }
+            elif name == "faq_answered":
+                self.faq_answers.inc(source=data.get("source"))
+                request["faq"] = {"source": data.get("source"), "intent": data.get("intent")}
+
+    # -------- consultas -------- #
+
+    def last_request(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Resumen de la última petición terminada de esa sesión (o None)."""
+        for request in reversed(self.recent):
+            if request.get("thread_id") == thread_id:
+                return request
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+
+    def scheduler_gauges() -> Dict[str, float]:
+        from .llm_scheduler import get_scheduler
+
+        stats = get_scheduler().stats()
+        return {"in_flight": stats["in_flight"], "queued": stats["queued"]}
+
+    registry.gauge("educhat_llm_scheduler", "LLM scheduler occupancy", scheduler_gauges)
+    registry.gauge("educhat_log_writer", "Background log writer (queued, written, dropped records)",
+                   lambda: get_log_writer().stats())
+    return registry
+
+
+@lru_cache(maxsize=1)
+def get_telemetry() -> TelemetryHandler:
+    """Handler compartido por todo el proceso."""
+    return TelemetryHandler(get_registry(), DEFAULT_TELEMETRY_CONFIG)
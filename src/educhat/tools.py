@@ -1,45 +1,110 @@
 # src/educhat/tools.py
 
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache
-from typing import List
+from typing import List, Optional, Tuple
+import threading
 
 from langchain_core.documents import Document
-from .rag_store import load_vector_store
+from .config import DEFAULT_CONTEXT_CONFIG, DEFAULT_RETRIEVAL_CONFIG
+from .context_builder import get_context_builder
+from .courses import get_course
+from .index_pool import get_index_pool
+from .query_cache import normalize_query
+from .rag_store import current_index_version
+from .retrieval import HybridRetriever, RetrievalResult
 
+# Número de chunks que se recuperan por consulta. Con el troceado por secciones
+# (chunking.py) cada chunk ocupa como mucho ~800 caracteres.
+TOP_K = DEFAULT_RETRIEVAL_CONFIG.top_k
 
-@lru_cache(maxsize=1)
-def _get_retriever():
+# Recuperaciones lanzadas en segundo plano (start_retrieval): (curso, consulta
+# normalizada) -> (versión del índice, Future). Las que nadie consume (la ruta
+# acabó siendo faq) se descartan al pasar de MAX_SPECULATIVE.
+MAX_SPECULATIVE = 64
+_speculative: "OrderedDict[Tuple[str, str], Tuple[str, Future]]" = OrderedDict()
+_speculative_lock = threading.Lock()
+
+
+def _get_retriever(course_id: Optional[str] = None) -> HybridRetriever:
     """
-    Carga el vector store y devuelve un retriever de similitud.
-    Se cachea en memoria para no recargarlo cada vez.
+    Devuelve el retriever híbrido (vector store + índice BM25, ver
+    retrieval.py) del curso, sin retenerlo. Lo carga el pool de índices
+    (index_pool.py) la primera vez; cuando build_rag publica una versión
+    nueva del índice se carga esa.
     """
-    vectordb = load_vector_store()
-    retriever = vectordb.as_retriever(search_type="similarity", search_kwargs={"k": 2})
-    return retriever
+    return get_index_pool().get(course_id)
+
+
+def _retrieve(query: str, course_id: Optional[str]) -> RetrievalResult:
+    # El índice queda retenido en el pool mientras dura la búsqueda
+    with get_index_pool().lease(course_id) as retriever:
+        return retriever.retrieve(query, k=TOP_K)
 
 
-def course_rag_search(query: str) -> str:
+def format_context(docs: List[Document]) -> str:
+    chunks: List[str] = [d.page_content for d in docs if getattr(d, "page_content", None)]
+    return "\n\n---\n\n".join(chunks)
+
+
+def prefetch_retrievals(
+    queries: List[str],
+    vectors: Optional[List[List[float]]] = None,
+    course_id: Optional[str] = None,
+) -> None:
     """
-    Busca en los documentos del curso (sílabo, UC1, quizzes, etc.)
-    usando el vector store, y devuelve un contexto concatenado en texto.
-    Compatible con las versiones nuevas de LangChain donde el retriever
-    es un Runnable (se usa .invoke en lugar de .get_relevant_documents).
+    Recupera el contexto de muchas consultas a la vez (un embedding y una
+    búsqueda FAISS); los nodos del grafo lo encuentran luego en la caché de consultas.
+    """
+    with get_index_pool().lease(course_id) as retriever:
+        retriever.retrieve_many(queries, vectors=vectors, k=TOP_K)
+
+
+@lru_cache(maxsize=1)
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="educhat-retrieval")
+
+
+def start_retrieval(query: str, course_id: Optional[str] = None) -> None:
     """
-    retriever = _get_retriever()
+    Empieza a recuperar el contexto de `query` en segundo plano (p. ej.
+    mientras el router LLM decide la ruta). course_rag_retrieve usa este
+    resultado (esperándolo si aún no terminó) en lugar de repetir la búsqueda.
+    Si el índice del curso no está cargado, la carga también empieza aquí.
+    """
+    course = get_course(course_id)
+    key = (course.id, normalize_query(query))
+    version = current_index_version(course.index_dir)
+    with _speculative_lock:
+        if key in _speculative:
+            return
+        _speculative[key] = (version, _executor().submit(_retrieve, query, course.id))
+        while len(_speculative) > MAX_SPECULATIVE:
+            _speculative.popitem(last=False)
 
-    # En LangChain >= 0.2 los retrievers son Runnables:
-    # docs = retriever.invoke(query) devuelve List[Document]
-    docs = retriever.invoke(query)
 
-    # Por seguridad, normalizamos a lista
-    if isinstance(docs, Document):
-        docs = [docs]
-    elif not isinstance(docs, list):
-        docs = list(docs)
+def course_rag_retrieve(query: str, course_id: Optional[str] = None) -> RetrievalResult:
+    """Como course_rag_search, pero devuelve los Documents y el tiempo de cada etapa."""
+    course = get_course(course_id)
+    with _speculative_lock:
+        version, future = _speculative.pop((course.id, normalize_query(query)), (None, None))
+    if future is not None and version == current_index_version(course.index_dir):
+        try:
+            return future.result()
+        except Exception:
+            pass  # se reintenta abajo y, si vuelve a fallar, el error llega al nodo
+    return _retrieve(query, course.id)
 
-    if not docs:
-        return ""
 
-    chunks: List[str] = [d.page_content for d in docs if getattr(d, "page_content", None)]
-    context = "\n\n---\n\n".join(chunks)
-    return context
+def course_rag_search(query: str, course_id: Optional[str] = None, mode: str = "concept") -> str:
+    """
+    Busca en los documentos del curso (sílabo, UC1, quizzes, etc.)
+    con búsqueda híbrida (FAISS + BM25 + reranking opcional) y devuelve
+    el contexto en texto, dentro del presupuesto de tokens de `mode`
+    (ver context_builder.py).
+    """
+    docs = course_rag_retrieve(query, course_id).docs
+    if not DEFAULT_CONTEXT_CONFIG.enabled:
+        return format_context(docs)
+    return get_context_builder().build(query, docs, mode).text
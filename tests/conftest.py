@@ -0,0 +1,39 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# Los módulos viven en src/educhat (se ejecutan con "cd src" o con PYTHONPATH=src)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def course_doc(topic: str, sections: int = 3) -> str:
+    """Documento del curso con `sections` secciones numeradas sobre `topic`."""
+    parts = []
+    for i in range(1, sections + 1):
+        parts.append(f"{i}. {topic.upper()} PART {i}")
+        parts.append(
+            f"This section explains {topic}, part {i}. "
+            + " ".join(f"Sentence {j} about {topic} number {i}." for j in range(12))
+        )
+    return "\n\n".join(parts)
+
+
+@pytest.fixture
+def make_doc():
+    return course_doc
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """Carpeta del índice, con embeddings deterministas en lugar de MiniLM."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    import educhat.rag_store as rag_store
+    import educhat.retrieval as retrieval
+
+    embeddings = DeterministicFakeEmbedding(size=32)
+    monkeypatch.setattr(rag_store, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(retrieval, "get_embeddings", lambda: embeddings)
+    return str(tmp_path / "faiss")
@@ -0,0 +1,112 @@
+# tests/test_ann_index.py
+import logging
+import os
+from dataclasses import replace
+
+import faiss
+import numpy as np
+import pytest
+
+from educhat.ann_index import (
+    ANN_FILE,
+    AnnSearcher,
+    build_ann_index,
+    choose_kind,
+    evaluate_index,
+    load_ann_searcher,
+    write_ann_index,
+)
+from educhat.config import DEFAULT_VECTOR_INDEX_CONFIG
+from educhat.index_format import VECTORS_FILE
+from educhat.rag_store import current_index_dir, load_manifest, update_vector_store
+from educhat.retrieval import load_hybrid_retriever
+
+CONFIG = replace(DEFAULT_VECTOR_INDEX_CONFIG, recall_queries=50)
+
+
+def _vectors(n: int, d: int = 16, seed: int = 0) -> np.ndarray:
+    """Vectores agrupados en temas, como los embeddings de los chunks de un curso."""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(42).standard_normal((20, d)) * 3
+    return (centers[rng.integers(0, 20, n)] + rng.standard_normal((n, d))).astype(np.float32)
+
+
+def _flat(n: int, d: int = 16) -> faiss.Index:
+    flat = faiss.IndexFlatL2(d)
+    flat.add(_vectors(n, d))
+    return flat
+
+
+def _recall(searcher: AnnSearcher, flat: faiss.Index, k: int = 10) -> float:
+    queries = _vectors(50, flat.d, seed=1)
+    truth = flat.search(queries, k)[1]
+    found = searcher.search(queries, k)[1]
+    return sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / truth.size
+
+
+def test_choose_kind_by_size():
+    config = replace(CONFIG, flat_max_vectors=10, hnsw_max_vectors=100, sq8_max_vectors=1000)
+    assert [choose_kind(n, config) for n in (10, 11, 100, 1000, 1001)] == ["flat", "hnsw", "hnsw", "ivf_sq8", "ivf_pq"]
+    assert choose_kind(5, replace(config, kind="ivf_flat")) == "ivf_flat"
+    with pytest.raises(ValueError):
+        choose_kind(5, replace(config, kind="lsh"))
+
+
+def test_small_corpus_stays_flat():
+    ann, info = build_ann_index(_flat(100), CONFIG)
+    assert ann is None and info == {"kind": "flat", "vectors": 100, "dim": 16}
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw", "ivf_sq8"])
+def test_ann_kinds_with_exact_rerank_keep_recall(kind):
+    flat = _flat(4000)
+    ann, info = build_ann_index(flat, replace(CONFIG, kind=kind))
+    assert info["kind"] == kind and ann.ntotal == flat.ntotal
+
+    searcher = AnnSearcher(ann, flat, CONFIG)
+    assert searcher.kind == kind
+    assert _recall(searcher, flat) >= 0.9
+    distances, positions = searcher.search(np.zeros((2, 16), dtype=np.float32), 5)
+    assert positions.shape == distances.shape == (2, 5)
+    assert (np.diff(distances, axis=1) >= 0).all()  # reordenadas por distancia exacta
+
+
+def test_pq_falls_back_to_sq8_with_too_few_training_vectors():
+    ann, info = build_ann_index(_flat(2000), replace(CONFIG, kind="ivf_pq"))
+    assert info["kind"] == "ivf_sq8" and "SQ8" in info["factory"]
+
+
+def test_mismatched_ann_file_falls_back_to_the_flat_index(tmp_path, caplog):
+    ann, _ = build_ann_index(_flat(3000), replace(CONFIG, kind="hnsw"))
+    write_ann_index(ann, str(tmp_path))
+
+    assert isinstance(load_ann_searcher(str(tmp_path), _flat(3000), CONFIG), AnnSearcher)
+    assert load_ann_searcher(str(tmp_path), _flat(3000), replace(CONFIG, kind="flat")) is None
+    with caplog.at_level(logging.WARNING, logger="educhat.ann_index"):
+        assert load_ann_searcher(str(tmp_path), _flat(2999), CONFIG) is None  # otro build del índice plano
+    assert "does not match" in caplog.text
+    assert load_ann_searcher(str(tmp_path / "missing"), _flat(3000), CONFIG) is None
+
+
+def test_evaluate_index_reports_recall(tmp_path):
+    flat = _flat(3000)
+    faiss.write_index(flat, os.path.join(tmp_path, VECTORS_FILE))
+    ann, _ = build_ann_index(flat, replace(CONFIG, kind="ivf_sq8"))
+    write_ann_index(ann, str(tmp_path))
+
+    report = evaluate_index(str(tmp_path), CONFIG)
+    assert report["kind"] == "ivf_sq8" and report["vectors"] == 3000
+    assert report["recall@10"] >= report["recall@10_without_rerank"] - 0.05
+    assert report["recall@10"] >= 0.9
+    assert report["ann_bytes_per_vector"] < report["flat_bytes_per_vector"]
+
+
+def test_build_publishes_ann_next_to_the_flat_index(index_dir, make_doc):
+    config = replace(CONFIG, kind="hnsw")
+    update_vector_store([(f"{t}.txt", make_doc(t)) for t in ("keys", "joins")], persist_dir=index_dir, index_config=config)
+
+    assert load_manifest(index_dir)["vector_index"]["kind"] == "hnsw"
+    assert os.path.exists(os.path.join(current_index_dir(index_dir), ANN_FILE))
+    retriever = load_hybrid_retriever(persist_dir=index_dir, index_config=config)
+    assert retriever.stats()["vector_index"]["kind"] == "hnsw"
+    assert retriever.retrieve("primary keys").docs
@@ -0,0 +1,110 @@
+# tests/test_api.py
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessageChunk
+
+import educhat.api as api
+from educhat.startup import StartupReport
+
+
+JSON_ANSWER = json.dumps({"answer": "A primary key \"identifies\" rows.", "key_points": [], "references": []})
+
+
+class _Graph:
+    async def ainvoke(self, state, config=None):
+        return {"final_answer": f"answer: {state['user_input']}"}
+
+    async def astream_events(self, state, config=None, version=None):
+        # Salida JSON de concept en single_pass, troceada como la emitiría Ollama
+        for i in range(0, len(JSON_ANSWER), 5):
+            yield {
+                "event": "on_chat_model_stream",
+                "run_id": "run-1",
+                "metadata": {"langgraph_node": "concept_node"},
+                "data": {"chunk": AIMessageChunk(content=JSON_ANSWER[i:i + 5])},
+            }
+        yield {"event": "on_chain_end", "name": "LangGraph", "data": {"output": {"final_answer": JSON_ANSWER}}}
+
+
+class _LogWriter:
+    def log_interaction(self, *args):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    attempts = []
+
+    def warm_up(report):
+        attempts.append(report)
+        if len(attempts) == 1:
+            report.error = "RuntimeError: FAISS index not found"
+            raise RuntimeError("FAISS index not found")
+        report.ready = True
+        return _Graph(), report
+
+    monkeypatch.setattr(api, "warm_up", warm_up)
+    monkeypatch.setattr(api, "get_log_writer", lambda: _LogWriter())
+    monkeypatch.setattr(api, "startup_report", StartupReport())
+    monkeypatch.setattr(api, "WARMUP_RETRY_SECONDS", 3600.0)
+    with TestClient(api.app) as client:
+        yield client
+
+
+def _wait_ready(client, field):
+    for _ in range(200):
+        resp = client.get("/ready")
+        if resp.json()[field]:
+            return resp
+        time.sleep(0.01)
+    raise AssertionError(f"/ready never reported {field}")
+
+
+def test_failed_warmup_returns_503_with_cause_and_is_retried(client, monkeypatch):
+    resp = _wait_ready(client, "error")
+    assert resp.status_code == 503
+    assert resp.json()["error"] == "RuntimeError: FAISS index not found"
+
+    chat = client.post("/chat", json={"session_id": "s1", "message": "What is 2NF?"})
+    assert chat.status_code == 503
+    assert "FAISS index not found" in chat.json()["detail"]
+    assert chat.headers["Retry-After"] == "3600"
+
+    # Pasado el plazo, /ready relanza el arranque
+    monkeypatch.setattr(api, "WARMUP_RETRY_SECONDS", 0.0)
+    resp = _wait_ready(client, "ready")
+    assert resp.status_code == 200
+    assert resp.json()["attempt"] == 2
+    assert resp.json()["previous_error"] == "RuntimeError: FAISS index not found"
+
+    chat = client.post("/chat", json={"session_id": "s1", "message": "What is 2NF?"})
+    assert chat.status_code == 200
+    assert chat.json() == {"answer": "answer: What is 2NF?"}
+
+
+def test_requests_retry_the_warmup_themselves(client, monkeypatch):
+    _wait_ready(client, "error")
+    monkeypatch.setattr(api, "WARMUP_RETRY_SECONDS", 0.0)
+
+    chat = client.post("/chat", json={"session_id": "s1", "message": "hi"})
+    assert chat.status_code == 200
+    assert client.get("/ready").status_code == 200
+
+
+def test_stream_sends_only_the_answer_text_of_json_outputs(client, monkeypatch):
+    _wait_ready(client, "error")
+    monkeypatch.setattr(api, "WARMUP_RETRY_SECONDS", 0.0)
+    _wait_ready(client, "ready")
+
+    resp = client.post("/chat/stream", json={"session_id": "s1", "message": "What is a primary key?"})
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in resp.text.strip().split("\n\n")
+    ]
+
+    tokens = "".join(data["text"] for event, data in events if event == "token")
+    assert tokens == 'A primary key "identifies" rows.'
+    assert events[-1] == ("done", {"answer": JSON_ANSWER})
@@ -0,0 +1,104 @@
+# tests/test_batch.py
+import asyncio
+import json
+
+import pytest
+
+from educhat import batch
+from educhat.batch import arun_batch, dedupe, load_questions, question_id
+from educhat.config import BatchConfig
+
+
+class _Checkpointer:
+    def __init__(self):
+        self.deleted = []
+
+    def delete_thread(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+class _Graph:
+    """Grafo mínimo: responde en eco y falla en las preguntas de `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked = []
+        self.checkpointer = _Checkpointer()
+
+    async def abatch_as_completed(self, inputs, configs, return_exceptions=False):
+        for i, item in enumerate(inputs):
+            question = item["user_input"]
+            self.asked.append(question)
+            if question in self.failing:
+                yield i, RuntimeError("ollama down")
+            else:
+                yield i, {"final_answer": f"answer: {question}", "mode": "concept", "cache_hit": False}
+
+
+@pytest.fixture(autouse=True)
+def no_prefetch(monkeypatch):
+    monkeypatch.setattr(batch, "_prefetch", lambda questions, course_id=None: None)
+
+
+def _run(graph, questions, out_path, **kwargs):
+    async def collect():
+        return [r async for r in arun_batch(graph, questions, str(out_path), BatchConfig(batch_size=2), **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_duplicates_are_answered_once(tmp_path):
+    graph = _Graph()
+    records = _run(graph, ["What is 2NF?", "what is  2nf?", "What is SQL?"], tmp_path / "out.jsonl")
+
+    assert graph.asked == ["What is 2NF?", "What is SQL?"]
+    duplicates = {r["question"]: r["duplicates"] for r in records}
+    assert duplicates == {"What is 2NF?": 2, "What is SQL?": 1}
+    assert len(graph.checkpointer.deleted) == 2
+
+
+def test_resume_skips_answered_and_retries_errors(tmp_path):
+    out = tmp_path / "out.jsonl"
+    questions = ["q1", "q2", "q3"]
+
+    first = _run(_Graph(failing={"q2"}), questions, out)
+    assert sorted(r["question"] for r in first if r.get("error")) == ["q2"]
+
+    graph = _Graph()
+    second = _run(graph, questions, out)
+    assert graph.asked == ["q2"]
+    assert [r["answer"] for r in second] == ["answer: q2"]
+    assert len(_lines(out)) == 4
+
+
+def test_resume_ignores_truncated_last_line(tmp_path):
+    out = tmp_path / "out.jsonl"
+    record = {"id": question_id("q1"), "question": "q1", "answer": "a"}
+    out.write_text(json.dumps(record) + "\n" + '{"id": "trunc', encoding="utf-8")
+
+    graph = _Graph()
+    _run(graph, ["q1", "q2"], out)
+    assert graph.asked == ["q2"]
+
+
+def test_no_resume_answers_everything_again(tmp_path):
+    out = tmp_path / "out.jsonl"
+    _run(_Graph(), ["q1", "q2"], out)
+
+    graph = _Graph()
+    _run(graph, ["q1", "q2"], out, resume=False)
+    assert graph.asked == ["q1", "q2"]
+
+
+def test_load_questions_from_interaction_logs(tmp_path):
+    path = tmp_path / "interactions.jsonl"
+    path.write_text(
+        "\n".join(json.dumps(r) for r in [{"user_input": "q1"}, {"message": "q2"}, {"other": 1}]) + "\n",
+        encoding="utf-8",
+    )
+    assert load_questions(str(path)) == ["q1", "q2"]
+    assert list(dedupe([" q1 ", "Q1", "q2"]).values()) == ["q1", "q2"]
@@ -0,0 +1,115 @@
+# tests/test_checkpoint_store.py
+import threading
+import time
+from typing import List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from educhat.checkpoint_store import EvictingInMemorySaver, PooledSqliteSaver, run_maintenance
+from educhat.config import CheckpointConfig
+
+
+class _State(TypedDict, total=False):
+    user_input: str
+    turns: List[str]
+    summary: str
+
+
+def _graph(saver):
+    # Como el grafo real: varios nodos que escriben canales distintos en cada turno
+    def memory(state: _State) -> _State:
+        return {"turns": (state.get("turns") or [])[-3:] + [state["user_input"]]}
+
+    def summarize(state: _State) -> _State:
+        return {"summary": f"{len(state['turns'])} recent turns"}
+
+    builder = StateGraph(_State)
+    builder.add_node("memory", memory)
+    builder.add_node("summarize", summarize)
+    builder.add_edge(START, "memory")
+    builder.add_edge("memory", "summarize")
+    builder.add_edge("summarize", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _sizes(saver: EvictingInMemorySaver):
+    checkpoints = sum(len(c) for namespaces in saver.storage.values() for c in namespaces.values())
+    return checkpoints, len(saver.blobs), len(saver.writes)
+
+
+def _chat(graph, thread_id: str, turns: int, start: int = 0):
+    config = {"configurable": {"thread_id": thread_id}}
+    for i in range(start, start + turns):
+        graph.invoke({"user_input": f"question {i}"}, config)
+
+
+def test_pruning_keeps_memory_per_thread_flat():
+    saver = EvictingInMemorySaver()
+    graph = _graph(saver)
+
+    _chat(graph, "s1", 10)
+    saver.prune(keep_per_thread=2)
+    after_10 = _sizes(saver)
+
+    _chat(graph, "s1", 40, start=10)
+    saver.prune(keep_per_thread=2)
+    assert _sizes(saver) == after_10
+
+    # El último estado sigue completo
+    state = graph.get_state({"configurable": {"thread_id": "s1"}}).values
+    assert state["turns"] == ["question 46", "question 47", "question 48", "question 49"]
+    assert state["summary"] == "4 recent turns"
+    _chat(graph, "s1", 1, start=50)
+    assert graph.get_state({"configurable": {"thread_id": "s1"}}).values["turns"][-1] == "question 50"
+
+
+def test_evict_idle_removes_every_trace_of_the_session():
+    saver = EvictingInMemorySaver()
+    graph = _graph(saver)
+    _chat(graph, "old", 3)
+    _chat(graph, "new", 3)
+    saver._last_seen["old"] = time.time() - 3600
+
+    assert saver.evict_idle(ttl_seconds=60) == ["old"]
+    assert set(saver.storage) == {"new"}
+    assert all(key[0] == "new" for key in saver.blobs)
+    assert all(key[0] == "new" for key in saver.writes)
+
+
+def test_maintenance_can_run_while_requests_write():
+    saver = EvictingInMemorySaver()
+    graph = _graph(saver)
+    config = CheckpointConfig(backend="memory", keep_per_thread=1, session_ttl_seconds=3600)
+    errors = []
+
+    def chat(thread_id):
+        try:
+            _chat(graph, thread_id, 30)
+        except Exception as exc:  # p. ej. "dictionary changed size during iteration"
+            errors.append(exc)
+
+    threads = [threading.Thread(target=chat, args=(f"s{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        run_maintenance(saver, config)
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    run_maintenance(saver, config)
+    assert _sizes(saver)[0] == 4
+
+
+def test_sqlite_prune_and_evict(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "checkpoints.sqlite3"), pool_size=2)
+    graph = _graph(saver)
+    _chat(graph, "s1", 5)
+    _chat(graph, "s2", 2)
+
+    assert saver.prune(keep_per_thread=1) > 0
+    assert len(list(saver.list({"configurable": {"thread_id": "s1"}}))) == 1
+    assert graph.get_state({"configurable": {"thread_id": "s1"}}).values["turns"][-1] == "question 4"
+
+    assert sorted(saver.evict_idle(ttl_seconds=-1)) == ["s1", "s2"]
+    assert graph.get_state({"configurable": {"thread_id": "s1"}}).values == {}
@@ -0,0 +1,45 @@
+# tests/test_chunking.py
+from educhat.chunking import chunk_text
+from educhat.config import ChunkConfig
+
+CONFIG = ChunkConfig(chunk_size=300, chunk_overlap=60)
+
+
+def _section(title: str, paragraphs: int = 8) -> str:
+    body = "\n\n".join(
+        f"Paragraph {i} of {title}: " + " ".join(f"word{j}" for j in range(12)) for i in range(paragraphs)
+    )
+    return f"=== {title} ===\n{body}"
+
+
+def test_chunks_with_section_title_stay_within_chunk_size():
+    text = _section("NORMALIZATION AND FUNCTIONAL DEPENDENCIES") + "\n\n" + _section("SQL")
+    docs = chunk_text(text, "uc1_content.txt", CONFIG)
+
+    assert len(docs) > 2
+    for doc in docs:
+        assert doc.page_content.startswith(doc.metadata["section"] + "\n")
+        assert len(doc.page_content) <= CONFIG.chunk_size
+
+
+def test_long_rows_are_split_within_chunk_size():
+    text = "=== QUIZZES ===\n" + "x" * 1000
+    docs = chunk_text(text, "quizzes.txt", CONFIG)
+
+    assert "".join(doc.page_content.split("\n", 1)[1] for doc in docs) == "x" * 1000
+    assert all(len(doc.page_content) <= CONFIG.chunk_size for doc in docs)
+
+
+def test_metadata():
+    docs = chunk_text(_section("CONTENTS", 2), "uc2_content.txt", CONFIG)
+    assert [doc.metadata["chunk"] for doc in docs] == list(range(len(docs)))
+    assert {doc.metadata["unit"] for doc in docs} == {"UC2"}
+    assert {doc.metadata["source"] for doc in docs} == {"uc2_content.txt"}
+
+
+def test_overlap_is_dropped_when_it_does_not_fit_with_the_next_piece():
+    text = "=== T ===\n" + "a" * 50 + "\n\n" + "b" * 250
+    docs = chunk_text(text, "notes.txt", CONFIG)
+
+    assert [len(doc.page_content) for doc in docs] == [2 + 50, 2 + 250]
+    assert all(len(doc.page_content) <= CONFIG.chunk_size for doc in docs)
@@ -0,0 +1,123 @@
+# tests/test_context_builder.py
+from dataclasses import replace
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from educhat import tools
+from educhat.config import DEFAULT_CONTEXT_CONFIG
+from educhat.context_builder import SEPARATOR, ContextBuilder, split_sentences
+
+TOPICS = ["keys", "joins", "indexes", "normalization", "transactions"]
+
+
+class _KeywordEmbeddings(Embeddings):
+    """Un eje por tema: una frase se parece a la consulta si habla del mismo tema."""
+
+    def _vector(self, text: str) -> List[float]:
+        words = text.casefold().replace(".", " ").split()
+        return [float(words.count(topic)) + 0.01 for topic in TOPICS]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def _chunk(topic: str, n: int = 8) -> Document:
+    section = f"{topic.upper()} BASICS"
+    body = " ".join(f"Fact {i} about {topic} in sentence {i}." for i in range(n))
+    return Document(page_content=f"{section}\n{body}", metadata={"source": f"{topic}.txt", "section": section})
+
+
+def _builder(**overrides) -> ContextBuilder:
+    config = replace(DEFAULT_CONTEXT_CONFIG, tokenizer=None, sentence_cache_entries=0, **overrides)
+    return ContextBuilder(config, embeddings=_KeywordEmbeddings())
+
+
+def _sentences(docs: List[Document]) -> List[str]:
+    return [text for doc in docs for text, _ in split_sentences(doc)]
+
+
+def _positions(text: str, sentences: List[str]) -> List[int]:
+    return [text.index(sentence) for sentence in sentences if sentence in text]
+
+
+def test_small_context_is_used_uncompressed():
+    docs = [_chunk("keys", 3), _chunk("joins", 3)]
+    context = _builder(concept_tokens=10_000).build("what is a key", docs)
+
+    assert not context.compressed
+    assert context.sentences_kept == context.sentences == 6
+    assert context.text.split(SEPARATOR) == [
+        "[keys.txt · KEYS BASICS]\n" + " ".join(_sentences(docs[:1])),
+        "[joins.txt · JOINS BASICS]\n" + " ".join(_sentences(docs[1:])),
+    ]
+    assert context.sources == ["keys.txt · KEYS BASICS", "joins.txt · JOINS BASICS"]
+
+
+def test_overlapping_sentences_are_kept_once():
+    first = _chunk("keys", 4)
+    overlap = Document(
+        page_content=first.page_content.split(". ", 2)[-1] + " A new fact about keys.",
+        metadata={"source": "keys.txt", "section": "KEYS BASICS"},
+    )
+    context = _builder(concept_tokens=10_000).build("keys", [first, overlap])
+
+    assert context.duplicates == 2
+    for sentence in _sentences([first]) + ["A new fact about keys."]:
+        assert context.text.count(sentence) == 1
+
+
+@pytest.mark.parametrize("granularity", ["sentence", "chunk"])
+@pytest.mark.parametrize("budget", [90, 150, 250])
+def test_compressed_context_stays_under_budget(granularity, budget):
+    builder = _builder(concept_tokens=budget, granularity=granularity)
+    context = builder.build("normalization", [_chunk(topic) for topic in TOPICS])
+
+    assert context.compressed and context.tokens_before > budget
+    assert context.tokens == builder.counter.count(context.text) <= budget
+    assert 0 < context.sentences_kept < context.sentences
+
+
+def test_selected_sentences_keep_their_original_order():
+    docs = [_chunk(topic) for topic in TOPICS]
+    context = _builder(concept_tokens=120, duplicate_similarity=1.1).build("joins and normalization", docs)
+
+    kept = [sentence for sentence in _sentences(docs) if sentence in context.text]
+    assert len(kept) == context.sentences_kept
+    # Las frases del contexto aparecen en el orden de los chunks y, dentro de cada uno, en el del texto
+    assert _positions(context.text, kept) == sorted(_positions(context.text, kept))
+    labels = [f"[{doc.metadata['source']} · {doc.metadata['section']}]" for doc in docs]
+    present = [label for label in labels if label in context.text]
+    assert _positions(context.text, present) == sorted(_positions(context.text, present))
+    # Las más parecidas a la consulta se quedan, las de otros temas no
+    assert all(sentence in context.text for sentence in _sentences([docs[1]])[:2])
+    assert "about transactions" not in context.text
+
+
+def test_chunk_granularity_keeps_whole_chunks_in_retrieval_order():
+    docs = [_chunk(topic, 4) for topic in TOPICS]
+    whole = _builder(concept_tokens=10_000).build("keys", docs).text.split(SEPARATOR)
+    builder = _builder(concept_tokens=100, granularity="chunk")
+    context = builder.build("keys", docs)
+
+    blocks = context.text.split(SEPARATOR)
+    assert context.compressed and blocks == whole[: len(blocks)]
+    assert context.passages == len(blocks) < len(docs)
+
+
+def test_disabled_builder_falls_back_to_the_raw_chunks(monkeypatch):
+    docs = [_chunk(topic) for topic in TOPICS]
+    monkeypatch.setattr(tools, "course_rag_retrieve", lambda query, course_id=None: tools.RetrievalResult(docs=docs))
+    monkeypatch.setattr(tools, "DEFAULT_CONTEXT_CONFIG", replace(DEFAULT_CONTEXT_CONFIG, enabled=False))
+
+    assert tools.course_rag_search("keys") == tools.format_context(docs)
+
+
+def test_unknown_granularity_is_rejected():
+    with pytest.raises(ValueError):
+        ContextBuilder(replace(DEFAULT_CONTEXT_CONFIG, granularity="paragraph"), DeterministicFakeEmbedding(size=8))
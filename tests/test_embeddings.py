@@ -0,0 +1,109 @@
+# tests/test_embeddings.py
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from educhat import embeddings, rag_store
+from educhat.config import DEFAULT_EMBEDDING_CONFIG
+from educhat.embeddings import BatchingEmbeddings, embedding_threads, parity, resolve_backend
+from educhat.rag_store import load_manifest, update_vector_store
+
+ONNX = replace(DEFAULT_EMBEDDING_CONFIG, backend="onnx")
+
+
+@pytest.fixture
+def no_onnxruntime(monkeypatch):
+    embeddings._onnx_missing.cache_clear()
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)  # import onnxruntime -> ImportError
+    yield
+    embeddings._onnx_missing.cache_clear()
+
+
+def test_onnx_falls_back_to_torch_without_onnxruntime(no_onnxruntime):
+    assert resolve_backend(ONNX) == "torch"
+    assert resolve_backend(replace(ONNX, backend="onnx_int8")) == "torch"
+    assert resolve_backend(DEFAULT_EMBEDDING_CONFIG) == "torch"
+    with pytest.raises(ValueError):
+        resolve_backend(replace(ONNX, backend="tensorflow"))
+
+
+def test_manifest_records_the_backend_that_loaded(index_dir, make_doc, monkeypatch, no_onnxruntime):
+    monkeypatch.setattr(rag_store, "DEFAULT_EMBEDDING_CONFIG", ONNX)
+    sources = [("keys.txt", make_doc("primary keys"))]
+    update_vector_store(sources, persist_dir=index_dir)
+    assert load_manifest(index_dir)["embed_backend"] == "torch"
+
+    # Sigue sin haber onnxruntime: el índice está al día, no se reconstruye
+    assert not update_vector_store(sources, persist_dir=index_dir)["published"]
+
+
+def test_embed_documents_batches_by_length_and_keeps_order():
+    engine = object.__new__(embeddings.OnnxEmbeddings)  # sin onnxruntime: solo el troceado en lotes
+    engine.config = replace(ONNX, batch_size=2)
+    batches = []
+
+    def encode(texts):
+        batches.append(texts)
+        return np.asarray([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+    engine._encode = encode
+    texts = ["a", "ccc", "bb", "dddd", "e"]
+    assert engine.embed_documents(texts) == [[float(len(t)), 1.0] for t in texts]
+    assert batches == [["dddd", "ccc"], ["bb", "a"], ["e"]]
+    assert engine.embed_documents([]) == []
+
+
+def test_micro_batcher_joins_concurrent_queries():
+    calls = []
+    gate = threading.Event()
+
+    def embed_many(texts):
+        calls.append(list(texts))
+        gate.wait(5)
+        return [[float(len(text))] for text in texts]
+
+    engine = BatchingEmbeddings(DeterministicFakeEmbedding(size=4), max_batch=8)
+    engine.batcher.embed_many = embed_many
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        first = pool.submit(engine.embed_query, "x")
+        while not calls:
+            time.sleep(0.001)
+        # Mientras el primer forward está en marcha llegan cinco consultas más: van juntas en el siguiente
+        rest = [pool.submit(engine.embed_query, "y" * i) for i in range(1, 6)]
+        while engine.batcher._queue.qsize() < 5:
+            time.sleep(0.001)
+        gate.set()
+        assert first.result() == [1.0]
+        assert [future.result() for future in rest] == [[float(i)] for i in range(1, 6)]
+
+    assert len(calls) == 2 and sorted(calls[1]) == sorted("y" * i for i in range(1, 6))
+    assert engine.stats() == {"batches": 2, "queries": 6, "mean_batch": 3.0, "max_batch": 5}
+    assert engine.embed_documents(["a", "b"]) == DeterministicFakeEmbedding(size=4).embed_documents(["a", "b"])
+
+
+def test_micro_batcher_propagates_errors():
+    def embed_many(texts):
+        raise RuntimeError("model not loaded")
+
+    engine = BatchingEmbeddings(DeterministicFakeEmbedding(size=4), max_batch=4)
+    engine.batcher.embed_many = embed_many
+    with pytest.raises(RuntimeError, match="model not loaded"):
+        engine.embed_query("x")
+
+
+def test_parity_and_threads(monkeypatch):
+    vectors = [[1.0, 0.0], [0.6, 0.8]]
+    same = parity(vectors, [[2.0, 0.0], [0.6, 0.8]])
+    assert same["min_cosine"] == pytest.approx(1.0) and same["max_abs_diff"] == pytest.approx(0.0)
+    assert parity(vectors, [[0.0, 1.0], [0.6, 0.8]])["min_cosine"] == pytest.approx(0.0)
+
+    monkeypatch.setattr(embeddings.os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert embedding_threads(DEFAULT_EMBEDDING_CONFIG) == 2
+    assert embedding_threads(replace(DEFAULT_EMBEDDING_CONFIG, num_threads=3)) == 3
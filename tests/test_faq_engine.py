@@ -0,0 +1,88 @@
+# tests/test_faq_engine.py
+import pytest
+
+from educhat.config import FaqConfig
+from educhat.faq_engine import FaqEngine, FaqKnowledge
+
+
+@pytest.fixture
+def kb():
+    return FaqKnowledge(
+        classroom="PB-A02",
+        sessions=[("Monday", "17h00", "19h00"), ("Wednesday", "16h00", "19h00")],
+        term_weights={"first": 50.0, "second": 50.0},
+        components={
+            "first": {"quizzes": 7.5, "midterm theory": 10.0, "midterm practice": 15.0},
+            "second": {"quizzes": 7.5, "final project": 25.0},
+        },
+        units={1: ("Fundamentals", ["ER model", "Normalization"]), 2: ("SQL", ["DDL", "DML"])},
+        textbook='"Database System Concepts"',
+    )
+
+
+@pytest.fixture
+def engine(kb):
+    return FaqEngine(kb, FaqConfig(misses_path=None))
+
+
+@pytest.mark.parametrize(
+    "question, intent, slots, expected",
+    [
+        ("What time does the Monday class start?", "schedule", {"day": "monday"}, "from 17h00 to 19h00"),
+        ("Is there class on Sunday?", "schedule", {"day": "sunday"}, "There is no class on Sunday"),
+        ("Where is the classroom?", "location", {}, "PB-A02"),
+        (
+            "weight of the quizzes in the second term",
+            "weight",
+            {"component": "quizzes", "term": "second"},
+            "7.5% of the final grade in the second term",
+        ),
+        ("How much is the final project worth?", "weight", {"component": "final project"}, "25%"),
+        ("How much is the midterm worth?", "weight", {"component": "midterm"}, "25% of the final grade"),
+        ("What is the grading scheme?", "scheme", {}, "evaluated in 2 terms"),
+        ("What is in unit 2?", "unit", {"unit": "2"}, "UC2: SQL. Topics: DDL; DML."),
+        ("Which textbook do we use?", "books", {}, "Database System Concepts"),
+        ("When is the midterm?", "exam_date", {}, "not specified"),
+    ],
+)
+def test_intent_and_slots(engine, question, intent, slots, expected):
+    found = engine.answer(question)
+    assert found is not None
+    assert (found.intent, found.slots) == (intent, slots)
+    assert expected in found.answer
+
+
+def test_accents_and_case_are_ignored(engine):
+    assert engine.match("WHAT TIME does the mónday class start").slots == {"day": "monday"}
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "If I get 5 in the midterm what do I need in the final project?",  # condicional
+        "How much are quizzes and the final project worth?",               # varios componentes
+        "What is the weight of the lab reports?",                          # componente desconocido
+        "tell me a joke",
+    ],
+)
+def test_unmatched_questions_go_to_the_llm(engine, question):
+    assert engine.answer(question) is None
+    assert engine.stats()["misses"] == 1
+
+
+def test_disabled_engine_never_answers(kb):
+    engine = FaqEngine(kb, FaqConfig(enabled=False, misses_path=None))
+    assert engine.answer("Where is the classroom?") is None
+
+
+def test_tracked_misses_are_bounded(kb):
+    engine = FaqEngine(kb, FaqConfig(misses_path=None, max_tracked_misses=10))
+    for _ in range(3):
+        engine.answer("tell me a joke")
+    for i in range(50):
+        engine.answer(f"random question {i}")
+
+    stats = engine.stats()
+    assert stats["misses"] == 53
+    assert len(engine._top_misses) <= 10
+    assert stats["top_misses"][0] == ("tell me a joke", 3)
@@ -0,0 +1,54 @@
+# tests/test_incremental_index.py
+from educhat.rag_store import current_index_version, load_manifest, load_vector_store, update_vector_store
+
+
+def _chunks(persist_dir: str) -> dict:
+    return {source: len(entry["chunks"]) for source, entry in load_manifest(persist_dir)["files"].items()}
+
+
+def _vectors(persist_dir: str) -> int:
+    return load_vector_store(persist_dir).index.ntotal
+
+
+def test_first_build_then_up_to_date(index_dir, make_doc):
+    sources = [("keys.txt", make_doc("primary keys")), ("sql.txt", make_doc("joins"))]
+    first = update_vector_store(sources, persist_dir=index_dir)
+    assert first["published"] and first["removed"] == 0 and first["unchanged"] == 0
+    assert first["added"] == sum(_chunks(index_dir).values()) == _vectors(index_dir)
+
+    again = update_vector_store(sources, persist_dir=index_dir)
+    assert not again["published"]
+    assert again["added"] == again["removed"] == again["files_changed"] == 0
+    assert again["version"] == first["version"] == current_index_version(index_dir)
+
+
+def test_changed_file_only_reembeds_its_chunks(index_dir, make_doc):
+    update_vector_store([("keys.txt", make_doc("primary keys")), ("sql.txt", make_doc("joins"))], persist_dir=index_dir)
+    before = _chunks(index_dir)
+
+    edited = make_doc("joins").replace("part 2.", "part 2, with an extra example.")
+    summary = update_vector_store([("keys.txt", make_doc("primary keys")), ("sql.txt", edited)], persist_dir=index_dir)
+
+    assert summary["published"] and summary["files_changed"] == 1
+    assert summary["added"] >= 1 and summary["added"] == summary["removed"]
+    assert summary["unchanged"] == sum(before.values()) - summary["removed"]
+    assert _vectors(index_dir) == sum(_chunks(index_dir).values())
+
+
+def test_removed_file_drops_its_vectors(index_dir, make_doc):
+    update_vector_store([("keys.txt", make_doc("primary keys")), ("sql.txt", make_doc("joins"))], persist_dir=index_dir)
+    before = _chunks(index_dir)
+
+    summary = update_vector_store([("keys.txt", make_doc("primary keys"))], persist_dir=index_dir)
+
+    assert summary["removed"] == before["sql.txt"] and summary["added"] == 0
+    assert _chunks(index_dir) == {"keys.txt": before["keys.txt"]}
+    assert _vectors(index_dir) == before["keys.txt"]
+
+
+def test_force_rebuilds_everything(index_dir, make_doc):
+    sources = [("keys.txt", make_doc("primary keys"))]
+    first = update_vector_store(sources, persist_dir=index_dir)
+    forced = update_vector_store(sources, persist_dir=index_dir, force=True)
+    assert forced["published"] and forced["added"] == first["added"] and forced["unchanged"] == 0
+    assert forced["version"] != first["version"]
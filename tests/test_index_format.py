@@ -0,0 +1,96 @@
+# tests/test_index_format.py
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from educhat.index_format import (
+    CHUNKS_FILE,
+    VECTORS_FILE,
+    SqliteDocstore,
+    WritableSqliteDocstore,
+    has_index,
+    load_index,
+    save_index,
+)
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+
+@pytest.fixture
+def saved(tmp_path):
+    docs = [
+        Document(page_content=f"chunk {i} about joins", metadata={"source": "joins.txt", "n": i, "tag": "ñ"})
+        for i in range(6)
+    ]
+    vectordb = FAISS.from_documents(docs, EMBEDDINGS, ids=[f"id{i}" for i in range(6)])
+    index_dir = str(tmp_path / "v1")
+    save_index(vectordb, index_dir)
+    return vectordb, index_dir
+
+
+def test_save_writes_no_pickle_and_load_round_trips(saved):
+    vectordb, index_dir = saved
+    assert has_index(index_dir)
+    assert sorted(os.listdir(index_dir)) == sorted([VECTORS_FILE, CHUNKS_FILE])
+
+    loaded = load_index(index_dir, EMBEDDINGS)
+    assert isinstance(loaded.docstore, SqliteDocstore)
+    assert loaded.index_to_docstore_id == vectordb.index_to_docstore_id
+    doc = loaded.docstore.search("id3")
+    assert (doc.id, doc.page_content, doc.metadata) == ("id3", "chunk 3 about joins", {"source": "joins.txt", "n": 3, "tag": "ñ"})
+    assert isinstance(loaded.docstore.search("missing"), str)
+
+    query = np.asarray([EMBEDDINGS.embed_query("joins")], dtype=np.float32)
+    assert (loaded.index.search(query, 3)[1] == vectordb.index.search(query, 3)[1]).all()
+
+
+def test_mismatched_files_are_rejected(saved):
+    _, index_dir = saved
+    conn = sqlite3.connect(os.path.join(index_dir, CHUNKS_FILE))
+    conn.execute("UPDATE meta SET value = '5' WHERE key = 'count'")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match="do not match"):
+        load_index(index_dir, EMBEDDINGS)
+
+
+def test_unknown_format_version_is_rejected(saved):
+    _, index_dir = saved
+    conn = sqlite3.connect(os.path.join(index_dir, CHUNKS_FILE))
+    conn.execute("UPDATE meta SET value = '99' WHERE key = 'format_version'")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match="Unsupported index format"):
+        load_index(index_dir, EMBEDDINGS)
+
+
+def test_writable_copy_leaves_the_published_index_untouched(saved, tmp_path):
+    _, index_dir = saved
+    work_path = str(tmp_path / "work.sqlite3")
+    writable = load_index(index_dir, EMBEDDINGS, writable=True, work_path=work_path)
+    assert isinstance(writable.docstore, WritableSqliteDocstore)
+
+    writable.add_texts(["a new chunk about views"], metadatas=[{"source": "views.txt"}], ids=["new"])
+    writable.delete(["id0", "id1"])
+    next_dir = str(tmp_path / "v2")
+    save_index(writable, next_dir)
+    writable.docstore.close()
+    assert not os.path.exists(work_path)
+
+    old, new = load_index(index_dir, EMBEDDINGS), load_index(next_dir, EMBEDDINGS)
+    assert old.index.ntotal == 6 and new.index.ntotal == 5
+    assert isinstance(old.docstore.search("new"), str)
+    assert new.docstore.search("new").page_content == "a new chunk about views"
+    assert isinstance(new.docstore.search("id0"), str)
+    assert sorted(new.index_to_docstore_id.values()) == ["id2", "id3", "id4", "id5", "new"]
+
+
+def test_writable_in_memory_without_work_path(saved):
+    vectordb, index_dir = saved
+    writable = load_index(index_dir, EMBEDDINGS, writable=True)
+    assert writable.docstore.search("id5").page_content == vectordb.docstore.search("id5").page_content
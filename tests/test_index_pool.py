@@ -0,0 +1,102 @@
+# tests/test_index_pool.py
+import threading
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from educhat import index_pool
+from educhat.config import DEFAULT_COURSE_CONFIG
+from educhat.courses import Course
+from educhat.index_pool import IndexPool
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """Cursos falsos: versión publicada y tamaño de cada índice, y las cargas hechas."""
+    state = SimpleNamespace(versions={}, sizes={}, loads=[], delay=0.0)
+
+    def load(config, persist_dir, course_id):
+        time.sleep(state.delay)
+        state.loads.append(course_id)
+        return SimpleNamespace(course_id=course_id, index_version=state.versions.get(course_id, "v1"))
+
+    monkeypatch.setattr(index_pool, "get_course", lambda cid: Course(cid, cid, f"raw/{cid}", cid))
+    monkeypatch.setattr(index_pool, "current_index_version", lambda d: state.versions.get(d, "v1"))
+    monkeypatch.setattr(index_pool, "index_bytes", lambda d: state.sizes.get(d, 100))
+    monkeypatch.setattr(index_pool, "load_hybrid_retriever", load)
+    return state
+
+
+def _pool(**overrides) -> IndexPool:
+    return IndexPool(replace(DEFAULT_COURSE_CONFIG, prefetch_interval_seconds=0, **overrides))
+
+
+def _loaded(pool: IndexPool):
+    return list(pool.stats()["loaded"])
+
+
+def test_least_recently_used_course_is_evicted(disk):
+    pool = _pool(max_loaded=2)
+    for course in ("os", "databases", "os", "networks"):
+        pool.get(course)
+    assert _loaded(pool) == ["os", "networks"]
+    assert disk.loads == ["os", "databases", "networks"]
+    assert (pool.hits, pool.evictions) == (1, 1)
+
+    pool.get("databases")  # expulsado: se vuelve a cargar
+    assert disk.loads[-1] == "databases" and _loaded(pool) == ["networks", "databases"]
+
+
+def test_byte_budget(disk):
+    disk.sizes = {"os": 600, "databases": 300, "networks": 300}
+    pool = _pool(max_loaded=10, max_bytes=1000)
+    for course in ("os", "databases", "networks"):
+        pool.get(course)
+    assert _loaded(pool) == ["databases", "networks"] and pool.stats()["bytes"] == 600
+
+
+def test_leased_index_is_not_evicted_until_released(disk):
+    pool = _pool(max_loaded=1)
+    with pool.lease("os") as retriever:
+        with pool.lease("databases"):
+            assert _loaded(pool) == ["os", "databases"]  # por encima del límite, pero los dos en uso
+        # Al soltar "databases" se expulsa ese, aunque "os" sea el menos reciente
+        assert _loaded(pool) == ["os"] and retriever.course_id == "os"
+    pool.get("networks")
+    assert _loaded(pool) == ["networks"] and pool.evictions == 2
+
+
+def test_new_version_is_loaded_and_old_lease_keeps_working(disk):
+    pool = _pool()
+    with pool.lease("os") as old:
+        disk.versions["os"] = "v2"
+        new = pool.get("os")
+        assert (old.index_version, new.index_version) == ("v1", "v2")
+    assert pool.reloads == 1 and pool.stats()["loaded"]["os"]["version"] == "v2"
+    assert pool.get("os") is new
+
+
+def test_concurrent_requests_load_a_cold_course_once(disk):
+    disk.delay = 0.05
+    pool = _pool()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("os"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert disk.loads == ["os"] and len({id(r) for r in results}) == 1 and pool.hits == 7
+
+
+def test_prefetch_loads_hot_courses_that_fit(disk):
+    pool = _pool(max_loaded=2, prefetch_hot=3)
+    for course in ("os", "os", "os", "networks", "networks", "databases"):
+        pool.touch(course)
+    assert pool.hot_courses(3) == ["os", "networks", "databases"]
+
+    pool.get("algebra")
+    assert pool.prefetch_hot() == 1  # solo cabe uno más sin expulsar "algebra"
+    pool._prefetcher.shutdown(wait=True)
+    assert sorted(_loaded(pool)) == ["algebra", "os"] and pool.evictions == 0
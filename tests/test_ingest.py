@@ -0,0 +1,120 @@
+# tests/test_ingest.py
+from dataclasses import replace
+
+from educhat.config import DEFAULT_INGEST_CONFIG
+from educhat.data_loader import TxtSources
+from educhat.ingest import Deduplicator, normalize_text
+from educhat.rag_store import load_manifest, load_vector_store, update_vector_store
+
+TEXT = (
+    "Second normal form removes partial dependencies: every non-key attribute must depend "
+    "on the whole primary key and not only on a part of a composite key."
+)
+
+
+def _deduplicator(mode: str) -> Deduplicator:
+    return Deduplicator(replace(DEFAULT_INGEST_CONFIG, dedup=mode))
+
+
+def test_normalize_text():
+    assert normalize_text("ﬁrst line   \r\n\n\n\nsecond\n") == "first line\n\nsecond"
+
+
+def test_exact_duplicates_ignore_case_and_punctuation():
+    dedup = _deduplicator("exact")
+    kind, original, key, sig = dedup.check(TEXT)
+    assert kind is None
+    dedup.add("a", key, sig)
+
+    kind, original, _, _ = dedup.check(TEXT.upper().replace(":", ";"))
+    assert (kind, original) == ("exact", "a")
+
+
+def test_near_duplicates():
+    dedup = _deduplicator("near")
+    _, _, key, sig = dedup.check(TEXT)
+    dedup.add("a", key, sig)
+
+    kind, original, _, _ = dedup.check(TEXT.replace("composite key.", "composite key (see UC1)."))
+    assert (kind, original) == ("near", "a")
+    assert dedup.check("Joins combine rows from two or more tables on a related column.")[0] is None
+    # Con dedup exacto, un cambio de texto ya no es duplicado
+    exact = _deduplicator("exact")
+    _, _, key, sig = exact.check(TEXT)
+    exact.add("a", key, sig)
+    assert exact.check(TEXT.replace("composite key.", "composite key (see UC1)."))[0] is None
+
+
+def test_inactive_entries_are_not_originals(tmp_path):
+    dedup = _deduplicator("near")
+    _, _, key, sig = dedup.check(TEXT)
+    dedup.add("a", key, sig)
+    path = str(tmp_path / "dedup.npz")
+    dedup.save(path, keep={"a"})
+
+    loaded = _deduplicator("near")
+    assert loaded.load(path) == 1
+    assert loaded.check(TEXT)[0] is None
+    loaded.activate("a")
+    assert loaded.check(TEXT)[:2] == ("exact", "a")
+
+
+def test_duplicate_chunks_are_not_embedded_twice(index_dir, make_doc):
+    text = make_doc("normal forms")
+    summary = update_vector_store([("a.txt", text), ("copy.txt", text)], persist_dir=index_dir)
+    assert summary["duplicates"] == summary["added"]
+    assert load_vector_store(index_dir).index.ntotal == summary["added"]
+    assert summary["ingest"]["embedded"] == summary["added"]
+
+
+def test_txt_sources_are_read_lazily_and_repeatedly(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.txt").write_text("first", encoding="utf-8")
+    (tmp_path / "sub" / "b.txt").write_text("second", encoding="utf-8")
+    (tmp_path / "notes.md").write_text("ignored", encoding="utf-8")
+
+    sources = TxtSources(str(tmp_path))
+    assert len(sources) == 2
+    assert sorted(text for _, text in sources) == ["first", "second"]
+    assert sorted(text for _, text in sources) == ["first", "second"]
+
+
+def _texts(persist_dir):
+    store = load_vector_store(persist_dir)
+    return {store.docstore.search(cid).page_content for cid in store.index_to_docstore_id.values()}
+
+
+def test_duplicates_are_reindexed_when_their_original_is_edited(index_dir, make_doc):
+    shared, other = make_doc("normal forms"), make_doc("joins")
+    update_vector_store([("a.txt", shared), ("copy.txt", shared), ("b.txt", other)], persist_dir=index_dir)
+    before = _texts(index_dir)
+
+    update_vector_store([("a.txt", make_doc("indexes")), ("copy.txt", shared), ("b.txt", other)], persist_dir=index_dir)
+
+    assert before <= _texts(index_dir)
+    files = load_manifest(index_dir)["files"]
+    assert files["copy.txt"]["chunks"] and files["copy.txt"]["duplicates"] == 0
+    assert load_vector_store(index_dir).index.ntotal == sum(len(e["chunks"]) for e in files.values())
+
+
+def test_duplicates_are_reindexed_when_their_original_is_removed(index_dir, make_doc):
+    shared = make_doc("normal forms")
+    first = update_vector_store([("a.txt", shared), ("copy.txt", shared)], persist_dir=index_dir)
+    assert first["duplicates"] == first["added"]
+
+    summary = update_vector_store([("copy.txt", shared)], persist_dir=index_dir)
+
+    assert summary["added"] == summary["removed"] == first["added"]
+    assert load_vector_store(index_dir).index.ntotal == first["added"]
+    assert load_manifest(index_dir)["files"]["copy.txt"]["duplicates"] == 0
+
+
+def test_unrelated_changes_do_not_reindex_duplicates(index_dir, make_doc):
+    shared = make_doc("normal forms")
+    update_vector_store([("a.txt", shared), ("copy.txt", shared), ("b.txt", make_doc("joins"))], persist_dir=index_dir)
+
+    summary = update_vector_store(
+        [("a.txt", shared), ("copy.txt", shared), ("b.txt", make_doc("subqueries"))], persist_dir=index_dir
+    )
+    assert summary["files_changed"] == 1
+    assert load_manifest(index_dir)["files"]["copy.txt"]["chunks"] == []
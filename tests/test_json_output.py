@@ -0,0 +1,77 @@
+# tests/test_json_output.py
+import json
+
+import pytest
+
+from educhat.json_output import AnswerStream, repair_answer, validate_answer
+
+VALID = {"answer": "A key.", "key_points": ["unique", "not null"], "references": ["UC1"]}
+
+
+def test_valid_json_is_kept_as_is():
+    fixed, repaired = repair_answer(json.dumps(VALID))
+    assert json.loads(fixed) == VALID
+    assert not repaired
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "```json\n" + json.dumps(VALID) + "\n```",
+        "Sure! Here is the answer:\n" + json.dumps(VALID) + "\nHope it helps.",
+        '{"answer": "A key.", "key_points": ["unique", "not null",], "references": ["UC1",],}',
+    ],
+    ids=["fenced", "surrounding-text", "trailing-commas"],
+)
+def test_common_model_mistakes_are_repaired(raw):
+    fixed, repaired = repair_answer(raw)
+    assert json.loads(fixed) == VALID
+    assert repaired
+
+
+def test_wrong_types_are_normalized():
+    raw = json.dumps({"answer": "A key.", "key_points": "- unique\n- not null", "references": None})
+    fixed, repaired = repair_answer(raw)
+    assert json.loads(fixed) == {"answer": "A key.", "key_points": ["unique", "not null"], "references": []}
+    assert repaired
+
+
+def test_plain_text_becomes_the_answer():
+    fixed, repaired = repair_answer("A primary key identifies each row.")
+    assert json.loads(fixed) == {"answer": "A primary key identifies each row.", "key_points": [], "references": []}
+    assert repaired
+    assert validate_answer(json.loads(fixed)) == []
+
+
+def test_empty_references_fall_back_to_context_sources():
+    raw = json.dumps({"answer": "A key.", "key_points": [], "references": []})
+    fixed, _ = repair_answer(raw, sources=["uc1_content.txt · 10. KEYS"])
+    assert json.loads(fixed)["references"] == ["uc1_content.txt · 10. KEYS"]
+
+    fixed, _ = repair_answer(json.dumps(VALID), sources=["uc1_content.txt · 10. KEYS"])
+    assert json.loads(fixed)["references"] == ["UC1"]
+
+
+def test_validate_answer_reports_problems():
+    assert validate_answer(VALID) == []
+    assert validate_answer([]) == ["not a JSON object"]
+    assert validate_answer({"answer": 1, "key_points": [1], "references": []}) == [
+        "answer must be a string",
+        "key_points must be a list of strings",
+    ]
+
+
+def _stream(chunks):
+    stream = AnswerStream()
+    return "".join(stream.feed(chunk) for chunk in chunks)
+
+
+def test_answer_stream_yields_only_the_answer_field():
+    raw = json.dumps({"key_points": ["a \"b\""], "answer": "Line 1\nA \"key\" \\ 😀", "references": ["r"]})
+    assert _stream(raw) == "Line 1\nA \"key\" \\ 😀"  # carácter a carácter
+    assert _stream([raw[i:i + 7] for i in range(0, len(raw), 7)]) == "Line 1\nA \"key\" \\ 😀"
+    assert _stream(["```json\n", raw, "\n```"]) == "Line 1\nA \"key\" \\ 😀"
+
+
+def test_answer_stream_passes_plain_text_through():
+    assert _stream(["  A draft", " about {joins}"]) == "  A draft about {joins}"
@@ -0,0 +1,54 @@
+# tests/test_llm_factory.py
+import os
+from dataclasses import replace
+
+import pytest
+
+from educhat.config import DEFAULT_CONFIG_LOW_TEMP
+from educhat.json_output import ANSWER_SCHEMA
+from educhat.llm_factory import make_hf_llm, make_json_llm, ollama_options
+from educhat import prompts
+
+
+def test_max_new_tokens_is_sent_as_num_predict():
+    options = ollama_options(DEFAULT_CONFIG_LOW_TEMP)
+    assert options["num_predict"] == DEFAULT_CONFIG_LOW_TEMP.max_new_tokens == 512
+    assert options["num_ctx"] == 4096
+    assert ollama_options(replace(DEFAULT_CONFIG_LOW_TEMP, num_predict=-1))["num_predict"] == -1
+
+
+def test_text_and_json_llms_share_the_options_that_keep_the_kv_cache():
+    text = make_hf_llm(DEFAULT_CONFIG_LOW_TEMP)
+    structured = make_json_llm(replace(DEFAULT_CONFIG_LOW_TEMP, temperature=0.0), ANSWER_SCHEMA)
+
+    for llm in (text, structured):
+        assert (llm.num_ctx, llm.num_predict, llm.keep_alive) == (4096, 512, "30m")
+    assert text.format is None and structured.format == ANSWER_SCHEMA
+    # Un solo pool de conexiones HTTP por host de Ollama
+    assert structured._client is text._client and structured._async_client is text._async_client
+
+
+COURSE = {"course_name": "Databases", "course_info": prompts.DATABASES_COURSE_INFO}
+REQUESTS = [
+    {"user_input": "What is a primary key?", "history": "", "retrieved_context": "[uc1.txt · Keys]\nA key..."},
+    {"user_input": "Quiz me on joins", "history": "User: hi\nAgent: hello", "retrieved_context": "[uc2.txt · Joins]"},
+]
+
+
+@pytest.mark.parametrize("name", sorted(prompts.PROMPT_LAYOUTS))
+def test_prompts_start_with_the_same_prefix_on_every_request(name):
+    prefix, suffix = prompts.PROMPT_LAYOUTS[name]
+    template = prompts._layout(prefix, suffix, [])
+    rendered = [template.format(**COURSE, **values) for values in REQUESTS]
+
+    # Todo lo que cambia entre peticiones va después del prefijo fijo del curso
+    fixed = prefix.strip().format(**COURSE)
+    assert all(text.startswith(fixed) for text in rendered)
+    assert os.path.commonprefix(rendered).startswith(fixed)
+    assert all(values["user_input"] not in fixed for values in REQUESTS)
+
+
+def test_prompt_variables_are_only_in_the_suffix():
+    for name, (prefix, suffix) in prompts.PROMPT_LAYOUTS.items():
+        assert "{user_input}" in suffix and "{user_input}" not in prefix, name
+        assert "{history}" not in prefix and "{retrieved_context}" not in prefix, name
@@ -0,0 +1,219 @@
+# tests/test_llm_scheduler.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from educhat.config import SchedulerConfig
+from educhat.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_FAQ,
+    PRIORITY_GENERATION,
+    PRIORITY_ROUTER,
+    LLMScheduler,
+    QueueFull,
+)
+
+
+def _scheduler(**overrides) -> LLMScheduler:
+    values = {"max_in_flight": 1, "max_queue": 8, "queue_timeout_seconds": 5}
+    values.update(overrides)
+    return LLMScheduler(SchedulerConfig(**values))
+
+
+def _wait_queued(scheduler: LLMScheduler, n: int) -> None:
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["queued"] < n:
+        assert time.monotonic() < deadline, "requests never reached the queue"
+        time.sleep(0.005)
+
+
+def test_queued_requests_run_by_priority():
+    scheduler = _scheduler()
+    order = []
+
+    def call(priority, name):
+        with scheduler.slot(priority, session=name):
+            order.append(name)
+
+    threads = []
+    with scheduler.slot(PRIORITY_GENERATION, session="holder"):
+        for priority, name in [
+            (PRIORITY_BACKGROUND, "summary"),
+            (PRIORITY_GENERATION, "concept"),
+            (PRIORITY_FAQ, "faq"),
+            (PRIORITY_ROUTER, "router"),
+        ]:
+            thread = threading.Thread(target=call, args=(priority, name))
+            thread.start()
+            threads.append(thread)
+            _wait_queued(scheduler, len(threads))
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["router", "faq", "concept", "summary"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_sessions_with_less_load_go_first():
+    scheduler = _scheduler()
+    order = []
+
+    def call(name):
+        with scheduler.slot(PRIORITY_GENERATION, session=name):
+            order.append(name)
+
+    threads = []
+    with scheduler.slot(PRIORITY_GENERATION, session="busy"):
+        for name in ("busy", "other"):
+            thread = threading.Thread(target=call, args=(name,))
+            thread.start()
+            threads.append(thread)
+            _wait_queued(scheduler, len(threads))
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["other", "busy"]
+
+
+def test_full_queue_is_rejected():
+    scheduler = _scheduler(max_queue=1)
+    with scheduler.slot(session="a"):
+        waiter = threading.Thread(target=lambda: scheduler.slot(session="b").__enter__())
+        waiter.daemon = True
+        waiter.start()
+        _wait_queued(scheduler, 1)
+
+        assert scheduler.saturated()
+        with pytest.raises(QueueFull):
+            with scheduler.slot(session="c"):
+                pass
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_queue_timeout_raises_and_leaves_the_queue():
+    scheduler = _scheduler(queue_timeout_seconds=0.05)
+    with scheduler.slot(session="a"):
+        with pytest.raises(QueueFull):
+            with scheduler.slot(session="b"):
+                pass
+        stats = scheduler.stats()
+        assert stats["queued"] == 0 and stats["timeouts"] == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_cancelled_aslot_does_not_leak_the_slot():
+    scheduler = _scheduler()
+
+    async def waiter():
+        async with scheduler.aslot(session="b"):
+            pass
+
+    async def main():
+        async with scheduler.aslot(session="a"):
+            task = asyncio.create_task(waiter())
+            while scheduler.stats()["queued"] < 1:
+                await asyncio.sleep(0.005)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        # El hilo que esperaba sale de la cola sin llegar a tomar el hueco
+        for _ in range(200):
+            if scheduler.stats()["queued"] == 0:
+                break
+            await asyncio.sleep(0.005)
+        async with scheduler.aslot(session="c"):
+            assert scheduler.stats()["in_flight"] == 1
+
+    asyncio.run(main())
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_cancelled_aslot_releases_a_slot_granted_before_it_resumed():
+    scheduler = _scheduler()
+
+    async def waiter():
+        async with scheduler.aslot(session="b"):
+            pass
+
+    async def main():
+        async with scheduler.aslot(session="a"):
+            task = asyncio.create_task(waiter())
+            while scheduler.stats()["queued"] < 1:
+                await asyncio.sleep(0.005)
+        # Al salir, el hueco pasa a la tarea; se cancela antes de que llegue a reanudarse
+        assert scheduler.stats()["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_aslot_waiters_do_not_hold_threads():
+    scheduler = _scheduler(max_queue=64)
+    order = []
+
+    async def call(priority, name):
+        async with scheduler.aslot(priority, session=name):
+            order.append(name)
+
+    async def main():
+        async with scheduler.aslot(session="holder"):
+            threads = threading.active_count()
+            tasks = [asyncio.create_task(call(PRIORITY_GENERATION, f"s{i}")) for i in range(50)]
+            tasks.append(asyncio.create_task(call(PRIORITY_ROUTER, "router")))
+            while scheduler.stats()["queued"] < 51:
+                await asyncio.sleep(0.005)
+            assert threading.active_count() == threads
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order[0] == "router" and len(order) == 51
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_aslot_timeout_raises_queue_full():
+    scheduler = _scheduler(queue_timeout_seconds=0.05)
+
+    async def main():
+        async with scheduler.aslot(session="a"):
+            with pytest.raises(QueueFull):
+                async with scheduler.aslot(session="b"):
+                    pass
+
+    asyncio.run(main())
+    stats = scheduler.stats()
+    assert stats == {**stats, "in_flight": 0, "queued": 0, "timeouts": 1}
+
+
+def test_threads_and_async_tasks_share_the_queue():
+    scheduler = _scheduler()
+    order = []
+
+    def thread_call():
+        with scheduler.slot(PRIORITY_FAQ, session="thread"):
+            order.append("thread")
+
+    async def task_call():
+        async with scheduler.aslot(PRIORITY_ROUTER, session="task"):
+            order.append("task")
+
+    async def main():
+        async with scheduler.aslot(session="holder"):
+            thread = threading.Thread(target=thread_call)
+            thread.start()
+            while scheduler.stats()["queued"] < 1:
+                await asyncio.sleep(0.005)
+            task = asyncio.create_task(task_call())
+            while scheduler.stats()["queued"] < 2:
+                await asyncio.sleep(0.005)
+        await task
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(main())
+    assert order == ["task", "thread"]
+    assert scheduler.stats()["in_flight"] == 0
@@ -0,0 +1,82 @@
+# tests/test_local_router.py
+import re
+import zlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from educhat.config import DEFAULT_ROUTER_CONFIG
+from educhat.local_router import MODES, PROTOTYPES, LocalRouter
+from educhat.router_eval import EVAL_SET, _evaluate
+
+
+class _BagOfWords(Embeddings):
+    """Bolsa de palabras (prefijos de 5 letras) en 256 cubetas: léxica y sin modelo, pero estable."""
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(256)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[zlib.crc32(word[:5].encode()) % 256] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+@pytest.fixture
+def router():
+    return LocalRouter(DEFAULT_ROUTER_CONFIG, embeddings=_BagOfWords())
+
+
+def test_classifies_the_eval_set(router):
+    decisions = [router.classify(question) for question, _ in EVAL_SET]
+    correct = sum(d.mode == expected for d, (_, expected) in zip(decisions, EVAL_SET))
+    assert correct / len(EVAL_SET) >= 0.85
+    # Cada modo se reconoce en la mayoría de sus preguntas
+    for mode in MODES:
+        own = [d.mode for d, (_, expected) in zip(decisions, EVAL_SET) if expected == mode]
+        assert own.count(mode) > len(own) / 2
+
+
+def test_prototypes_route_to_their_own_mode(router):
+    for mode, questions in PROTOTYPES.items():
+        for question in questions:
+            assert router.classify(question).mode == mode, question
+
+
+def test_confidence_is_the_softmax_probability_of_the_winner(router):
+    decision = router.classify("Quiz me on joins, give me 3 exercises")
+    assert decision.mode == "practice" and decision.source == "local"
+    logits = np.array([decision.scores[m] for m in MODES]) / DEFAULT_ROUTER_CONFIG.temperature
+    probs = np.exp(logits - logits.max())
+    assert decision.confidence == pytest.approx(probs.max() / probs.sum(), abs=1e-3)
+    assert decision.confidence > DEFAULT_ROUTER_CONFIG.confidence_threshold
+
+
+def test_keywords_add_a_bonus(router):
+    vector = router._embeddings.embed_query("tables and rows")
+    plain = router.classify("tables and rows", vector=vector)
+    with_keyword = router.classify("practice tables and rows", vector=vector)  # mismo embedding
+    assert with_keyword.scores["practice"] > plain.scores["practice"]
+    assert with_keyword.scores["faq"] == plain.scores["faq"]
+
+
+def test_precomputed_vector_skips_the_embedding(router, monkeypatch):
+    router.classify("warm up")  # prototipos ya calculados
+    monkeypatch.setattr(router._embeddings, "embed_query", lambda text: pytest.fail("embedded twice"))
+    vector = _BagOfWords().embed_query("What is a foreign key?")
+    assert router.classify("What is a foreign key?", vector=vector).mode == "concept"
+
+
+def test_evaluate_reports_accuracy_and_confusion(capsys):
+    report = _evaluate("always-concept", lambda question: "concept")
+    concept = sum(1 for _, expected in EVAL_SET if expected == "concept")
+    assert report["accuracy"] == concept / len(EVAL_SET)
+    assert report["confusion"]["faq"]["concept"] == sum(1 for _, e in EVAL_SET if e == "faq")
+    assert len(report["errors"]) == len(EVAL_SET) - concept
+    assert "always-concept" in capsys.readouterr().out
@@ -0,0 +1,126 @@
+# tests/test_log_writer.py
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+
+from educhat.config import LoggingConfig
+from educhat.log_writer import LogWriter, interaction_record
+
+
+def _config(tmp_path, **overrides) -> LoggingConfig:
+    return LoggingConfig(dir=str(tmp_path), flush_interval_seconds=0.01, **overrides)
+
+
+def _records(path: str):
+    """Registros del fichero actual y de los rotados (.gz), en orden cronológico."""
+    base, ext = os.path.splitext(path)
+    out = []
+    for rotated in sorted(glob.glob(f"{base}-*{ext}*")):
+        opener = gzip.open if rotated.endswith(".gz") else open
+        with opener(rotated, "rt", encoding="utf-8") as f:
+            out += [json.loads(line) for line in f]
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            out += [json.loads(line) for line in f]
+    return out
+
+
+def test_records_are_written_in_order(tmp_path):
+    writer = LogWriter(_config(tmp_path))
+    path = str(tmp_path / "a" / "events.jsonl")
+    for i in range(50):
+        assert writer.write(path, {"i": i, "text": "ñ"})
+    writer.close()
+
+    assert [r["i"] for r in _records(path)] == list(range(50))
+    assert writer.stats() == {"queued": 0, "written": 50, "dropped": 0, "rotations": 0, "errors": 0}
+    assert not writer.write(path, {"i": 50})  # cerrado
+
+
+def test_rotates_by_size_compresses_and_keeps_the_newest(tmp_path):
+    writer = LogWriter(_config(tmp_path, max_bytes=200, batch_size=1, keep_rotated=3))
+    path = str(tmp_path / "events.jsonl")
+    for i in range(40):
+        writer.write(path, {"i": i, "pad": "x" * 30})
+    writer.close()
+
+    rotated = glob.glob(str(tmp_path / "events-*.jsonl.gz"))
+    assert len(rotated) == 3 and writer.stats()["rotations"] > 3
+    assert os.path.getsize(path) <= 200
+    kept = [r["i"] for r in _records(path)]
+    assert kept == list(range(40 - len(kept), 40))  # los más recientes, sin huecos
+
+
+def test_rotates_by_age(tmp_path):
+    writer = LogWriter(_config(tmp_path, max_age_seconds=0.05, compress=False))
+    path = str(tmp_path / "events.jsonl")
+    writer.write(path, {"i": 0})
+    time.sleep(0.15)
+    writer.write(path, {"i": 1})
+    writer.close()
+
+    assert writer.stats()["rotations"] == 1
+    assert len(glob.glob(str(tmp_path / "events-*.jsonl"))) == 1
+    assert [r["i"] for r in _records(path)] == [0, 1]
+
+
+class _StuckWriter(LogWriter):
+    """Escritor cuyo primer volcado espera a `release`: la cola se llena."""
+
+    def __init__(self, config):
+        self.release = threading.Event()
+        self.flushing = threading.Event()
+        super().__init__(config)
+
+    def _flush(self, batch):
+        self.flushing.set()
+        self.release.wait(5)
+        super()._flush(batch)
+
+
+def test_full_queue_drops_and_counts_without_blocking(tmp_path):
+    writer = _StuckWriter(_config(tmp_path, max_queue=5, batch_size=1))
+    path = str(tmp_path / "events.jsonl")
+    writer.write(path, {"i": 0})
+    assert writer.flushing.wait(5)  # el hilo está atascado escribiendo el primero
+
+    start = time.perf_counter()
+    accepted = [writer.write(path, {"i": i}) for i in range(1, 11)]
+    assert time.perf_counter() - start < 0.5
+    assert accepted == [True] * 5 + [False] * 5
+    assert writer.stats()["dropped"] == 5 and writer.stats()["queued"] == 5
+
+    writer.release.set()
+    writer.close()
+    assert [r["i"] for r in _records(path)] == list(range(6))
+    assert writer.stats()["written"] == 6
+
+
+def test_unwritable_path_counts_errors(tmp_path):
+    (tmp_path / "blocker").write_text("not a directory")
+    writer = LogWriter(_config(tmp_path))
+    writer.write(str(tmp_path / "blocker" / "events.jsonl"), {"i": 0})
+    writer.close()
+    assert writer.stats()["errors"] == 1 and writer.stats()["written"] == 0
+
+
+def test_interaction_record_keeps_only_the_configured_fields():
+    state = {
+        "mode": "concept",
+        "cache_hit": False,
+        "user_input": "What is a key?",
+        "retrieved_context": "long context " * 100,
+        "retrieved_ids": ["c1", "c2"],
+        "history": "User: ...",
+    }
+    record = interaction_record("api", "s1", state, ("mode", "context_hash", "chunk_ids"), elapsed_ms=12.345)
+    assert set(record) == {"timestamp", "source", "session_id", "mode", "context_hash", "chunk_ids", "elapsed_ms"}
+    assert len(record["context_hash"]) == 16 and record["chunk_ids"] == ["c1", "c2"]
+    assert record["elapsed_ms"] == 12.3
+
+    # Acierto de caché: el contexto del estado es de otro turno y no se registra
+    cached = interaction_record("api", "s1", dict(state, cache_hit=True), ("context_hash", "chunk_ids"))
+    assert cached["context_hash"] is None and cached["chunk_ids"] is None
@@ -0,0 +1,78 @@
+# tests/test_query_cache.py
+from educhat.query_cache import QueryCache, normalize_query
+from educhat.rag_store import current_index_version, load_lexical_index, load_vector_store, update_vector_store
+from educhat.retrieval import HybridRetriever
+
+
+class _CountingEmbed:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_normalize_query():
+    assert normalize_query("  What is   DDL? ") == normalize_query("what is ddl") == "what is ddl"
+    assert normalize_query("¿Qué es DDL?") == "¿qué es ddl"
+
+
+def test_embedding_is_computed_once_per_normalized_query():
+    cache, embed = QueryCache(8), _CountingEmbed()
+    first = cache.embedding("What is DDL?", embed)
+    assert cache.embedding("what is  ddl", embed) == first
+    assert embed.calls == ["What is DDL?"]
+    stats = cache.stats()["embedding"]
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_primed_embeddings_are_hits():
+    cache, embed = QueryCache(8), _CountingEmbed()
+    cache.prime(["primary keys", "joins"], [[1.0, 0.0], [0.0, 1.0]])
+    assert cache.embedding("Primary keys?", embed) == [1.0, 0.0]
+    assert cache.embedding("JOINS", embed) == [0.0, 1.0]
+    assert embed.calls == [] and cache.stats()["embedding"]["hits"] == 2
+
+
+def test_ids_are_scoped_by_course_k_and_index_version():
+    cache = QueryCache(8)
+    cache.put_ids("joins", 4, ["a", "b"], "databases", "v1")
+    assert cache.get_ids("Joins?", 4, "databases", "v1") == ["a", "b"]
+    assert cache.get_ids("joins", 8, "databases", "v1") is None
+    assert cache.get_ids("joins", 4, "os", "v1") is None
+
+    # Otra versión publicada: los ids viejos no se sirven y se descartan
+    assert cache.get_ids("joins", 4, "databases", "v2") is None
+    assert cache.get_ids("joins", 4, "databases", "v1") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_lru_bound_and_disabled_cache():
+    cache, embed = QueryCache(2), _CountingEmbed()
+    for query in ("q1", "q2", "q1", "q3"):
+        cache.embedding(query, embed)
+    assert embed.calls == ["q1", "q2", "q3"] and cache.stats()["size"] == 2
+    cache.embedding("q2", embed)  # q2 era la menos usada: salió
+    assert embed.calls[-1] == "q2"
+
+    off = QueryCache(0)
+    off.embedding("q1", embed)
+    off.put_ids("q1", 4, ["a"], "databases", "v1")
+    assert off.get_ids("q1", 4, "databases", "v1") is None and off.stats()["size"] == 0
+
+
+def test_retriever_serves_repeated_queries_from_the_cache(index_dir, make_doc):
+    update_vector_store([(f"{t}.txt", make_doc(t)) for t in ("keys", "joins")], persist_dir=index_dir)
+    vectordb = load_vector_store(index_dir)
+    cache = QueryCache(16)
+    retriever = HybridRetriever(
+        vectordb, load_lexical_index(vectordb, index_dir), cache=cache, index_version=current_index_version(index_dir)
+    )
+
+    first = retriever.retrieve("outer joins")
+    again = retriever.retrieve("Outer joins?")
+    assert not first.cached and again.cached
+    assert [doc.id for doc in again.docs] == [doc.id for doc in first.docs]
+    assert set(again.timings_ms) == {"cache", "total"}
+    assert cache.stats()["chunks"]["hits"] == 1 and cache.stats()["embedding"]["misses"] == 1
@@ -0,0 +1,91 @@
+# tests/test_response_cache.py
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from educhat.config import CacheConfig
+from educhat.response_cache import SemanticCache
+
+V1 = "v1"
+QUESTION = "What is a primary key?"
+
+
+def _cache(tmp_path=None, **overrides) -> SemanticCache:
+    values = {"similarity_threshold": 0.92, "ttl_seconds": 3600, "max_entries": 100}
+    if tmp_path is not None:
+        values["path"] = str(tmp_path / "responses.sqlite3")
+    values.update(overrides)
+    return SemanticCache(CacheConfig(**values), embeddings=DeterministicFakeEmbedding(size=64))
+
+
+def test_hit_needs_same_mode_course_and_version():
+    cache = _cache()
+    cache.put(QUESTION, "A column that identifies each row.", "concept", index_version=V1)
+
+    hit = cache.lookup(QUESTION, mode="concept", index_version=V1)
+    assert hit is not None and hit.answer == "A column that identifies each row."
+    assert hit.mode == "concept" and hit.similarity > 0.99
+
+    # Misma pregunta por otra ruta: no se reutiliza
+    assert cache.lookup(QUESTION, mode="practice", index_version=V1) is None
+    assert cache.lookup("Something else entirely", mode="concept", index_version=V1) is None
+
+
+def test_new_index_version_invalidates_entries():
+    cache = _cache()
+    cache.put(QUESTION, "answer", "concept", index_version=V1)
+
+    assert cache.lookup(QUESTION, mode="concept", index_version="v2") is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = _cache(ttl_seconds=10)
+    cache.put(QUESTION, "answer", "concept", index_version=V1)
+
+    now = time.time()
+    monkeypatch.setattr("educhat.response_cache.time.time", lambda: now + 11)
+    assert cache.lookup(QUESTION, mode="concept", index_version=V1) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = _cache(max_entries=2)
+    cache.put("question one", "1", "concept", index_version=V1)
+    cache.put("question two", "2", "concept", index_version=V1)
+    assert cache.lookup("question one", mode="concept", index_version=V1) is not None  # la más reciente
+
+    cache.put("question three", "3", "concept", index_version=V1)
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup("question two", mode="concept", index_version=V1) is None
+    assert cache.lookup("question one", mode="concept", index_version=V1).answer == "1"
+    assert cache.lookup("question three", mode="concept", index_version=V1).answer == "3"
+
+
+def test_empty_answers_and_disabled_cache_store_nothing():
+    cache = _cache()
+    cache.put(QUESTION, "   ", "concept", index_version=V1)
+    assert cache.stats()["size"] == 0
+
+    disabled = _cache(enabled=False)
+    disabled.put(QUESTION, "answer", "concept", index_version=V1)
+    assert disabled.lookup(QUESTION, mode="concept", index_version=V1) is None
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put(QUESTION, "persisted", "practice", index_version=V1)
+
+    reopened = _cache(tmp_path)
+    hit = reopened.lookup(QUESTION, mode="practice", index_version=V1)
+    assert hit is not None and hit.answer == "persisted"
+
+
+def test_entries_are_scoped_by_course():
+    cache = _cache()
+    cache.put(QUESTION, "answer", "concept", index_version=V1)
+    assert cache.lookup(QUESTION, mode="concept", index_version=V1) is not None
+
+    next(iter(cache._entries.values())).course_id = "other-course"
+    assert cache.lookup(QUESTION, mode="concept", index_version=V1) is None
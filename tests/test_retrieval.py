@@ -0,0 +1,78 @@
+# tests/test_retrieval.py
+from dataclasses import replace
+
+from langchain_core.documents import Document
+
+from educhat.config import DEFAULT_RETRIEVAL_CONFIG
+from educhat.lexical_index import BM25Index
+from educhat.query_cache import QueryCache
+from educhat.rag_store import current_index_version, load_lexical_index, load_vector_store, update_vector_store
+from educhat.retrieval import HybridRetriever, reciprocal_rank_fusion
+
+
+def _docs(*ids: str):
+    return [Document(id=doc_id, page_content=f"text of {doc_id}") for doc_id in ids]
+
+
+def _ids(docs):
+    return [doc.id for doc in docs]
+
+
+def test_rrf_favours_documents_found_by_both_rankings():
+    vector, bm25 = _docs("a", "b", "c"), _docs("c", "d", "a")
+    # a: 1/61 + 1/63, c: 1/63 + 1/61 (empate, gana el primero visto), b: 1/62, d: 1/62
+    assert _ids(reciprocal_rank_fusion([vector, bm25], k=60)) == ["a", "c", "b", "d"]
+
+
+def test_rrf_keeps_one_copy_of_each_document():
+    fused = reciprocal_rank_fusion([_docs("x", "y"), _docs("y", "z"), _docs("y")], k=1)
+    assert _ids(fused) == ["y", "x", "z"]
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_bm25_ranks_exact_terms_and_round_trips():
+    index = BM25Index.build(
+        [
+            ("ddl", "DDL statements: CREATE TABLE and ALTER TABLE."),
+            ("dml", "DML statements insert, update and delete rows."),
+            ("er", "The ER model describes entities and relationships."),
+        ]
+    )
+    assert [doc_id for doc_id, _ in index.search("What is DDL?", 3)] == ["ddl"]
+    assert [doc_id for doc_id, _ in index.search("statements about table rows", 2)] == ["ddl", "dml"]
+    assert index.search("the and of", 3) == []  # solo palabras vacías
+
+    again = BM25Index.from_dict(index.to_dict())
+    assert again.search("relationships entities", 3) == index.search("relationships entities", 3)
+
+
+def _retriever(persist_dir: str, **overrides) -> HybridRetriever:
+    vectordb = load_vector_store(persist_dir)
+    return HybridRetriever(
+        vectordb,
+        load_lexical_index(vectordb, persist_dir),
+        replace(DEFAULT_RETRIEVAL_CONFIG, **overrides),
+        cache=QueryCache(64),
+        index_version=current_index_version(persist_dir),
+    )
+
+
+def test_hybrid_retrieval_finds_exact_terms_the_vectors_miss(index_dir, make_doc):
+    sources = [(f"{topic}.txt", make_doc(topic)) for topic in ("joins", "triggers", "views")]
+    sources.append(("ddl.txt", "DDL CHEATSHEET\n\nUse DDL to CREATE, ALTER and DROP tables in the schema."))
+    update_vector_store(sources, persist_dir=index_dir)
+
+    # Con embeddings aleatorios el vector solo aporta ruido; BM25 encuentra "DDL"
+    result = _retriever(index_dir, vector_k=3, bm25_k=3).retrieve("DDL", k=2)
+    assert any("Use DDL" in doc.page_content for doc in result.docs)
+    assert len(result.docs) == 2 and not result.cached
+    assert {"embed", "vector", "bm25", "fuse", "total"} <= set(result.timings_ms)
+
+
+def test_retrieve_many_matches_retrieve(index_dir, make_doc):
+    update_vector_store([(f"{t}.txt", make_doc(t)) for t in ("keys", "joins", "indexes")], persist_dir=index_dir)
+    queries = ["primary keys", "outer joins", "btree indexes"]
+
+    one_by_one = [_ids(_retriever(index_dir).retrieve(q).docs) for q in queries]
+    batched = [_ids(result.docs) for result in _retriever(index_dir).retrieve_many(queries)]
+    assert batched == one_by_one
@@ -0,0 +1,94 @@
+# tests/test_session_memory.py
+import json
+import threading
+from dataclasses import replace
+
+from langchain_core.runnables import RunnableLambda
+
+from educhat.config import DEFAULT_MEMORY_CONFIG
+from educhat.session_memory import (
+    SessionSummarizer,
+    count_tokens,
+    render_history,
+    truncate_tokens,
+    update_memory,
+)
+
+
+def _flush(summarizer: SessionSummarizer) -> None:
+    """Espera a que el hilo de compactación termine lo encolado."""
+    summarizer._executor.submit(lambda: None).result(timeout=5)
+
+
+def test_window_evicts_the_oldest_turns():
+    config = replace(DEFAULT_MEMORY_CONFIG, window_turns=3, max_history_tokens=10_000)
+    turns, evicted = None, []
+    for i in range(5):
+        turns, evicted = update_memory(turns, "", f"question {i}", f"answer {i}", config)
+        assert len(turns) == min(i + 1, 3)
+        assert [t["user"] for t in evicted] == ([f"question {i - 3}"] if i >= 3 else [])
+    assert [t["user"] for t in turns] == ["question 2", "question 3", "question 4"]
+
+
+def test_token_budget_triggers_eviction_before_the_window_fills():
+    config = replace(DEFAULT_MEMORY_CONFIG, window_turns=6, max_history_tokens=30, max_turn_tokens=20)
+    turns, _ = update_memory(None, "", "q1 " * 10, "a1 " * 10, config)
+    turns, evicted = update_memory(turns, "", "q2 " * 10, "a2 " * 10, config)
+    assert len(evicted) == 1 and len(turns) == 1
+    # El turno actual se conserva siempre, aunque no quepa solo
+    turns, evicted = update_memory([], "s " * 200, "q3", "a3", config)
+    assert len(turns) == 1 and evicted == []
+
+    history = render_history("earlier summary", turns)
+    assert history.startswith("Summary of the earlier conversation: earlier summary\n\nUser: q3")
+
+
+def test_json_answers_keep_only_the_answer_field_and_are_truncated():
+    config = replace(DEFAULT_MEMORY_CONFIG, max_turn_tokens=5)
+    answer = json.dumps({"answer": "A primary key identifies each row of a table uniquely.", "references": []})
+    turns, _ = update_memory(None, "", "What is a PK?", answer, config)
+    assert turns[0]["agent"] == truncate_tokens("A primary key identifies each row of a table uniquely.", 5)
+    assert turns[0]["agent"].endswith(" …") and count_tokens(turns[0]["agent"]) <= 6
+    assert "references" not in turns[0]["agent"]
+
+
+def test_evicted_turns_are_summarized_in_the_background():
+    seen = []
+    started, release = threading.Event(), threading.Event()
+
+    def llm(prompt):
+        seen.append(prompt.to_string())
+        started.set()
+        release.wait(5)
+        return "The student asked about keys and joins."
+
+    summarizer = SessionSummarizer(RunnableLambda(llm))
+    evicted = [{"user": "What is a key?", "agent": "A key..."}, {"user": "And a join?", "agent": "A join..."}]
+    summarizer.submit("s1", "", evicted)
+    assert started.wait(5)
+    assert summarizer.get("s1", "previous") == "previous"  # la petición no espera al resumen
+    release.set()
+    _flush(summarizer)
+
+    assert summarizer.get("s1") == "The student asked about keys and joins."
+    assert "User: What is a key?" in seen[0] and "User: And a join?" in seen[0]
+    assert summarizer.get("other") == ""
+
+
+def test_summary_falls_back_to_the_questions_when_the_llm_fails():
+    def broken(prompt):
+        raise ConnectionError("ollama is down")
+
+    for llm in (RunnableLambda(broken), None):
+        summarizer = SessionSummarizer(llm, replace(DEFAULT_MEMORY_CONFIG, summary_max_tokens=40))
+        summarizer.submit("s1", "The student asked: What is SQL?.", [{"user": "What is DDL?", "agent": "..."}])
+        _flush(summarizer)
+        assert summarizer.get("s1") == "The student asked: What is SQL?. The student also asked: What is DDL?."
+
+
+def test_summaries_are_bounded_per_process():
+    summarizer = SessionSummarizer(None, max_sessions=2)
+    for thread_id in ("a", "b", "c"):
+        summarizer.submit(thread_id, "", [{"user": thread_id, "agent": ""}])
+    _flush(summarizer)
+    assert summarizer.get("a") == "" and summarizer.get("c") == "The student asked: c."
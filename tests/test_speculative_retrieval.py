@@ -0,0 +1,87 @@
+# tests/test_speculative_retrieval.py
+import threading
+
+import pytest
+
+from educhat import tools
+from educhat.retrieval import RetrievalResult
+
+
+@pytest.fixture
+def fake_retrieve(monkeypatch):
+    """tools._retrieve falso: cuenta las llamadas y puede retenerse con `gate`."""
+
+    class Fake:
+        def __init__(self):
+            self.calls = []
+            self.threads = []
+            self.gate = threading.Event()
+            self.gate.set()
+            self.fail = False
+            self.version = "v1"
+
+        def __call__(self, query, course_id):
+            self.calls.append(query)
+            self.threads.append(threading.current_thread().name)
+            self.gate.wait(5)
+            if self.fail:
+                self.fail = False
+                raise RuntimeError("index busy")
+            return RetrievalResult(docs=[], timings_ms={"query": len(self.calls)})
+
+    fake = Fake()
+    monkeypatch.setattr(tools, "_retrieve", fake)
+    monkeypatch.setattr(tools, "current_index_version", lambda persist_dir: fake.version)
+    tools._speculative.clear()
+    yield fake
+    fake.gate.set()
+    tools._speculative.clear()
+
+
+def test_speculative_result_is_used_once(fake_retrieve):
+    fake_retrieve.gate.clear()
+    tools.start_retrieval("What is a JOIN?")
+    tools.start_retrieval("what is a join")  # misma consulta normalizada: no se lanza otra
+    fake_retrieve.gate.set()
+
+    result = tools.course_rag_retrieve("What is a JOIN?")
+    assert fake_retrieve.calls == ["What is a JOIN?"]
+    assert fake_retrieve.threads[0].startswith("educhat-retrieval")
+    assert result.timings_ms == {"query": 1}
+
+    # Ya se consumió: la siguiente vez se recupera de nuevo
+    tools.course_rag_retrieve("What is a JOIN?")
+    assert len(fake_retrieve.calls) == 2
+
+
+def test_waits_for_a_running_speculative_retrieval(fake_retrieve):
+    fake_retrieve.gate.clear()
+    tools.start_retrieval("normal forms")
+    threading.Timer(0.05, fake_retrieve.gate.set).start()
+
+    assert tools.course_rag_retrieve("normal forms").timings_ms == {"query": 1}
+    assert len(fake_retrieve.calls) == 1
+
+
+def test_result_of_an_older_index_version_is_discarded(fake_retrieve):
+    tools.start_retrieval("indexes")
+    [(_, future)] = tools._speculative.values()
+    future.result()
+    fake_retrieve.version = "v2"  # build_rag publicó otra versión mientras tanto
+
+    tools.course_rag_retrieve("indexes")
+    assert len(fake_retrieve.calls) == 2
+
+
+def test_failed_speculative_retrieval_is_retried(fake_retrieve):
+    fake_retrieve.fail = True
+    tools.start_retrieval("triggers")
+
+    assert tools.course_rag_retrieve("triggers").timings_ms == {"query": 2}
+
+
+def test_unconsumed_retrievals_are_bounded(fake_retrieve, monkeypatch):
+    monkeypatch.setattr(tools, "MAX_SPECULATIVE", 3)
+    for i in range(5):
+        tools.start_retrieval(f"question {i}")
+    assert [query for _, query in tools._speculative] == ["question 2", "question 3", "question 4"]
@@ -0,0 +1,133 @@
+# tests/test_telemetry.py
+import asyncio
+import json
+import re
+from typing import TypedDict
+
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.language_models import FakeListChatModel
+from langgraph.graph import END, START, StateGraph
+
+from educhat import telemetry
+from educhat.config import LoggingConfig, TelemetryConfig
+from educhat.log_writer import LogWriter
+from educhat.telemetry import Histogram, MetricsRegistry, TelemetryHandler
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_]\w*="[^"]*")(,[a-zA-Z_]\w*="[^"]*")*\})? (\S+)$')
+
+
+def _parse(text: str):
+    """Comprueba el formato de texto de Prometheus y devuelve {línea sin valor: valor}."""
+    assert text.endswith("\n")
+    samples, declared = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split()[2]
+            assert name not in declared, f"duplicated HELP for {name}"
+            declared[name] = None
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert name in declared and kind in ("counter", "gauge", "histogram")
+            declared[name] = kind
+        else:
+            match = _SAMPLE_RE.match(line)
+            assert match, f"bad sample line: {line!r}"
+            name = match.group(1)
+            family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in declared else name
+            assert declared.get(family), f"sample {name} before its TYPE"
+            samples[line.rsplit(" ", 1)[0]] = float(match.group(5))
+    return samples
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("educhat_test_seconds", "Test latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, node="router")
+    assert histogram.render() == [
+        "# HELP educhat_test_seconds Test latency",
+        "# TYPE educhat_test_seconds histogram",
+        'educhat_test_seconds_bucket{node="router",le="0.1"} 2',
+        'educhat_test_seconds_bucket{node="router",le="1"} 3',
+        'educhat_test_seconds_bucket{node="router",le="+Inf"} 4',
+        'educhat_test_seconds_sum{node="router"} 3.65',
+        'educhat_test_seconds_count{node="router"} 4',
+    ]
+    assert registry.histogram("educhat_test_seconds", "again") is histogram
+
+
+def test_registry_render_is_valid_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("educhat_requests_total", "Runs").inc(mode="concept", status="ok")
+    registry.counter("educhat_requests_total", "Runs").inc(2, mode="faq", status="ok")
+    registry.histogram("educhat_latency_seconds", "Latency").observe(0.2)
+    registry.gauge("educhat_queue", "Queue", lambda: {"queued": 3, "in_flight": 1})
+    registry.gauge("educhat_broken", "Broken gauge", lambda: 1 / 0)
+
+    samples = _parse(registry.render())
+    assert samples['educhat_requests_total{mode="concept",status="ok"}'] == 1
+    assert samples['educhat_requests_total{mode="faq",status="ok"}'] == 2
+    assert samples['educhat_latency_seconds_bucket{le="0.25"}'] == 1
+    assert samples['educhat_latency_seconds_bucket{le="0.1"}'] == 0
+    assert samples["educhat_latency_seconds_count"] == 1
+    assert samples['educhat_queue{name="queued"}'] == 3
+    assert not any(key.startswith("educhat_broken") for key in samples)  # se omite, no rompe /metrics
+
+
+class _State(TypedDict):
+    question: str
+    answer: str
+
+
+def _graph(llm):
+    async def router(state: _State, config) -> _State:
+        await adispatch_custom_event("route", {"mode": "concept"}, config=config)
+        await adispatch_custom_event("retrieval_done", {"chunks": 3, "timings_ms": {"total": 12.0}}, config=config)
+        await adispatch_custom_event("context_built", {"tokens_before": 900, "tokens": 400}, config=config)
+        return state
+
+    async def answer(state: _State, config) -> _State:
+        out = await llm.ainvoke(state["question"], config=config)
+        return {"question": state["question"], "answer": out.content}
+
+    builder = StateGraph(_State)
+    builder.add_node("router", router)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "router")
+    builder.add_edge("router", "answer")
+    builder.add_edge("answer", END)
+    return builder.compile()
+
+
+def test_handler_records_requests_nodes_and_llm_calls(tmp_path, monkeypatch):
+    writer = LogWriter(LoggingConfig(dir=str(tmp_path), flush_interval_seconds=0.01))
+    monkeypatch.setattr(telemetry, "get_log_writer", lambda: writer)
+    spans_path = str(tmp_path / "spans.jsonl")
+    handler = TelemetryHandler(MetricsRegistry(), TelemetryConfig(spans_path=spans_path))
+    graph = _graph(FakeListChatModel(responses=["A primary key identifies a row."]))
+
+    config = {"callbacks": [handler], "metadata": {"thread_id": "s1"}}
+    result = asyncio.run(graph.ainvoke({"question": "What is a primary key?", "answer": ""}, config))
+    assert result["answer"] == "A primary key identifies a row."
+
+    samples = _parse(handler.registry.render())
+    assert samples['educhat_requests_total{mode="concept",status="ok"}'] == 1
+    assert samples['educhat_node_duration_seconds_count{node="router"}'] == 1
+    assert samples['educhat_node_duration_seconds_count{node="answer"}'] == 1
+    assert samples['educhat_llm_duration_seconds_count{node="answer"}'] == 1
+    assert samples['educhat_llm_completion_tokens_total{node="answer"}'] > 0
+    assert samples['educhat_retrieved_chunks_bucket{le="4"}'] == 1
+    assert samples['educhat_context_tokens_total{stage="retrieved"}'] == 900
+    assert samples['educhat_cache_lookups_total{result="miss"}'] == 1
+
+    request = handler.last_request("s1")
+    assert request["mode"] == "concept" and set(request["nodes_ms"]) == {"router", "answer"}
+    assert request["llm_calls"][0]["node"] == "answer"
+    assert request["context"]["tokens"] == 400
+
+    writer.close()
+    spans = [json.loads(line) for line in open(spans_path, encoding="utf-8")]
+    by_name = {span["name"]: span for span in spans}
+    assert {"router", "answer"} <= set(by_name)
+    assert len({span["traceId"] for span in spans}) == 1
+    assert by_name["router"]["parentSpanId"] != "" and by_name["router"]["status"] == {"code": 1}